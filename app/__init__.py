@@ -6,9 +6,11 @@ import logging
 db = SQLAlchemy()
 login_manager = LoginManager()
 
-def create_app():
+def create_app(config_overrides=None):
     app = Flask(__name__)
     app.config.from_pyfile('../config.py')
+    if config_overrides:
+        app.config.update(config_overrides)
 
     logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
@@ -16,10 +18,35 @@ def create_app():
     login_manager.init_app(app)
     login_manager.login_view = 'main.login'
 
+    from .instrumentation import init_instrumentation
+    from .profiling import init_profiler
+    from .repositories import init_repository
+    from .services import init_result_cache
+    from .exports import init_export_manager
+    from .cube import init_metric_cube
+    from .market_index import init_market_popularity
+    from .history import init_history_recorder
+    from .warmup import init_cache_warmer
+    from .reports import init_reports
+    init_reports(app)
+    init_instrumentation(app)
+    init_profiler(app)
+    init_repository(app)
+    init_result_cache(app)
+    init_export_manager(app)
+    init_metric_cube(app)
+    init_market_popularity(app)
+    init_history_recorder(app)
+    init_cache_warmer(app)
+
     from .routes import bp
     app.register_blueprint(bp)
 
     with app.app_context():
         db.create_all()
+        # create_all não cria índices novos em tabelas que já existem
+        from .models import UserFilter
+        for index in UserFilter.__table__.indexes:
+            index.create(db.engine, checkfirst=True)
 
     return app
\ No newline at end of file
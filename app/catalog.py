@@ -0,0 +1,209 @@
+from dataclasses import dataclass
+from typing import Dict, FrozenSet, Iterable, List, Optional, Tuple
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection, Engine
+import threading
+import weakref
+import logging
+from .database import engine_registry
+from .market_index import MarketIndex
+from .schema import flight_catalog
+
+logger = logging.getLogger(__name__)
+
+
+def _month_index(ano: int, mes: int) -> int:
+    return ano * 12 + mes - 1
+
+def _periodo(mes_absoluto: int) -> int:
+    return (mes_absoluto // 12) * 100 + mes_absoluto % 12 + 1
+
+
+@dataclass(frozen=True)
+class MarketCoverage:
+    """
+    Cobertura de um mercado: primeiro e último período e um bitmap dos meses presentes.
+
+    O bit `i` de `bitmap` indica se há voos no i-ésimo mês a partir de
+    `periodo_inicio`; `faixas` guarda os trechos contínuos de meses com dados.
+    """
+    mercado: str
+    periodo_inicio: int
+    periodo_fim: int
+    bitmap: int
+    faixas: Tuple[Tuple[int, int], ...]
+
+    @classmethod
+    def from_months(cls, mercado: str, meses: Iterable[Tuple[int, int]]) -> 'MarketCoverage':
+        indices = sorted({_month_index(ano, mes) for ano, mes in meses})
+        primeiro = indices[0]
+        bitmap = 0
+        faixas: List[Tuple[int, int]] = []
+        inicio = anterior = primeiro
+        for indice in indices:
+            bitmap |= 1 << (indice - primeiro)
+            if indice > anterior + 1:
+                faixas.append((_periodo(inicio), _periodo(anterior)))
+                inicio = indice
+            anterior = indice
+        faixas.append((_periodo(inicio), _periodo(anterior)))
+        return cls(mercado, _periodo(primeiro), _periodo(indices[-1]), bitmap, tuple(faixas))
+
+    @property
+    def _primeiro_mes(self) -> int:
+        return _month_index(self.periodo_inicio // 100, self.periodo_inicio % 100)
+
+    @property
+    def meses(self) -> FrozenSet[Tuple[int, int]]:
+        primeiro = self._primeiro_mes
+        return frozenset(
+            (periodo // 100, periodo % 100)
+            for periodo in (_periodo(primeiro + bit) for bit in range(self.bitmap.bit_length()) if self.bitmap >> bit & 1)
+        )
+
+    @property
+    def anos(self) -> List[int]:
+        return sorted({ano for inicio, fim in self.faixas for ano in range(inicio // 100, fim // 100 + 1)})
+
+    def has_month(self, ano: int, mes: int) -> bool:
+        bit = _month_index(ano, mes) - self._primeiro_mes
+        return bit >= 0 and bool(self.bitmap >> bit & 1)
+
+    def overlaps(self, periodo_inicio: int, periodo_fim: int) -> bool:
+        """Se há algum mês com dados no intervalo, testando os bits do intervalo de uma vez."""
+        primeiro = self._primeiro_mes
+        inicio = max(_month_index(periodo_inicio // 100, periodo_inicio % 100) - primeiro, 0)
+        fim = _month_index(periodo_fim // 100, periodo_fim % 100) - primeiro
+        if fim < inicio:
+            return False
+        return bool(self.bitmap >> inicio & ((1 << (fim - inicio + 1)) - 1))
+
+    def nearest_ranges(self, periodo_inicio: int, periodo_fim: int, limit: int = 2) -> List[Tuple[int, int]]:
+        """Trechos contínuos com dados mais próximos do intervalo pedido, em ordem cronológica."""
+        inicio = _month_index(periodo_inicio // 100, periodo_inicio % 100)
+        fim = _month_index(periodo_fim // 100, periodo_fim % 100)
+
+        def distancia(faixa: Tuple[int, int]) -> int:
+            faixa_inicio = _month_index(faixa[0] // 100, faixa[0] % 100)
+            faixa_fim = _month_index(faixa[1] // 100, faixa[1] % 100)
+            return max(faixa_inicio - fim, inicio - faixa_fim, 0)
+
+        return sorted(sorted(self.faixas, key=distancia)[:limit])
+
+
+class FlightCatalog:
+    """Catálogo em memória dos mercados e períodos existentes em `flight_data`."""
+
+    def __init__(self, rows: Iterable[Tuple[str, int, int]]):
+        meses_por_mercado: Dict[str, set] = {}
+        anos = set()
+        for mercado, ano, mes in rows:
+            meses_por_mercado.setdefault(mercado, set()).add((int(ano), int(mes)))
+            anos.add(int(ano))
+
+        self.markets: List[str] = sorted(meses_por_mercado)
+        self.years: List[int] = sorted(anos)
+        self.coverage: Dict[str, MarketCoverage] = {
+            mercado: MarketCoverage.from_months(mercado, meses) for mercado, meses in meses_por_mercado.items()
+        }
+        self._market_index: Optional[MarketIndex] = None
+
+    def has_market(self, mercado: str) -> bool:
+        return mercado in self.coverage
+
+    @property
+    def market_index(self) -> MarketIndex:
+        """Índice de busca dos mercados, montado no primeiro uso deste catálogo."""
+        if self._market_index is None:
+            self._market_index = MarketIndex(self.markets)
+        return self._market_index
+
+    def get_coverage(self, mercado: str) -> Optional[MarketCoverage]:
+        return self.coverage.get(mercado)
+
+    @classmethod
+    def from_engine(cls, engine: Engine) -> 'FlightCatalog':
+        """
+        Carrega o catálogo a partir de `flight_catalog`.
+
+        Bancos anteriores ao catálogo caem num `SELECT DISTINCT` agregado no
+        próprio banco; sem nenhuma das tabelas o catálogo fica vazio.
+        """
+        inspector = inspect(engine)
+        if inspector.has_table(flight_catalog.name):
+            query = 'SELECT "MERCADO", "ANO", "MES" FROM flight_catalog'
+        elif inspector.has_table('flight_data'):
+            logger.warning("Tabela flight_catalog ausente; usando DISTINCT em flight_data")
+            query = 'SELECT DISTINCT "MERCADO", "ANO", "MES" FROM flight_data'
+        else:
+            logger.warning("Nenhuma tabela de voos encontrada; catálogo vazio")
+            return cls([])
+
+        with engine_registry.connect(engine) as conn:
+            rows = conn.execute(text(query)).fetchall()
+        return cls(rows)
+
+
+class CatalogCache:
+    """Cache por processo dos catálogos, um por engine, recarregado a cada nova geração de dados."""
+
+    def __init__(self):
+        self._catalogs: 'weakref.WeakKeyDictionary[Engine, Tuple[Optional[int], FlightCatalog]]' = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    def get(self, engine: Engine, generation: Optional[int] = None) -> FlightCatalog:
+        cached = self._catalogs.get(engine)
+        if cached is not None and cached[0] == generation:
+            return cached[1]
+        with self._lock:
+            cached = self._catalogs.get(engine)
+            if cached is not None and cached[0] == generation:
+                return cached[1]
+            catalog = FlightCatalog.from_engine(engine)
+            self._catalogs[engine] = (generation, catalog)
+            logger.info(f"Catálogo carregado (geração {generation}): {len(catalog.markets)} mercados, {len(catalog.years)} anos")
+            return catalog
+
+    def invalidate(self, engine: Optional[Engine] = None) -> None:
+        with self._lock:
+            if engine is None:
+                self._catalogs.clear()
+            else:
+                self._catalogs.pop(engine, None)
+
+
+catalog_cache = CatalogCache()
+
+
+def rebuild_catalog(conn: Connection, periods: Optional[Iterable[Tuple[int, int]]] = None) -> None:
+    """
+    Reconstrói `flight_catalog` a partir de `flight_data` dentro da transação de `conn`.
+
+    Com `periods`, apenas os pares (ANO, MES) informados são refeitos.
+    """
+    insert_distinct = (
+        'INSERT INTO flight_catalog ("MERCADO", "ANO", "MES") '
+        'SELECT DISTINCT "MERCADO", "ANO", "MES" FROM flight_data '
+        'WHERE "MERCADO" IS NOT NULL'
+    )
+    if periods is None:
+        conn.execute(flight_catalog.delete())
+        conn.execute(text(insert_distinct))
+        return
+
+    params = [{'ano': ano, 'mes': mes} for ano, mes in periods]
+    if not params:
+        return
+    conn.execute(text('DELETE FROM flight_catalog WHERE "ANO" = :ano AND "MES" = :mes'), params)
+    conn.execute(text(insert_distinct + ' AND "ANO" = :ano AND "MES" = :mes'), params)
+
+
+def refresh_catalog(engine: Engine) -> int:
+    """Reconstrói `flight_catalog` a partir de `flight_data` numa única transação."""
+    flight_catalog.create(engine, checkfirst=True)
+    with engine.begin() as conn:
+        rebuild_catalog(conn)
+        total = conn.execute(text('SELECT COUNT(*) FROM flight_catalog')).scalar()
+    catalog_cache.invalidate(engine)
+    logger.info(f"Catálogo atualizado com {total} combinações de mercado/período")
+    return total
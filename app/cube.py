@@ -0,0 +1,270 @@
+"""
+Cubo denso mercado × mês das métricas de voos.
+
+RPK, ASK e número de voos só variam por mercado e mês, então cabem em
+matrizes `float64` de forma (mercados, meses) montadas uma vez por geração
+de dados a partir do agregado mensal. A série de um mercado é uma fatia de
+linha e somas de intervalo saem das somas de prefixo, sem consultar o banco.
+"""
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+from flask import Flask, current_app, has_app_context
+import logging
+import threading
+import time
+import numpy as np
+import pandas as pd
+from .repositories import FlightDataRepository
+
+logger = logging.getLogger(__name__)
+
+METRICS = ('RPK', 'ASK', 'VOOS')
+
+
+def _month_index(periodo: int) -> int:
+    """Número absoluto do mês de um PERIODO (ANO * 100 + MES)."""
+    return (periodo // 100) * 12 + periodo % 100 - 1
+
+
+def period_labels(periodos: np.ndarray) -> List[str]:
+    """Rótulos 'AAAA-MM' a partir das chaves inteiras de período."""
+    return [f"{periodo // 100}-{periodo % 100:02d}" for periodo in np.asarray(periodos, dtype=np.int64).tolist()]
+
+
+@dataclass(frozen=True)
+class MarketSeries:
+    """Série mensal de um mercado: só os meses com voos, em ordem de período."""
+    periodos: np.ndarray
+    rpk: np.ndarray
+    ask: np.ndarray
+    voos: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.periodos)
+
+    @property
+    def labels(self) -> List[str]:
+        return period_labels(self.periodos)
+
+    def resample(self, meses: int) -> 'MarketSeries':
+        """
+        Soma a série em blocos de `meses` meses do calendário (trimestres,
+        anos), cada bloco chaveado pelo período do seu primeiro mês.
+        """
+        if meses == 1 or not len(self):
+            return self
+        indice = (self.periodos // 100) * 12 + self.periodos % 100 - 1
+        chaves, inicios = np.unique(indice // meses * meses, return_index=True)
+        return MarketSeries(
+            (chaves // 12) * 100 + chaves % 12 + 1,
+            np.add.reduceat(self.rpk, inicios),
+            np.add.reduceat(self.ask, inicios),
+            np.add.reduceat(self.voos, inicios),
+        )
+
+    @classmethod
+    def from_frame(cls, frame: pd.DataFrame) -> 'MarketSeries':
+        """Converte o agregado mensal do repositório (ANO, MES, RPK, ASK, VOOS) numa série."""
+        if frame.empty:
+            empty = np.empty(0)
+            return cls(np.empty(0, dtype=np.int64), empty, empty, empty)
+        periodos = frame['ANO'].to_numpy(dtype=np.int64) * 100 + frame['MES'].to_numpy(dtype=np.int64)
+
+        def column(name: str) -> np.ndarray:
+            if name not in frame:
+                return np.zeros(len(frame))
+            return pd.to_numeric(frame[name], errors='coerce').fillna(0).to_numpy(dtype=np.float64)
+
+        return cls(periodos, column('RPK'), column('ASK'), column('VOOS'))
+
+
+class MetricCube:
+    """
+    Matrizes (mercados, meses) de RPK, ASK e voos com somas de prefixo por mercado.
+
+    Os meses cobrem do primeiro ao último período existente, inclusive os
+    meses sem voos (zerados); por isso as séries filtram `VOOS > 0`, como o
+    agregado mensal do banco, que só tem linhas para meses com voos.
+    """
+
+    def __init__(self, markets: List[str], first_month: int, values: Dict[str, np.ndarray],
+                 generation: int = 0, build_seconds: float = 0.0):
+        self.markets = markets
+        self._index = {mercado: i for i, mercado in enumerate(markets)}
+        self.first_month = first_month
+        self.months = values['RPK'].shape[1]
+        self.values = values
+        self.generation = generation
+        self.build_seconds = build_seconds
+        self.prefix: Dict[str, np.ndarray] = {}
+        self.totals_prefix: Dict[str, np.ndarray] = {}
+        for name, matrix in values.items():
+            prefix = np.zeros((matrix.shape[0], self.months + 1))
+            np.cumsum(matrix, axis=1, out=prefix[:, 1:])
+            self.prefix[name] = prefix
+            self.totals_prefix[name] = np.concatenate(([0.0], np.cumsum(matrix.sum(axis=0))))
+
+    @classmethod
+    def from_monthly(cls, frame: pd.DataFrame, generation: int = 0) -> 'MetricCube':
+        """Monta o cubo a partir do agregado mensal de todos os mercados (ANO, MES, MERCADO, RPK, ASK, VOOS)."""
+        start = time.perf_counter()
+        if frame.empty:
+            values = {name: np.zeros((0, 0)) for name in METRICS}
+            return cls([], 0, values, generation, time.perf_counter() - start)
+        markets, rows = np.unique(frame['MERCADO'].astype(str).to_numpy(), return_inverse=True)
+        months = frame['ANO'].to_numpy(dtype=np.int64) * 12 + frame['MES'].to_numpy(dtype=np.int64) - 1
+        first_month = int(months.min())
+        columns = months - first_month
+        shape = (len(markets), int(columns.max()) + 1)
+        cells = rows * shape[1] + columns
+        values = {}
+        for name in METRICS:
+            # bincount soma linhas repetidas do mesmo mercado e mês, se houver
+            weights = pd.to_numeric(frame[name], errors='coerce').fillna(0).to_numpy(dtype=np.float64)
+            values[name] = np.bincount(cells, weights=weights, minlength=shape[0] * shape[1]).reshape(shape)
+        return cls(markets.tolist(), first_month, values, generation, time.perf_counter() - start)
+
+    @classmethod
+    def build(cls, repo: FlightDataRepository) -> 'MetricCube':
+        """Monta o cubo da geração de dados atual do repositório."""
+        start = time.perf_counter()
+        generation = repo.get_data_generation()
+        cube = cls.from_monthly(repo.get_all_monthly_flight_data(), generation)
+        cube.build_seconds = time.perf_counter() - start
+        return cube
+
+    def has_market(self, mercado: str) -> bool:
+        return mercado in self._index
+
+    def _columns(self, periodo_inicio: int, periodo_fim: int) -> Tuple[int, int]:
+        """Intervalo [início, fim) de colunas do período, recortado aos meses do cubo."""
+        start = max(_month_index(periodo_inicio) - self.first_month, 0)
+        end = min(_month_index(periodo_fim) - self.first_month + 1, self.months)
+        return start, max(start, end)
+
+    def series(self, mercado: str, periodo_inicio: int, periodo_fim: int) -> MarketSeries:
+        """Série mensal do mercado no período; vazia se o mercado não existir."""
+        row = self._index.get(mercado)
+        start, end = self._columns(periodo_inicio, periodo_fim)
+        if row is None or start >= end:
+            return MarketSeries.from_frame(pd.DataFrame())
+        voos = self.values['VOOS'][row, start:end]
+        meses = np.flatnonzero(voos > 0)
+        absolutos = meses + start + self.first_month
+        return MarketSeries(
+            periodos=(absolutos // 12) * 100 + absolutos % 12 + 1,
+            rpk=self.values['RPK'][row, start:end][meses],
+            ask=self.values['ASK'][row, start:end][meses],
+            voos=voos[meses],
+        )
+
+    def range_sum(self, metric: str, periodo_inicio: int, periodo_fim: int, mercado: Optional[str] = None) -> float:
+        """Soma da métrica no período para um mercado ou, sem `mercado`, para todos."""
+        start, end = self._columns(periodo_inicio, periodo_fim)
+        if start >= end:
+            return 0.0
+        if mercado is None:
+            prefix = self.totals_prefix[metric]
+            return float(prefix[end] - prefix[start])
+        row = self._index.get(mercado)
+        if row is None:
+            return 0.0
+        prefix = self.prefix[metric][row]
+        return float(prefix[end] - prefix[start])
+
+    def top_markets(self, metric: str, periodo_inicio: int, periodo_fim: int, n: int) -> List[Tuple[str, float]]:
+        """
+        Os `n` mercados com maior valor da métrica no período, do maior para o menor.
+
+        As somas do período saem das somas de prefixo (uma subtração por
+        mercado) e a seleção é parcial (`np.partition`); só os `n` escolhidos
+        e os empatados com o último são ordenados. `LOAD_FACTOR` é a razão das
+        somas de RPK e ASK. Mercados sem voos no período ficam de fora; empates
+        seguem a ordem alfabética.
+        """
+        start, end = self._columns(periodo_inicio, periodo_fim)
+        if start >= end or n <= 0:
+            return []
+
+        def soma(name: str) -> np.ndarray:
+            prefix = self.prefix[name]
+            return prefix[:, end] - prefix[:, start]
+
+        if metric == 'LOAD_FACTOR':
+            rpk, ask = soma('RPK'), soma('ASK')
+            valores = np.divide(rpk, ask, out=np.full(len(self.markets), np.nan), where=ask > 0)
+        else:
+            valores = soma(metric)
+        candidatos = np.flatnonzero((soma('VOOS') > 0) & ~np.isnan(valores))
+        if n < len(candidatos):
+            # Corte no n-ésimo maior valor; os empatados com ele entram para o desempate alfabético
+            corte = -np.partition(-valores[candidatos], n - 1)[n - 1]
+            candidatos = candidatos[valores[candidatos] >= corte]
+        # As linhas do cubo seguem a ordem alfabética dos mercados
+        ordem = candidatos[np.lexsort((candidatos, -valores[candidatos]))][:n]
+        return [(self.markets[row], float(valores[row])) for row in ordem.tolist()]
+
+    @property
+    def nbytes(self) -> int:
+        arrays = list(self.values.values()) + list(self.prefix.values()) + list(self.totals_prefix.values())
+        return sum(array.nbytes for array in arrays)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'generation': self.generation,
+            'markets': len(self.markets),
+            'months': self.months,
+            'bytes': self.nbytes,
+            'build_seconds': round(self.build_seconds, 4),
+        }
+
+
+class MetricCubeProvider:
+    """Mantém o cubo do processo, reconstruído na primeira consulta após uma nova geração de dados."""
+
+    def __init__(self):
+        self._cube: Optional[MetricCube] = None
+        self._lock = threading.Lock()
+        self.builds = 0
+
+    def get(self, repo: FlightDataRepository) -> MetricCube:
+        generation = repo.get_data_generation()
+        cube = self._cube
+        if cube is not None and cube.generation == generation:
+            return cube
+        with self._lock:
+            cube = self._cube
+            if cube is not None and cube.generation == generation:
+                return cube
+            cube = MetricCube.build(repo)
+            self._cube = cube
+            self.builds += 1
+        logger.info(
+            f"Cubo de métricas montado (geração {cube.generation}): {len(cube.markets)} mercados x "
+            f"{cube.months} meses, {cube.nbytes / 2**20:.1f} MB em {cube.build_seconds:.2f}s"
+        )
+        return cube
+
+    def stats(self) -> Dict[str, Any]:
+        cube = self._cube
+        stats = cube.stats() if cube is not None else {}
+        stats['builds'] = self.builds
+        return stats
+
+
+def init_metric_cube(app: Flask) -> Optional[MetricCubeProvider]:
+    """Habilita o cubo de métricas do app quando `METRIC_CUBE_ENABLED` estiver ligado."""
+    if not app.config.get('METRIC_CUBE_ENABLED', True):
+        return None
+    provider = MetricCubeProvider()
+    app.extensions['metric_cube'] = provider
+    return provider
+
+def get_metric_cube(repo: FlightDataRepository) -> Optional[MetricCube]:
+    """Retorna o cubo da geração atual do repositório, ou None se o app não o habilitar."""
+    if not has_app_context():
+        return None
+    provider = current_app.extensions.get('metric_cube')
+    if provider is None:
+        return None
+    return provider.get(repo)
@@ -0,0 +1,194 @@
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Mapping, Optional, Tuple
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Connection, Engine, make_url
+from sqlalchemy.pool import QueuePool
+import logging
+import os
+import threading
+import time
+import weakref
+
+logger = logging.getLogger(__name__)
+
+
+class PoolStats:
+    """Contadores de uso do pool de conexões de uma engine."""
+
+    def __init__(self, capacity: Optional[int] = None):
+        self._lock = threading.Lock()
+        # Conexões que o pool entrega antes de fazer esperar (pool_size + max_overflow);
+        # None para pools sem limite
+        self.capacity = capacity
+        self.reset()
+
+    def reset(self) -> None:
+        self.connects = 0
+        self.checkouts = 0
+        self.checkins = 0
+        self.waits = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    def record_wait(self, seconds: float, threshold: float) -> None:
+        with self._lock:
+            self.wait_seconds_total += seconds
+            self.wait_seconds_max = max(self.wait_seconds_max, seconds)
+            if seconds >= threshold:
+                self.waits += 1
+
+    def _incr(self, name: str) -> None:
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def as_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'capacity': self.capacity,
+                'connects': self.connects,
+                'checkouts': self.checkouts,
+                'checkins': self.checkins,
+                'waits': self.waits,
+                'wait_seconds_total': round(self.wait_seconds_total, 6),
+                'wait_seconds_max': round(self.wait_seconds_max, 6),
+            }
+
+
+def pool_options_from_config(config: Mapping[str, Any]) -> Dict[str, Any]:
+    """Monta as opções de pool a partir das chaves `DB_POOL_*` da configuração."""
+    return {
+        'pool_size': config.get('DB_POOL_SIZE', 5),
+        'max_overflow': config.get('DB_MAX_OVERFLOW', 10),
+        'pool_timeout': config.get('DB_POOL_TIMEOUT', 30),
+        'pool_recycle': config.get('DB_POOL_RECYCLE', 1800),
+        'pool_pre_ping': config.get('DB_POOL_PRE_PING', True),
+    }
+
+
+def _supports_queue_pool(url: str) -> bool:
+    """SQLite em memória usa um pool de conexão única, sem tamanho nem overflow."""
+    parsed = make_url(url)
+    return not (parsed.get_backend_name() == 'sqlite' and parsed.database in (None, '', ':memory:'))
+
+
+class EngineRegistry:
+    """
+    Registro de engines por processo.
+
+    Cada combinação de URL e opções de pool gera uma única engine, reaproveitada
+    por todas as requisições do worker. Se o processo for bifurcado (gunicorn
+    com `--preload`), o filho troca o pool de cada engine herdada por um novo,
+    sem fechar as conexões do processo pai; as engines continuam as mesmas,
+    então quem já guardou uma referência (o repositório) segue funcionando.
+    """
+
+    def __init__(self, wait_threshold: float = 0.01):
+        self._engines: Dict[Tuple, Engine] = {}
+        self._stats: 'weakref.WeakKeyDictionary[Engine, PoolStats]' = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self.wait_threshold = wait_threshold
+        if hasattr(os, 'register_at_fork'):
+            ref = weakref.ref(self)
+
+            def after_fork() -> None:
+                registry = ref()
+                if registry is not None:
+                    registry._after_fork()
+
+            os.register_at_fork(after_in_child=after_fork)
+
+    def _after_fork(self) -> None:
+        # O lock pode ter sido herdado travado por uma thread que não existe no filho
+        self._lock = threading.Lock()
+        self._check_fork()
+
+    def _check_fork(self) -> None:
+        if os.getpid() != self._pid:
+            for engine in self._engines.values():
+                engine.dispose(close=False)
+            for stats in self._stats.values():
+                stats.reset()
+            self._pid = os.getpid()
+
+    def get_engine(self, url: str, **options: Any) -> Engine:
+        """Retorna a engine registrada para a URL, criando-a na primeira chamada."""
+        if not _supports_queue_pool(url):
+            options = {k: v for k, v in options.items() if k in ('pool_pre_ping', 'pool_recycle')}
+        key = (url, tuple(sorted(options.items())))
+        with self._lock:
+            self._check_fork()
+            engine = self._engines.get(key)
+            if engine is None:
+                engine = create_engine(url, **options)
+                self._attach_stats(engine, options)
+                self._engines[key] = engine
+                logger.info(f"Engine criada para {engine.url.render_as_string(hide_password=True)} com opções {options}")
+            return engine
+
+    def _attach_stats(self, engine: Engine, options: Mapping[str, Any]) -> None:
+        capacity = None
+        max_overflow = options.get('max_overflow', 10)
+        if isinstance(engine.pool, QueuePool) and max_overflow >= 0:
+            capacity = engine.pool.size() + max_overflow
+        stats = PoolStats(capacity)
+        self._stats[engine] = stats
+        event.listen(engine, 'connect', lambda *args: stats._incr('connects'))
+        event.listen(engine, 'checkout', lambda *args: stats._incr('checkouts'))
+        event.listen(engine, 'checkin', lambda *args: stats._incr('checkins'))
+
+    @contextmanager
+    def connect(self, engine: Engine) -> Iterator[Connection]:
+        """
+        Abre uma conexão medindo o tempo de espera por uma vaga no pool.
+
+        Só conta como espera a retirada feita com o pool cheio (todas as
+        `capacity` conexões em uso); com vaga livre, o tempo é o de abrir a
+        conexão no banco, que já aparece nas métricas de SQL.
+        """
+        stats = self._stats.get(engine)
+        saturated = stats is not None and stats.capacity is not None and engine.pool.checkedout() >= stats.capacity
+        start = time.perf_counter()
+        conn = engine.connect()
+        if saturated:
+            stats.record_wait(time.perf_counter() - start, self.wait_threshold)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Retorna o estado do pool e os contadores de cada engine registrada."""
+        with self._lock:
+            engines = list(self._engines.values())
+        result = {}
+        for engine in engines:
+            pool = engine.pool
+            data: Dict[str, Any] = {'pool_class': type(pool).__name__}
+            for name in ('size', 'checkedin', 'checkedout', 'overflow'):
+                method = getattr(pool, name, None)
+                if callable(method):
+                    data[name] = method()
+            stats = self._stats.get(engine)
+            if stats is not None:
+                data.update(stats.as_dict())
+            result[engine.url.render_as_string(hide_password=True)] = data
+        return result
+
+    def dispose_all(self) -> None:
+        with self._lock:
+            for engine in self._engines.values():
+                engine.dispose()
+            self._engines.clear()
+
+
+engine_registry = EngineRegistry()
+
+
+def get_flight_data_uri(config: Mapping[str, Any]) -> str:
+    """URI do banco de voos; por padrão o mesmo banco do Flask-SQLAlchemy."""
+    return config.get('FLIGHT_DATA_DATABASE_URI') or config['SQLALCHEMY_DATABASE_URI']
+
+
+def get_engine_from_config(config: Mapping[str, Any], url: Optional[str] = None) -> Engine:
+    return engine_registry.get_engine(url or get_flight_data_uri(config), **pool_options_from_config(config))
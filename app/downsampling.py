@@ -0,0 +1,41 @@
+"""
+Redução de séries para gráficos.
+
+O Largest-Triangle-Three-Buckets (LTTB) escolhe, de cada faixa da série, o
+ponto que forma o maior triângulo com o ponto já escolhido na faixa anterior
+e a média da faixa seguinte. Ao contrário de uma média ou de pegar um ponto a
+cada N, preserva picos e vales, que é o que o olho procura no gráfico.
+"""
+import numpy as np
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """
+    Índices dos `threshold` pontos escolhidos pelo LTTB, em ordem crescente.
+
+    O primeiro e o último ponto são sempre mantidos. Com `threshold` menor
+    que 3 ou maior ou igual ao tamanho da série, todos os índices voltam.
+    """
+    n = len(x)
+    if threshold < 3 or threshold >= n:
+        return np.arange(n)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    # threshold - 2 faixas entre o primeiro e o último ponto, nenhuma vazia
+    bordas = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    escolhidos = np.empty(threshold, dtype=np.int64)
+    escolhidos[0] = 0
+    escolhidos[-1] = n - 1
+    anterior = 0
+    for i in range(threshold - 2):
+        inicio, fim = bordas[i], bordas[i + 1]
+        if i + 2 < len(bordas):
+            proximo_x = x[fim:bordas[i + 2]].mean()
+            proximo_y = y[fim:bordas[i + 2]].mean()
+        else:
+            proximo_x, proximo_y = x[n - 1], y[n - 1]
+        ax, ay = x[anterior], y[anterior]
+        areas = np.abs((ax - proximo_x) * (y[inicio:fim] - ay) - (ax - x[inicio:fim]) * (proximo_y - ay))
+        anterior = inicio + int(np.argmax(areas))
+        escolhidos[i + 1] = anterior
+    return escolhidos
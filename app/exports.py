@@ -0,0 +1,381 @@
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, Optional, Tuple
+from flask import Flask, current_app
+import json
+import logging
+import os
+import re
+import threading
+import time
+from .models import FilterData
+from .repositories import FlightDataRepository
+from .services import (
+    ResultCache, compute_market_metrics, get_flight_data_csv, get_flight_data_pdf, get_flight_detail_pdf, stream_flight_data_csv,
+)
+
+logger = logging.getLogger(__name__)
+
+FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'pdf': ('application/pdf', 'pdf'),
+}
+MODES = ('mensal', 'voos')
+
+PENDING = 'pendente'
+RUNNING = 'executando'
+DONE = 'concluido'
+FAILED = 'erro'
+
+_JOB_ID = re.compile(r'^[0-9a-f]{32}$')
+
+
+class ExportQueueFull(Exception):
+    """A fila de exportações do worker atingiu o limite de jobs em andamento."""
+
+
+@dataclass
+class ExportJob:
+    """Estado de um job de exportação, persistido como JSON no diretório de resultados."""
+    id: str
+    formato: str
+    modo: str
+    filtro: Dict[str, Any]
+    status: str = PENDING
+    linhas: int = 0
+    total: Optional[int] = None
+    arquivo: Optional[str] = None
+    erro: Optional[str] = None
+    criado_em: float = field(default_factory=time.time)
+    atualizado_em: float = field(default_factory=time.time)
+    concluido_em: Optional[float] = None
+
+    @property
+    def filename(self) -> str:
+        filtro = self.filtro
+        prefixo = 'voos' if self.modo == 'voos' else 'rpk'
+        return (f"{prefixo}_{filtro['mercado']}_{filtro['ano_inicio']}-{filtro['mes_inicio']}"
+                f"_to_{filtro['ano_fim']}-{filtro['mes_fim']}.{FORMATS[self.formato][1]}")
+
+    @property
+    def mimetype(self) -> str:
+        return FORMATS[self.formato][0]
+
+    def progress(self) -> Optional[float]:
+        if self.status == DONE:
+            return 1.0
+        if not self.total:
+            return None
+        return min(self.linhas / self.total, 1.0)
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = asdict(self)
+        data['progresso'] = self.progress()
+        return data
+
+
+class ExportManager:
+    """
+    Executa exportações de CSV e PDF fora da thread da requisição.
+
+    Os jobs rodam num pool de threads limitado e o estado de cada um fica num
+    JSON ao lado do arquivo gerado, de modo que qualquer worker do gunicorn
+    consegue consultar o status e servir o download. O id do job é o hash do
+    formato, modo, filtro e geração de dados: pedidos idênticos, em andamento
+    ou já concluídos dentro do TTL, reaproveitam o mesmo job.
+    """
+
+    def __init__(self, result_dir: str, max_workers: int = 2, max_pending: int = 16,
+                 ttl: float = 3600, stale_after: float = 600, batch_size: int = 10000):
+        self.result_dir = os.path.abspath(result_dir)
+        self.max_pending = max_pending
+        self.ttl = ttl
+        self.stale_after = stale_after
+        self.batch_size = batch_size
+        os.makedirs(result_dir, exist_ok=True)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='export')
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._active: Dict[str, ExportJob] = {}
+        self._heartbeat: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._last_cleanup = 0.0
+
+    @staticmethod
+    def make_id(formato: str, modo: str, filter_data: FilterData, generation: int) -> str:
+        return ResultCache.make_key(f'export_{formato}_{modo}', filter_data, generation)[:32]
+
+    def _state_path(self, job_id: str) -> str:
+        return os.path.join(self.result_dir, f'{job_id}.json')
+
+    def _publish(self, job: ExportJob, exclusive: bool = False) -> bool:
+        """
+        Grava o estado num arquivo temporário e só então o publica, para que
+        nenhum leitor veja um JSON pela metade. Com `exclusive`, a publicação
+        usa `os.link`, que falha se o estado já existir; False nesse caso.
+        """
+        path = self._state_path(job.id)
+        tmp = path + f'.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(asdict(job), f)
+        try:
+            if not exclusive:
+                os.replace(tmp, path)
+                return True
+            try:
+                os.link(tmp, path)
+            except FileExistsError:
+                return False
+            return True
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    def _save(self, job: ExportJob) -> None:
+        with self._save_lock:
+            job.atualizado_em = time.time()
+            self._publish(job)
+
+    def _load(self, job_id: str) -> Tuple[ExportJob, int]:
+        """
+        Lê o estado do job e o inode do arquivo lido.
+
+        Raises:
+            FileNotFoundError: Se não houver estado para o id.
+            ValueError: Se o arquivo não puder ser interpretado.
+        """
+        with open(self._state_path(job_id), encoding='utf-8') as f:
+            inode = os.fstat(f.fileno()).st_ino
+            try:
+                return ExportJob(**json.load(f)), inode
+            except TypeError as e:
+                raise ValueError(str(e)) from e
+
+    def get(self, job_id: str) -> Optional[ExportJob]:
+        """Carrega o estado do job, ou None se o id for inválido, desconhecido ou expirado."""
+        if not _JOB_ID.match(job_id):
+            return None
+        try:
+            job, _ = self._load(job_id)
+        except (FileNotFoundError, ValueError):
+            return None
+        if self._expired(job):
+            return None
+        return job
+
+    def result_path(self, job: ExportJob) -> Optional[str]:
+        if job.status != DONE or not job.arquivo:
+            return None
+        return os.path.join(self.result_dir, job.arquivo)
+
+    def _expired(self, job: ExportJob, now: Optional[float] = None) -> bool:
+        now = now or time.time()
+        if job.status in (PENDING, RUNNING):
+            # O worker dono renova o estado a cada `stale_after / 3` segundos;
+            # sem renovação há mais de `stale_after`, o worker morreu
+            return now - job.atualizado_em > self.stale_after
+        return now - (job.concluido_em or job.atualizado_em) > self.ttl
+
+    def submit(self, formato: str, modo: str, filter_data: FilterData, repo: FlightDataRepository) -> ExportJob:
+        """
+        Enfileira a exportação, ou devolve o job idêntico já existente.
+
+        Raises:
+            ValueError: Se o formato ou o modo forem inválidos.
+            ExportQueueFull: Se o worker já tiver `max_pending` jobs em andamento.
+        """
+        if formato not in FORMATS or modo not in MODES:
+            raise ValueError("Formato ou modo de exportação inválido.")
+        self.cleanup()
+        job_id = self.make_id(formato, modo, filter_data, repo.get_data_generation())
+
+        with self._lock:
+            existing = self.get(job_id)
+            if existing is not None and existing.status != FAILED:
+                return existing
+            if self._pending >= self.max_pending:
+                raise ExportQueueFull("Muitas exportações em andamento. Tente novamente em instantes.")
+            job = ExportJob(id=job_id, formato=formato, modo=modo, filtro=filter_data.model_dump())
+            if not self._claim(job):
+                return self.get(job_id) or job
+            self._pending += 1
+            self._active[job.id] = job
+            self._start_heartbeat()
+
+        app = current_app._get_current_object()
+        self._executor.submit(self._run, app, job, filter_data, repo)
+        logger.info(f"Exportação {job.id} enfileirada ({formato}, {modo})")
+        return job
+
+    def _claim(self, job: ExportJob) -> bool:
+        """
+        Publica o estado do job de forma exclusiva entre workers; False se
+        outro worker chegou antes.
+
+        Um estado existente só é substituído se tiver sido lido por inteiro e
+        estiver expirado ou com erro. Um arquivo ilegível é tratado como o
+        job de outro worker.
+        """
+        if self._publish(job, exclusive=True):
+            return True
+        try:
+            existing, inode = self._load(job.id)
+        except FileNotFoundError:
+            # Removido entre a tentativa e a leitura: tenta uma única vez mais
+            return self._publish(job, exclusive=True)
+        except ValueError:
+            return False
+        if existing.status != FAILED and not self._expired(existing):
+            return False
+        if not self._discard(job.id, inode):
+            return False
+        return self._publish(job, exclusive=True)
+
+    def _discard(self, job_id: str, inode: int) -> bool:
+        """
+        Tira do lugar o estado lido com o inode `inode`.
+
+        Cada gravação publica um arquivo novo, então um inode diferente quer
+        dizer que outro worker já substituiu o estado depois da leitura; nesse
+        caso ele é devolvido ao lugar e o descarte é abandonado.
+        """
+        path = self._state_path(job_id)
+        aside = path + f'.{os.getpid()}.{threading.get_ident()}.old'
+        try:
+            os.rename(path, aside)
+        except FileNotFoundError:
+            return True
+        try:
+            if os.stat(aside).st_ino == inode:
+                return True
+            try:
+                os.link(aside, path)
+            except FileExistsError:
+                pass
+            return False
+        finally:
+            os.remove(aside)
+
+    def _start_heartbeat(self) -> None:
+        if self._heartbeat is not None and self._heartbeat.is_alive():
+            return
+        self._heartbeat = threading.Thread(target=self._beat, name='export-heartbeat', daemon=True)
+        self._heartbeat.start()
+
+    def _beat(self) -> None:
+        """Renova o estado dos jobs deste worker, inclusive os que ainda aguardam na fila."""
+        while not self._stop.wait(self.stale_after / 3):
+            with self._lock:
+                jobs = list(self._active.values())
+            for job in jobs:
+                try:
+                    self._save(job)
+                except OSError as e:
+                    logger.error(f"Erro ao renovar o estado da exportação {job.id}: {str(e)}")
+
+    def _run(self, app: Flask, job: ExportJob, filter_data: FilterData, repo: FlightDataRepository) -> None:
+        arquivo = f'{job.id}.{FORMATS[job.formato][1]}'
+        tmp = os.path.join(self.result_dir, arquivo + '.part')
+        try:
+            with app.app_context():
+                job.status = RUNNING
+                if job.modo == 'voos':
+                    job.total = int(compute_market_metrics(filter_data, ['VOOS'], repo).valores['VOOS'].sum())
+                self._save(job)
+                if self._render(job, filter_data, repo, tmp):
+                    os.replace(tmp, os.path.join(self.result_dir, arquivo))
+                    job.arquivo = arquivo
+                    job.status = DONE
+                else:
+                    job.status = FAILED
+                    job.erro = "Nenhum dado para exportar."
+        except Exception as e:
+            logger.error(f"Erro na exportação {job.id}: {str(e)}", exc_info=True)
+            job.status = FAILED
+            job.erro = str(e) if isinstance(e, ValueError) else "Erro interno ao gerar a exportação."
+        finally:
+            if job.status != DONE and os.path.exists(tmp):
+                os.remove(tmp)
+            job.concluido_em = time.time()
+            with self._lock:
+                self._pending -= 1
+                self._active.pop(job.id, None)
+            self._save(job)
+            logger.info(f"Exportação {job.id} finalizada com status {job.status} ({job.linhas} linhas)")
+
+    def _render(self, job: ExportJob, filter_data: FilterData, repo: FlightDataRepository, path: str) -> bool:
+        """Gera o arquivo do job em `path`; False se não houver dados."""
+        def on_progress(linhas: int) -> None:
+            job.linhas = linhas
+            self._save(job)
+
+        if job.formato == 'csv' and job.modo == 'voos':
+            with open(path, 'wb') as f:
+                for chunk in stream_flight_data_csv(filter_data, repo, self.batch_size, on_progress=on_progress):
+                    f.write(chunk)
+            return True
+        if job.formato == 'csv':
+            content = get_flight_data_csv(filter_data, repo)
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(content)
+            return True
+
+        if job.modo == 'voos':
+            buffer = get_flight_detail_pdf(filter_data, repo, self.batch_size, on_progress=on_progress)
+        else:
+            buffer = get_flight_data_pdf(filter_data, repo)
+        if not buffer:
+            return False
+        with open(path, 'wb') as f:
+            f.write(buffer.getbuffer())
+        return True
+
+    def cleanup(self, force: bool = False) -> int:
+        """Remove jobs e arquivos expirados; roda no máximo uma vez por minuto."""
+        now = time.time()
+        if not force and now - self._last_cleanup < 60:
+            return 0
+        self._last_cleanup = now
+        removed = 0
+        for name in os.listdir(self.result_dir):
+            job_id = name.split('.', 1)[0]
+            path = os.path.join(self.result_dir, name)
+            if not _JOB_ID.match(job_id):
+                continue
+            try:
+                if name.endswith('.json'):
+                    job, _ = self._load(job_id)
+                    if not self._expired(job, now):
+                        continue
+                elif os.path.exists(self._state_path(job_id)) or now - os.path.getmtime(path) <= self.ttl:
+                    continue
+                os.remove(path)
+                removed += 1
+            except (FileNotFoundError, ValueError):
+                continue
+        if removed:
+            logger.info(f"Limpeza de exportações: {removed} arquivo(s) removido(s)")
+        return removed
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._stop.set()
+        self._executor.shutdown(wait=wait)
+
+
+def init_export_manager(app: Flask) -> ExportManager:
+    """Configura o gerenciador de exportações do app a partir das chaves `EXPORT_*`."""
+    manager = ExportManager(
+        app.config.get('EXPORT_RESULT_DIR') or os.path.join(app.instance_path, 'exports'),
+        max_workers=app.config.get('EXPORT_WORKERS', 2),
+        max_pending=app.config.get('EXPORT_MAX_PENDING', 16),
+        ttl=app.config.get('EXPORT_RESULT_TTL', 3600),
+        stale_after=app.config.get('EXPORT_STALE_AFTER', 600),
+        batch_size=app.config.get('CSV_EXPORT_BATCH_SIZE', 10000),
+    )
+    app.extensions['export_manager'] = manager
+    return manager
+
+def get_export_manager() -> ExportManager:
+    """Retorna o gerenciador de exportações do app corrente."""
+    return current_app.extensions['export_manager']
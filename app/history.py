@@ -0,0 +1,222 @@
+"""
+Gravação do histórico de filtros (`UserFilter`) fora do caminho da requisição.
+
+As rotas só enfileiram o evento; uma thread do worker grava os eventos em
+lotes, numa transação por lote, quando o lote enche ou o intervalo vence.
+Assim o gráfico não espera o lock de escrita e o fsync do banco. A fila é
+limitada: se encher, o evento é descartado e contado em `dropped`.
+"""
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from flask import Flask, current_app
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+from . import db
+from .models import FilterData, UserFilter
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class FilterEvent:
+    """Um filtro aplicado por um usuário, com o instante em que foi aplicado."""
+    user_id: int
+    mercado: str
+    ano_inicio: int
+    ano_fim: int
+    mes_inicio: int
+    mes_fim: int
+    timestamp: datetime = field(default_factory=datetime.utcnow, compare=False)
+
+    @classmethod
+    def from_filter(cls, user_id: int, filter_data: FilterData) -> 'FilterEvent':
+        return cls(
+            user_id=user_id,
+            mercado=filter_data.mercado,
+            ano_inicio=filter_data.ano_inicio,
+            ano_fim=filter_data.ano_fim,
+            mes_inicio=filter_data.mes_inicio,
+            mes_fim=filter_data.mes_fim,
+        )
+
+
+class HistoryRecorder:
+    """
+    Fila limitada de eventos de filtro gravados em lote por uma thread em segundo plano.
+
+    Filtros idênticos consecutivos do mesmo usuário são gravados uma vez só.
+    A thread é iniciada no primeiro evento de cada processo (depois do fork do
+    gunicorn) e a fila é esvaziada no encerramento do worker.
+    """
+
+    def __init__(self, app: Flask, max_queue: int = 10000, batch_size: int = 200,
+                 flush_interval: float = 1.0, max_tracked_users: int = 10000):
+        self.app = app
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_tracked_users = max_tracked_users
+        self._queue: 'queue.Queue[FilterEvent]' = queue.Queue(maxsize=max_queue)
+        self._last_by_user: 'OrderedDict[int, FilterEvent]' = OrderedDict()
+        self._lock = threading.Lock()
+        # Eventos enfileirados ainda não gravados, inclusive os do lote em montagem na thread
+        self._outstanding = 0
+        self._written_cond = threading.Condition(self._lock)
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+        self.enqueued = 0
+        self.deduplicated = 0
+        self.dropped = 0
+        self.written = 0
+        self.failed = 0
+        self.flushes = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+
+    def record(self, user_id: int, filter_data: FilterData) -> bool:
+        """Enfileira o filtro do usuário; False se for repetido ou se a fila estiver cheia."""
+        event = FilterEvent.from_filter(user_id, filter_data)
+        with self._lock:
+            if self._last_by_user.get(user_id) == event:
+                self.deduplicated += 1
+                return False
+            try:
+                self._queue.put_nowait(event)
+            except queue.Full:
+                self.dropped += 1
+                logger.warning(f"Fila do histórico cheia; filtro do usuário {user_id} descartado")
+                return False
+            self._last_by_user[user_id] = event
+            self._last_by_user.move_to_end(user_id)
+            if len(self._last_by_user) > self.max_tracked_users:
+                self._last_by_user.popitem(last=False)
+            self.enqueued += 1
+            self._outstanding += 1
+        self._ensure_thread()
+        return True
+
+    def _ensure_thread(self) -> None:
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            self._stop.clear()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='history-writer', daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            batch = self._collect()
+            if batch:
+                self._write(batch)
+
+    def _collect(self) -> List[FilterEvent]:
+        """Espera o primeiro evento e junta os seguintes até encher o lote ou vencer o intervalo."""
+        try:
+            batch = [self._queue.get(timeout=self.flush_interval)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or self._stop.is_set():
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch: List[FilterEvent]) -> None:
+        start = time.perf_counter()
+        with self._flush_lock, self.app.app_context():
+            try:
+                db.session.execute(UserFilter.__table__.insert(), [asdict(event) for event in batch])
+                db.session.commit()
+                self.written += len(batch)
+            except Exception as e:
+                db.session.rollback()
+                self.failed += len(batch)
+                logger.error(f"Erro ao gravar {len(batch)} filtro(s) no histórico: {str(e)}")
+            finally:
+                db.session.remove()
+        elapsed = (time.perf_counter() - start) * 1000
+        with self._written_cond:
+            self._outstanding -= len(batch)
+            self._written_cond.notify_all()
+        self.flushes += 1
+        self.last_flush_ms = elapsed
+        self.max_flush_ms = max(self.max_flush_ms, elapsed)
+
+    def flush(self, timeout: Optional[float] = None) -> int:
+        """
+        Grava agora, na thread de quem chamou, o que estiver na fila e espera o
+        lote que a thread estiver montando (até `timeout` segundos).
+        """
+        written = 0
+        while True:
+            batch: List[FilterEvent] = []
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if not batch:
+                break
+            self._write(batch)
+            written += len(batch)
+        with self._written_cond:
+            self._written_cond.wait_for(lambda: self._outstanding <= 0, timeout if timeout is not None else self.flush_interval * 2 + 5)
+        return written
+
+    def shutdown(self, timeout: float = 5.0) -> None:
+        """Para a thread e grava o que restou na fila."""
+        self._stop.set()
+        thread = self._thread
+        if thread is not None and thread.is_alive() and self._pid == os.getpid():
+            thread.join(timeout)
+        remaining = self.flush(timeout)
+        if remaining:
+            logger.info(f"Histórico: {remaining} filtro(s) gravado(s) no encerramento")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'depth': self._queue.qsize(),
+            'capacity': self._queue.maxsize,
+            'enqueued': self.enqueued,
+            'deduplicated': self.deduplicated,
+            'dropped': self.dropped,
+            'written': self.written,
+            'failed': self.failed,
+            'flushes': self.flushes,
+            'last_flush_ms': round(self.last_flush_ms, 3),
+            'max_flush_ms': round(self.max_flush_ms, 3),
+        }
+
+
+def init_history_recorder(app: Flask) -> Optional[HistoryRecorder]:
+    """Configura a gravação em segundo plano do histórico a partir das chaves `HISTORY_*`."""
+    if not app.config.get('HISTORY_WRITE_BEHIND', True):
+        return None
+    recorder = HistoryRecorder(
+        app,
+        max_queue=app.config.get('HISTORY_QUEUE_SIZE', 10000),
+        batch_size=app.config.get('HISTORY_BATCH_SIZE', 200),
+        flush_interval=app.config.get('HISTORY_FLUSH_INTERVAL', 1.0),
+    )
+    app.extensions['history_recorder'] = recorder
+    atexit.register(recorder.shutdown)
+    return recorder
+
+def get_history_recorder() -> Optional[HistoryRecorder]:
+    """Retorna o gravador de histórico do app corrente, se habilitado."""
+    return current_app.extensions.get('history_recorder')
@@ -0,0 +1,388 @@
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from datetime import datetime
+from typing import Callable, Deque, Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import Table, inspect, select, func, text
+from sqlalchemy.engine import Connection, Engine
+import hashlib
+import io
+import logging
+import queue
+import threading
+import numpy as np
+import pandas as pd
+from .catalog import catalog_cache, rebuild_catalog
+from .schema import flight_data, flight_data_staging, flight_monthly, flight_rankings, ingest_manifest, ingest_periods
+
+Period = Tuple[int, int]
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class BulkWriter:
+    """
+    Escritor em lote de DataFrames numa tabela.
+
+    Acumula linhas até `batch_size` e grava cada lote numa única transação:
+    `COPY ... FROM STDIN` no PostgreSQL e `executemany` nos demais bancos.
+    """
+
+    def __init__(self, engine: Engine, table: Table, batch_size: int = 50000):
+        self.engine = engine
+        self.table = table
+        self.batch_size = batch_size
+        self.columns: List[str] = [c.name for c in table.columns]
+        self.rows_written = 0
+        self._pending: List[pd.DataFrame] = []
+        self._pending_rows = 0
+
+    def write(self, df: pd.DataFrame) -> None:
+        if df.empty:
+            return
+        self._pending.append(df)
+        self._pending_rows += len(df)
+        if self._pending_rows >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self._pending:
+            return
+        batch = pd.concat(self._pending, ignore_index=True)[self.columns]
+        self._pending, self._pending_rows = [], 0
+        with self.engine.begin() as conn:
+            if self.engine.dialect.name == 'postgresql':
+                self._copy(conn, batch)
+            else:
+                self._executemany(conn, batch)
+        self.rows_written += len(batch)
+        logger.info(f"Gravadas {len(batch)} linhas em {self.table.name} (total: {self.rows_written})")
+
+    def _executemany(self, conn, batch: pd.DataFrame) -> None:
+        placeholder = {'qmark': '?', 'format': '%s', 'pyformat': '%s'}.get(self.engine.dialect.paramstyle)
+        if placeholder is None:
+            conn.execute(self.table.insert(), batch.to_dict(orient='records'))
+            return
+        colunas = ', '.join(f'"{c}"' for c in self.columns)
+        valores = ', '.join([placeholder] * len(self.columns))
+        # tolist() converte os escalares do NumPy para tipos nativos do driver
+        rows = list(zip(*(batch[c].tolist() for c in self.columns)))
+        conn.exec_driver_sql(f'INSERT INTO {self.table.name} ({colunas}) VALUES ({valores})', rows)
+
+    def _copy(self, conn, batch: pd.DataFrame) -> None:
+        buffer = io.StringIO()
+        batch.to_csv(buffer, header=False, index=False)
+        buffer.seek(0)
+        colunas = ', '.join(f'"{c}"' for c in self.columns)
+        cursor = conn.connection.cursor()
+        try:
+            cursor.copy_expert(f'COPY {self.table.name} ({colunas}) FROM STDIN WITH (FORMAT csv)', buffer)
+        finally:
+            cursor.close()
+
+
+def run_pipeline(
+    chunks: Iterable[pd.DataFrame],
+    transform: Callable[[pd.DataFrame], pd.DataFrame],
+    sink: Callable[[pd.DataFrame], None],
+    workers: int = 1,
+    max_pending: Optional[int] = None,
+) -> int:
+    """
+    Executa leitura, transformação e gravação em estágios sobrepostos.
+
+    A thread chamadora lê os chunks e os envia a um `ProcessPoolExecutor`; os
+    resultados seguem, na ordem de leitura, para uma única thread de gravação.
+    No máximo `max_pending` chunks ficam em transformação e outros
+    `max_pending` na fila de gravação, o que limita a memória usada.
+
+    Returns:
+        Número de linhas entregues ao `sink`.
+    """
+    max_pending = max_pending or max(2, workers * 2)
+    write_queue: 'queue.Queue' = queue.Queue(maxsize=max_pending)
+    errors: List[BaseException] = []
+    total_rows = 0
+
+    def writer() -> None:
+        while True:
+            item = write_queue.get()
+            if item is _STOP:
+                return
+            if errors:
+                continue
+            try:
+                sink(item)
+            except BaseException as e:
+                errors.append(e)
+
+    writer_thread = threading.Thread(target=writer, name='ingest-writer', daemon=True)
+    writer_thread.start()
+
+    def emit(df: pd.DataFrame) -> None:
+        nonlocal total_rows
+        if errors:
+            raise errors[0]
+        total_rows += len(df)
+        write_queue.put(df)
+
+    try:
+        if workers <= 1:
+            for chunk in chunks:
+                emit(transform(chunk))
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                in_flight: Deque[Future] = deque()
+                for chunk in chunks:
+                    in_flight.append(executor.submit(transform, chunk))
+                    if len(in_flight) >= max_pending:
+                        emit(in_flight.popleft().result())
+                while in_flight:
+                    emit(in_flight.popleft().result())
+    finally:
+        write_queue.put(_STOP)
+        writer_thread.join()
+
+    if errors:
+        raise errors[0]
+    return total_rows
+
+
+def file_checksum(path: str, block_size: int = 1 << 20) -> str:
+    """SHA-256 do arquivo de origem, lido em blocos."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class PeriodDigest:
+    """
+    Resumo do conteúdo de cada período (ANO, MES).
+
+    Soma os hashes das linhas, então o resultado não depende da ordem em que
+    as linhas aparecem no arquivo nem de como foram divididas em chunks. As
+    somas parciais de um chunk (`partial`) são pequenas e podem ser calculadas
+    nos processos de transformação e juntadas depois (`merge`).
+    """
+
+    def __init__(self):
+        self._acc: Dict[Period, List[int]] = {}
+
+    @staticmethod
+    def partial(df: pd.DataFrame) -> pd.DataFrame:
+        """Linhas e somas dos hashes de `df` por (ANO, MES)."""
+        hashes = pd.util.hash_pandas_object(df, index=False).to_numpy()
+        return pd.DataFrame({
+            'ANO': df['ANO'].to_numpy(),
+            'MES': df['MES'].to_numpy(),
+            'lo': (hashes & np.uint64(0xFFFFFFFF)).astype(np.int64),
+            'hi': (hashes >> np.uint64(32)).astype(np.int64),
+        }).groupby(['ANO', 'MES']).agg(rows=('lo', 'size'), lo=('lo', 'sum'), hi=('hi', 'sum'))
+
+    def merge(self, partes: pd.DataFrame) -> None:
+        for (ano, mes), row in zip(partes.index, partes.itertuples(index=False)):
+            acc = self._acc.setdefault((int(ano), int(mes)), [0, 0, 0])
+            acc[0] += int(row.rows)
+            acc[1] += int(row.lo)
+            acc[2] += int(row.hi)
+
+    def update(self, df: pd.DataFrame) -> None:
+        if df.empty:
+            return
+        self.merge(self.partial(df))
+
+    def items(self) -> Dict[Period, Tuple[str, int]]:
+        return {
+            periodo: (f"{rows}:{lo:x}:{hi:x}", rows)
+            for periodo, (rows, lo, hi) in self._acc.items()
+        }
+
+
+def get_data_generation(conn: Connection) -> int:
+    """Geração de dados publicada; 0 antes da primeira ingestão incremental."""
+    return get_generation_info(conn)[0]
+
+
+def get_generation_info(conn: Connection) -> Tuple[int, Optional[datetime]]:
+    """Geração de dados publicada e o momento (UTC) em que foi publicada."""
+    if not inspect(conn).has_table(ingest_manifest.name):
+        return 0, None
+    row = conn.execute(
+        select(ingest_manifest.c.generation, func.min(ingest_manifest.c.loaded_at))
+        .where(ingest_manifest.c.generation == select(func.max(ingest_manifest.c.generation)).scalar_subquery())
+        .group_by(ingest_manifest.c.generation)
+    ).first()
+    if row is None:
+        return 0, None
+    return row[0], row[1]
+
+
+def is_source_loaded(engine: Engine, checksum: str) -> bool:
+    with engine.connect() as conn:
+        query = select(ingest_manifest.c.id).where(ingest_manifest.c.checksum == checksum).limit(1)
+        return conn.execute(query).first() is not None
+
+
+def load_period_digests(engine: Engine) -> Dict[Period, str]:
+    with engine.connect() as conn:
+        rows = conn.execute(select(ingest_periods.c.ANO, ingest_periods.c.MES, ingest_periods.c.digest))
+        return {(ano, mes): digest for ano, mes, digest in rows}
+
+
+def migrate_flight_tables(engine: Engine) -> None:
+    """
+    Adapta bancos carregados antes da coluna `PERIODO`.
+
+    Acrescenta e preenche `PERIODO` em `flight_data` e descarta um
+    `flight_monthly` sem a coluna, que é reconstruído na próxima publicação.
+    """
+    inspector = inspect(engine)
+    if inspector.has_table(flight_data.name):
+        colunas = {c['name'] for c in inspector.get_columns(flight_data.name)}
+        if 'PERIODO' not in colunas:
+            logger.info("Adicionando a coluna PERIODO em flight_data")
+            with engine.begin() as conn:
+                conn.execute(text('ALTER TABLE flight_data ADD COLUMN "PERIODO" INTEGER'))
+                conn.execute(text('UPDATE flight_data SET "PERIODO" = "ANO" * 100 + "MES"'))
+    if inspector.has_table(flight_monthly.name):
+        colunas = {c['name'] for c in inspector.get_columns(flight_monthly.name)}
+        if 'PERIODO' not in colunas:
+            flight_monthly.drop(engine)
+
+
+def rebuild_monthly(conn: Connection, periods: Optional[Iterable[Period]] = None) -> None:
+    """
+    Reconstrói o agregado `flight_monthly` dentro da transação de `conn`.
+
+    Com `periods`, apenas os pares (ANO, MES) informados são refeitos.
+    """
+    insert_rollup = (
+        'INSERT INTO flight_monthly ("MERCADO", "PERIODO", "ANO", "MES", "RPK", "ASK", "VOOS") '
+        'SELECT "MERCADO", "PERIODO", MIN("ANO"), MIN("MES"), SUM("RPK"), SUM("ASK"), COUNT(*) FROM flight_data '
+        'WHERE "MERCADO" IS NOT NULL{filtro} '
+        'GROUP BY "MERCADO", "PERIODO"'
+    )
+    if periods is None:
+        conn.execute(flight_monthly.delete())
+        conn.execute(text(insert_rollup.format(filtro='')))
+        return
+
+    params = [{'periodo': ano * 100 + mes} for ano, mes in periods]
+    if not params:
+        return
+    conn.execute(text('DELETE FROM flight_monthly WHERE "PERIODO" = :periodo'), params)
+    conn.execute(text(insert_rollup.format(filtro=' AND "PERIODO" = :periodo')), params)
+
+
+# Métricas do ranking por período e como cada uma sai de uma linha de `flight_monthly`
+RANKING_EXPRESSIONS = {
+    'RPK': '"RPK"',
+    'ASK': '"ASK"',
+    'VOOS': '"VOOS"',
+    'LOAD_FACTOR': 'CASE WHEN "ASK" > 0 THEN "RPK" * 1.0 / "ASK" END',
+}
+
+# Posições guardadas por período e métrica; rankings maiores saem do cubo ou do agregado mensal
+RANKING_DEPTH = 100
+
+
+def rebuild_rankings(conn: Connection, periods: Optional[Iterable[Period]] = None) -> None:
+    """
+    Reconstrói `flight_rankings` a partir de `flight_monthly` dentro da transação de `conn`.
+
+    Guarda, para cada período e métrica, os `RANKING_DEPTH` maiores mercados
+    (empates pela ordem alfabética). Com `periods`, apenas os pares (ANO, MES)
+    informados são refeitos; o agregado mensal deles já deve estar atualizado.
+    """
+    insert_top = (
+        'INSERT INTO flight_rankings ("METRICA", "PERIODO", "POSICAO", "MERCADO", "VALOR") '
+        "SELECT '{metrica}', \"PERIODO\", posicao, \"MERCADO\", valor FROM ("
+        'SELECT "PERIODO", "MERCADO", {expressao} AS valor, '
+        'ROW_NUMBER() OVER (PARTITION BY "PERIODO" ORDER BY {expressao} DESC, "MERCADO") AS posicao '
+        'FROM flight_monthly WHERE {expressao} IS NOT NULL{filtro}'
+        ') ranking WHERE posicao <= {profundidade}'
+    )
+    if periods is None:
+        conn.execute(flight_rankings.delete())
+        for metrica, expressao in RANKING_EXPRESSIONS.items():
+            conn.execute(text(insert_top.format(metrica=metrica, expressao=expressao, filtro='', profundidade=RANKING_DEPTH)))
+        return
+
+    params = [{'periodo': ano * 100 + mes} for ano, mes in periods]
+    if not params:
+        return
+    conn.execute(text('DELETE FROM flight_rankings WHERE "PERIODO" = :periodo'), params)
+    for metrica, expressao in RANKING_EXPRESSIONS.items():
+        conn.execute(text(insert_top.format(
+            metrica=metrica, expressao=expressao, filtro=' AND "PERIODO" = :periodo', profundidade=RANKING_DEPTH,
+        )), params)
+
+
+def publish_periods(
+    engine: Engine,
+    digests: Dict[Period, Tuple[str, int]],
+    periods: List[Period],
+    source: str,
+    checksum: str,
+    rows_loaded: int,
+    replace_all: bool = False,
+    rebuild_derived: bool = False,
+) -> int:
+    """
+    Troca os períodos carregados em `flight_data_staging` numa única transação.
+
+    Apaga de `flight_data` os períodos alterados (ou tudo, com `replace_all`),
+    insere as linhas da staging, refaz o catálogo, o agregado mensal e os
+    rankings desses períodos e registra a ingestão no manifesto. Leitores veem
+    os dados antigos ou os novos, nunca um estado intermediário.
+
+    Returns:
+        A geração de dados publicada.
+    """
+    params = [{'ano': ano, 'mes': mes, 'periodo': ano * 100 + mes} for ano, mes in periods]
+    colunas = ', '.join(f'"{c.name}"' for c in flight_data.columns)
+
+    with engine.begin() as conn:
+        generation = get_data_generation(conn)
+        if periods or replace_all:
+            generation += 1
+
+        if replace_all:
+            conn.execute(flight_data.delete())
+            conn.execute(ingest_periods.delete())
+        elif params:
+            conn.execute(text('DELETE FROM flight_data WHERE "PERIODO" = :periodo'), params)
+            conn.execute(text('DELETE FROM ingest_periods WHERE "ANO" = :ano AND "MES" = :mes'), params)
+
+        if params:
+            conn.execute(text(f'INSERT INTO flight_data ({colunas}) SELECT {colunas} FROM flight_data_staging'))
+            conn.execute(ingest_periods.insert(), [
+                {'ANO': ano, 'MES': mes, 'digest': digests[(ano, mes)][0],
+                 'rows': digests[(ano, mes)][1], 'generation': generation}
+                for ano, mes in periods
+            ])
+        if replace_all or rebuild_derived:
+            rebuild_catalog(conn)
+            rebuild_monthly(conn)
+            rebuild_rankings(conn)
+        elif params:
+            rebuild_catalog(conn, periods)
+            rebuild_monthly(conn, periods)
+            rebuild_rankings(conn, periods)
+
+        conn.execute(ingest_manifest.insert().values(
+            generation=generation,
+            source=source[-512:],
+            checksum=checksum,
+            periods_loaded=len(periods),
+            rows_loaded=rows_loaded,
+            loaded_at=datetime.utcnow(),
+        ))
+
+    flight_data_staging.drop(engine, checkfirst=True)
+    catalog_cache.invalidate(engine)
+    logger.info(f"Geração {generation} publicada: {len(periods)} períodos, {rows_loaded} linhas")
+    return generation
@@ -0,0 +1,326 @@
+"""
+Métricas de requisições, consultas SQL e etapas dos serviços.
+
+Os tempos ficam em histogramas por processo, expostos no formato texto do
+Prometheus em `/metrics` junto com o estado do cache de resultados e dos pools
+de conexão. Cada resposta leva também um cabeçalho `Server-Timing` com o tempo
+da requisição dividido em banco (`db`), transformação (`transform`) e geração
+do arquivo (`render`).
+
+Com o gunicorn cada worker tem os seus contadores; o `/metrics` responde
+pelo worker que atendeu a requisição.
+"""
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+from flask import Flask, Response, current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+import hmac
+import threading
+import time
+
+# Limites (s) dos histogramas: de 1 ms a 30 s
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+SERVER_TIMING_PHASES = ('db', 'transform', 'render')
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _labels(names: Sequence[str], values: Sequence[Any], extra: str = '') -> str:
+    pares = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pares.append(extra)
+    return '{' + ','.join(pares) + '}' if pares else ''
+
+def _number(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Contador monotônico com rótulos."""
+    kind = 'counter'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, *labelvalues: Any) -> None:
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def value(self, *labelvalues: Any) -> float:
+        return self._values.get(labelvalues, 0)
+
+    def samples(self) -> Iterator[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        for labelvalues, value in items:
+            yield f"{self.name}{_labels(self.labelnames, labelvalues)} {_number(value)}"
+
+
+class Histogram:
+    """Histograma cumulativo com rótulos, no formato do Prometheus (`_bucket`, `_sum`, `_count`)."""
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labelvalues: Any) -> None:
+        # Por série: uma contagem por limite, mais +Inf, a soma e o total
+        posicao = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labelvalues)
+            if series is None:
+                series = self._series[labelvalues] = [0.0] * (len(self.buckets) + 3)
+            series[posicao] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def count(self, *labelvalues: Any) -> int:
+        series = self._series.get(labelvalues)
+        return int(series[-1]) if series else 0
+
+    def samples(self) -> Iterator[str]:
+        with self._lock:
+            items = sorted((labelvalues, list(series)) for labelvalues, series in self._series.items())
+        for labelvalues, series in items:
+            acumulado = 0.0
+            for limite, contagem in zip(self.buckets + (float('inf'),), series):
+                acumulado += contagem
+                le = f'le="{_number(limite)}"'
+                yield f"{self.name}_bucket{_labels(self.labelnames, labelvalues, le)} {_number(acumulado)}"
+            yield f"{self.name}_sum{_labels(self.labelnames, labelvalues)} {_number(series[-2])}"
+            yield f"{self.name}_count{_labels(self.labelnames, labelvalues)} {_number(series[-1])}"
+
+
+# Coletor: função chamada a cada leitura do /metrics, que gera
+# (nome, ajuda, tipo, [(rótulos, valor)])
+Collector = Callable[[], Iterable[Tuple[str, str, str, List[Tuple[Dict[str, Any], float]]]]]
+
+
+class MetricsRegistry:
+    """Histogramas do processo: requisições, consultas SQL e etapas dos serviços."""
+
+    def __init__(self):
+        self.requests = Histogram('http_request_duration_seconds', 'Duração das requisições por rota',
+                                  ('method', 'route', 'status'))
+        self.queries = Histogram('db_query_duration_seconds', 'Duração das consultas SQL por operação', ('operation',))
+        self.query_rows = Counter('db_query_rows_total', 'Linhas retornadas ou afetadas informadas pelo driver', ('operation',))
+        self.phases = Histogram('app_phase_duration_seconds', 'Duração das etapas dos serviços, sem o tempo de banco', ('phase',))
+
+    def render(self, collectors: Sequence[Collector] = ()) -> str:
+        """Texto do formato de exposição do Prometheus, com as métricas dos coletores ao final."""
+        linhas: List[str] = []
+        for metric in (self.requests, self.queries, self.query_rows, self.phases):
+            linhas.append(f"# HELP {metric.name} {metric.documentation}")
+            linhas.append(f"# TYPE {metric.name} {metric.kind}")
+            linhas.extend(metric.samples())
+        for collector in collectors:
+            for name, documentation, kind, samples in collector():
+                linhas.append(f"# HELP {name} {documentation}")
+                linhas.append(f"# TYPE {name} {kind}")
+                for labels, value in samples:
+                    linhas.append(f"{name}{_labels(list(labels), list(labels.values()))} {_number(value)}")
+        return '\n'.join(linhas) + '\n'
+
+
+metrics = MetricsRegistry()
+
+
+# --- Tempos por requisição ------------------------------------------------------
+
+# Tempo de SQL acumulado por thread, para descontar das etapas também fora de requisições
+_local = threading.local()
+
+def _thread_db_seconds() -> float:
+    return getattr(_local, 'db_seconds', 0.0)
+
+def _request_timings() -> Optional[Dict[str, float]]:
+    if not has_request_context():
+        return None
+    return g.get('_timings')
+
+def _add_timing(phase: str, seconds: float) -> None:
+    timings = _request_timings()
+    if timings is not None:
+        timings[phase] = timings.get(phase, 0.0) + seconds
+
+@contextmanager
+def timed(phase: str) -> Iterator[None]:
+    """
+    Mede uma etapa de serviço (`transform`, `render`) no histograma e no
+    `Server-Timing` da requisição. O tempo de SQL executado dentro da etapa
+    conta só como `db`.
+    """
+    timings = _request_timings()
+    db_antes = _thread_db_seconds()
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        decorrido = max(time.perf_counter() - inicio - (_thread_db_seconds() - db_antes), 0.0)
+        metrics.phases.observe(decorrido, phase)
+        if timings is not None:
+            timings[phase] = timings.get(phase, 0.0) + decorrido
+
+
+# --- SQLAlchemy -----------------------------------------------------------------
+
+def _operation(statement: str) -> str:
+    palavra = statement.lstrip().split(None, 1)
+    return palavra[0].upper() if palavra else 'OTHER'
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('_query_start', []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    inicios = conn.info.get('_query_start')
+    if not inicios:
+        return
+    decorrido = time.perf_counter() - inicios.pop()
+    operacao = _operation(statement)
+    metrics.queries.observe(decorrido, operacao)
+    # SELECT no sqlite3 informa -1; o psycopg2 informa as linhas retornadas
+    linhas = getattr(cursor, 'rowcount', -1)
+    if linhas is not None and linhas >= 0:
+        metrics.query_rows.inc(linhas, operacao)
+    _local.db_seconds = _thread_db_seconds() + decorrido
+    _add_timing('db', decorrido)
+    timings = _request_timings()
+    if timings is not None:
+        timings['db_queries'] = timings.get('db_queries', 0) + 1
+
+_listeners_installed = False
+_listeners_lock = threading.Lock()
+
+def install_sql_listeners() -> None:
+    """Registra os listeners de cursor em todas as engines do processo (uma vez)."""
+    global _listeners_installed
+    with _listeners_lock:
+        if _listeners_installed:
+            return
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+        _listeners_installed = True
+
+
+# --- Flask ----------------------------------------------------------------------
+
+def _before_request() -> None:
+    g._request_start = time.perf_counter()
+    g._timings = {}
+
+def _after_request(response: Response) -> Response:
+    inicio = g.get('_request_start')
+    if inicio is None:
+        return response
+    decorrido = time.perf_counter() - inicio
+    rota = request.url_rule.rule if request.url_rule is not None else '<sem rota>'
+    metrics.requests.observe(decorrido, request.method, rota, response.status_code)
+    if current_app.config.get('SERVER_TIMING_ENABLED', True):
+        response.headers['Server-Timing'] = ', '.join(filter(None, (response.headers.get('Server-Timing'), server_timing(g._timings, decorrido))))
+    return response
+
+def server_timing(timings: Dict[str, float], total: float) -> str:
+    """Valor do cabeçalho `Server-Timing` (durações em ms)."""
+    partes = []
+    for phase in SERVER_TIMING_PHASES:
+        if phase in timings:
+            parte = f"{phase};dur={timings[phase] * 1000:.2f}"
+            if phase == 'db':
+                parte += f';desc="{int(timings.get("db_queries", 0))} consulta(s)"'
+            partes.append(parte)
+    partes.append(f"total;dur={total * 1000:.2f}")
+    return ', '.join(partes)
+
+
+def app_collector(app: Flask) -> Collector:
+    """Estado do cache de resultados, dos pools de conexão, da fila do histórico e do cubo."""
+    def collect():
+        from .database import engine_registry
+        cache = app.extensions.get('result_cache')
+        if cache is not None:
+            stats = cache.stats()
+            for chave, tipo, ajuda in (
+                ('hits', 'counter', 'Acertos do cache de resultados'),
+                ('misses', 'counter', 'Faltas do cache de resultados'),
+                ('evictions', 'counter', 'Entradas removidas do cache por limite'),
+                ('invalidations', 'counter', 'Invalidações do cache por nova geração de dados'),
+                ('entries', 'gauge', 'Entradas no cache de resultados'),
+                ('bytes', 'gauge', 'Bytes ocupados pelo cache de resultados'),
+            ):
+                nome = f"result_cache_{chave}" + ('_total' if tipo == 'counter' else '')
+                yield nome, ajuda, tipo, [({}, stats[chave])]
+
+        pools = engine_registry.stats()
+        for chave, tipo, ajuda in (
+            ('size', 'gauge', 'Tamanho do pool de conexões'),
+            ('checkedout', 'gauge', 'Conexões em uso'),
+            ('checkedin', 'gauge', 'Conexões livres no pool'),
+            ('overflow', 'gauge', 'Conexões além do tamanho do pool'),
+            ('checkouts', 'counter', 'Retiradas de conexão do pool'),
+            ('waits', 'counter', 'Retiradas que esperaram pelo pool'),
+            ('wait_seconds_total', 'counter', 'Tempo total de espera pelo pool'),
+        ):
+            amostras = [({'engine': url}, data[chave]) for url, data in pools.items() if chave in data]
+            if amostras:
+                nome = f"db_pool_{chave}" + ('_total' if tipo == 'counter' and not chave.endswith('_total') else '')
+                yield nome, ajuda, tipo, amostras
+
+        recorder = app.extensions.get('history_recorder')
+        if recorder is not None:
+            stats = recorder.stats()
+            yield 'history_queue_depth', 'Filtros na fila do histórico', 'gauge', [({}, stats['depth'])]
+            yield 'history_dropped_total', 'Filtros descartados com a fila cheia', 'counter', [({}, stats['dropped'])]
+
+        provider = app.extensions.get('metric_cube')
+        if provider is not None:
+            stats = provider.stats()
+            yield 'metric_cube_bytes', 'Memória das matrizes do cubo de métricas', 'gauge', [({}, stats.get('bytes', 0))]
+            yield 'metric_cube_builds_total', 'Montagens do cubo de métricas', 'counter', [({}, stats['builds'])]
+    return collect
+
+
+def init_instrumentation(app: Flask) -> Optional[MetricsRegistry]:
+    """Liga as métricas de requisições e SQL quando `METRICS_ENABLED` estiver ligado."""
+    if not app.config.get('METRICS_ENABLED', True):
+        return None
+    install_sql_listeners()
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.extensions['metrics'] = metrics
+    return metrics
+
+def metrics_authorized() -> bool:
+    """
+    Se a requisição pode ler o `/metrics`: com `Authorization: Bearer` igual
+    ao `METRICS_TOKEN` ou vinda de um endereço de `METRICS_ALLOWED_IPS`. Sem
+    nenhum dos dois configurado, ninguém pode.
+    """
+    token = current_app.config.get('METRICS_TOKEN')
+    if token:
+        esquema, _, valor = request.headers.get('Authorization', '').partition(' ')
+        if esquema.lower() == 'bearer' and hmac.compare_digest(valor.strip().encode(), token.encode()):
+            return True
+    return request.remote_addr in current_app.config.get('METRICS_ALLOWED_IPS', [])
+
+def render_metrics() -> Optional[str]:
+    """Métricas do app corrente no formato texto do Prometheus; None se desabilitadas."""
+    registry = current_app.extensions.get('metrics')
+    if registry is None:
+        return None
+    return registry.render([app_collector(current_app._get_current_object())])
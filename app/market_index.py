@@ -0,0 +1,159 @@
+"""
+Busca de mercados para o autocompletar do dashboard.
+
+O índice é montado uma vez por catálogo (isto é, por geração de dados):
+a lista ordenada dos mercados, pesquisada por prefixo com `bisect`, e a
+lista ordenada dos aeroportos com os mercados de cada um, para que `SBGR`
+encontre também os mercados em que Guarulhos é o segundo aeroporto
+(o MERCADO junta os dois códigos ICAO em ordem alfabética).
+
+A popularidade vem da contagem de filtros de `UserFilter` nos últimos
+`MARKET_POPULARITY_DAYS` dias, relida a cada `MARKET_POPULARITY_TTL` segundos.
+"""
+from bisect import bisect_left
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Mapping, Optional
+from flask import Flask, current_app, has_app_context
+from sqlalchemy import func
+import heapq
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+AIRPORT_CODE_LENGTH = 4
+
+
+def _prefix_range(items: List[str], prefix: str) -> range:
+    """Posições dos itens com o prefixo numa lista ordenada."""
+    start = bisect_left(items, prefix)
+    # '\uffff' ordena depois de qualquer caractere de um código de aeroporto
+    return range(start, bisect_left(items, prefix + '\uffff', lo=start))
+
+
+class MarketIndex:
+    """Mercados e aeroportos ordenados para busca por prefixo."""
+
+    def __init__(self, markets: Iterable[str]):
+        self.markets: List[str] = sorted(set(markets))
+        por_aeroporto: Dict[str, List[str]] = {}
+        for mercado in self.markets:
+            if len(mercado) != 2 * AIRPORT_CODE_LENGTH:
+                continue
+            origem, destino = mercado[:AIRPORT_CODE_LENGTH], mercado[AIRPORT_CODE_LENGTH:]
+            por_aeroporto.setdefault(origem, []).append(mercado)
+            if destino != origem:
+                por_aeroporto.setdefault(destino, []).append(mercado)
+        self.airports: List[str] = sorted(por_aeroporto)
+        self._by_airport = por_aeroporto
+
+    def __len__(self) -> int:
+        return len(self.markets)
+
+    def airport_markets(self, aeroporto: str) -> List[str]:
+        """Mercados com o aeroporto numa das pontas, em ordem."""
+        return list(self._by_airport.get(aeroporto.strip().upper(), ()))
+
+    def matches(self, q: str) -> List[str]:
+        """
+        Mercados que começam com `q` ou, para `q` de até 4 caracteres, com
+        algum aeroporto começando com `q` na outra ponta.
+        """
+        q = q.strip().upper()
+        if not q:
+            return list(self.markets)
+        encontrados = {self.markets[i] for i in _prefix_range(self.markets, q)}
+        if len(q) <= AIRPORT_CODE_LENGTH:
+            for i in _prefix_range(self.airports, q):
+                encontrados.update(self._by_airport[self.airports[i]])
+        return sorted(encontrados)
+
+    def search(self, q: str, limit: int = 20, popularity: Optional[Mapping[str, int]] = None) -> Dict[str, Any]:
+        """
+        Até `limit` mercados que casam com `q`, os mais consultados primeiro.
+
+        Mercados que começam com `q` vêm antes dos que só casam pelo segundo
+        aeroporto; empates seguem a ordem alfabética.
+        """
+        q = q.strip().upper()
+        popularity = popularity or {}
+        candidatos = self.matches(q)
+        melhores = heapq.nsmallest(
+            limit, candidatos,
+            key=lambda mercado: (not mercado.startswith(q), -popularity.get(mercado, 0), mercado),
+        )
+        return {
+            'q': q,
+            'total': len(candidatos),
+            'mercados': [
+                {
+                    'mercado': mercado,
+                    'aeroportos': [mercado[:AIRPORT_CODE_LENGTH], mercado[AIRPORT_CODE_LENGTH:]],
+                    'consultas': popularity.get(mercado, 0),
+                }
+                for mercado in melhores
+            ],
+        }
+
+
+class MarketPopularity:
+    """Contagem de filtros por mercado no histórico, em cache por `ttl` segundos."""
+
+    def __init__(self, days: int = 90, ttl: float = 300.0):
+        self.days = days
+        self.ttl = ttl
+        self._counts: Dict[str, int] = {}
+        self._loaded_at: Optional[float] = None
+        self._lock = threading.Lock()
+        self.loads = 0
+
+    def counts(self) -> Dict[str, int]:
+        loaded_at = self._loaded_at
+        if loaded_at is not None and time.monotonic() - loaded_at < self.ttl:
+            return self._counts
+        with self._lock:
+            if self._loaded_at is not None and time.monotonic() - self._loaded_at < self.ttl:
+                return self._counts
+            try:
+                self._counts = self._load()
+            except Exception as e:
+                # Sem o histórico a busca continua, só sem a ordem por popularidade
+                logger.error(f"Erro ao contar os filtros por mercado: {str(e)}")
+            self._loaded_at = time.monotonic()
+            self.loads += 1
+            return self._counts
+
+    def _load(self) -> Dict[str, int]:
+        from . import db
+        from .models import UserFilter
+        since = datetime.utcnow() - timedelta(days=self.days)
+        rows = (
+            db.session.query(UserFilter.mercado, func.count(UserFilter.id))
+            .filter(UserFilter.timestamp >= since)
+            .group_by(UserFilter.mercado)
+            .all()
+        )
+        return {mercado: int(total) for mercado, total in rows}
+
+    def invalidate(self) -> None:
+        self._loaded_at = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {'markets': len(self._counts), 'loads': self.loads, 'days': self.days, 'ttl': self.ttl}
+
+
+def init_market_popularity(app: Flask) -> MarketPopularity:
+    """Configura a contagem de popularidade dos mercados a partir das chaves `MARKET_POPULARITY_*`."""
+    popularity = MarketPopularity(
+        days=app.config.get('MARKET_POPULARITY_DAYS', 90),
+        ttl=app.config.get('MARKET_POPULARITY_TTL', 300.0),
+    )
+    app.extensions['market_popularity'] = popularity
+    return popularity
+
+def get_market_popularity() -> Optional[MarketPopularity]:
+    """Retorna a contagem de popularidade do app corrente, se houver."""
+    if not has_app_context():
+        return None
+    return current_app.extensions.get('market_popularity')
@@ -4,7 +4,10 @@ from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime
 from pydantic import BaseModel, validator
 from flask_sqlalchemy import SQLAlchemy;
-from typing import Optional
+from typing import List, Optional
+
+# Granularidades do gráfico: meses do calendário somados em cada ponto
+GRANULARIDADES = {'mensal': 1, 'trimestral': 3, 'anual': 12}
 
 
 class User(db.Model, UserMixin):
@@ -23,9 +26,8 @@ class User(db.Model, UserMixin):
     def __repr__(self) -> str:
         return f'<User {self.username}>'
 
-class FilterData(BaseModel):
-    """Modelo de dados para filtros do dashboard."""
-    mercado: str
+class PeriodFilter(BaseModel):
+    """Intervalo de períodos (ano e mês) comum aos filtros do dashboard e das APIs."""
     ano_inicio: int
     ano_fim: int
     mes_inicio: int = 1
@@ -43,7 +45,66 @@ class FilterData(BaseModel):
             if values['ano_inicio'] == values['ano_fim'] and v < values['mes_inicio']:
                 raise ValueError('Mês fim deve ser maior ou igual ao mês início no mesmo ano.')
         return v
-    
+
+    @property
+    def periodo_inicio(self) -> int:
+        """Chave inteira do início do período (ANO * 100 + MES)."""
+        return self.ano_inicio * 100 + self.mes_inicio
+
+    @property
+    def periodo_fim(self) -> int:
+        """Chave inteira do fim do período (ANO * 100 + MES)."""
+        return self.ano_fim * 100 + self.mes_fim
+
+class FilterData(PeriodFilter):
+    """Modelo de dados para filtros do dashboard."""
+    mercado: str
+
+    @validator('mercado')
+    def mercado_normalizado(cls, v: str) -> str:
+        # Os códigos ICAO são gravados em maiúsculas; a chave do cache e a
+        # consulta precisam ver a mesma grafia
+        return v.strip().upper()
+
+class SeriesRequest(PeriodFilter):
+    """Consulta de séries de vários mercados num mesmo período (`/api/series`)."""
+    mercados: List[str]
+    metricas: List[str] = ['RPK']
+
+class RankingRequest(PeriodFilter):
+    """Consulta do ranking de mercados num período (`/api/rankings`)."""
+    metrica: str = 'RPK'
+    n: int = 10
+
+class ChartFormat(BaseModel):
+    """Opções do formato compacto dos gráficos do dashboard (`formato=compacto`)."""
+    granularidade: str = 'mensal'
+    max_pontos: Optional[int] = None
+    codificacao: str = 'json'
+
+    @validator('granularidade')
+    def granularidade_valida(cls, v: str) -> str:
+        if v not in GRANULARIDADES:
+            raise ValueError(f"Granularidade inválida: {v}. Use {', '.join(GRANULARIDADES)}.")
+        return v
+
+    @validator('max_pontos')
+    def max_pontos_valido(cls, v: Optional[int]) -> Optional[int]:
+        if v is not None and v < 3:
+            raise ValueError('O gráfico precisa de ao menos 3 pontos.')
+        return v
+
+    @validator('codificacao')
+    def codificacao_valida(cls, v: str) -> str:
+        if v not in ('json', 'float32', 'base64'):
+            raise ValueError(f"Codificação inválida: {v}. Use json, float32 ou base64.")
+        return v
+
+    @property
+    def passo(self) -> int:
+        """Meses por ponto do gráfico."""
+        return GRANULARIDADES[self.granularidade]
+
 class UserFilter(db.Model):
     """Modelo para armazenar filtros usados por usuários."""
     id = db.Column(db.Integer, primary_key=True)
@@ -56,4 +117,7 @@ class UserFilter(db.Model):
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
 
     def __repr__(self) -> str:
-        return f'<UserFilter {self.user_id} - {self.mercado} {self.ano_inicio}-{self.mes_inicio} to {self.ano_fim}-{self.mes_fim}>'
\ No newline at end of file
+        return f'<UserFilter {self.user_id} - {self.mercado} {self.ano_inicio}-{self.mes_inicio} to {self.ano_fim}-{self.mes_fim}>'
+
+# Histórico recente do usuário (dashboard): WHERE user_id = ? ORDER BY timestamp DESC LIMIT 5
+db.Index('ix_user_filter_user_id_timestamp', UserFilter.user_id, UserFilter.timestamp.desc())
@@ -0,0 +1,269 @@
+"""
+Perfil de execução de requisições sob demanda.
+
+Com `PROFILING_ENABLED`, uma fração `PROFILING_SAMPLE_RATE` das requisições
+(ou qualquer requisição com o cabeçalho `PROFILING_HEADER` contendo o
+`PROFILING_TOKEN`, ou enviada por um usuário de `PROFILING_ADMINS`) é
+perfilada. No modo `sample`, uma thread amostra a pilha da requisição a cada
+`PROFILING_INTERVAL` segundos e grava pilhas colapsadas (`.folded`, uma
+linha `func;func;func contagem`), prontas para o flamegraph.pl ou o
+speedscope. No modo `cprofile`, grava o `.prof` do cProfile, para o pstats
+ou o snakeviz. Os arquivos ficam num diretório com no máximo
+`PROFILING_MAX_FILES` arquivos, os mais antigos descartados primeiro.
+
+Desligado, nenhum hook é registrado.
+"""
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+from flask import Flask, Response, current_app, g, request
+import cProfile
+import hmac
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+PROFILE_SUFFIXES = ('.folded', '.prof')
+
+
+class StackSampler:
+    """Amostra a pilha de uma thread em intervalos fixos e conta as pilhas colapsadas."""
+
+    def __init__(self, thread_id: int, interval: float = 0.005):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            pilha = []
+            while frame is not None:
+                code = frame.f_code
+                pilha.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            self.stacks[';'.join(reversed(pilha))] += 1
+            self.samples += 1
+
+    def collapsed(self) -> str:
+        return ''.join(f"{pilha} {contagem}\n" for pilha, contagem in self.stacks.most_common())
+
+
+class ProfileStore:
+    """Diretório com os perfis gravados, limitado a `max_files` (descarta os mais antigos)."""
+
+    NAME_PATTERN = re.compile(r'^[\w.-]+$')
+
+    def __init__(self, directory: str, max_files: int = 50):
+        self.directory = directory
+        self.max_files = max_files
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def save(self, name: str, data: bytes) -> str:
+        path = os.path.join(self.directory, name)
+        tmp = f"{path}.tmp"
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+        self._trim()
+        return name
+
+    def _trim(self) -> None:
+        with self._lock:
+            arquivos = self.list()
+            for item in arquivos[self.max_files:]:
+                try:
+                    os.remove(os.path.join(self.directory, item['nome']))
+                except FileNotFoundError:
+                    pass
+
+    def list(self) -> List[Dict[str, Any]]:
+        """Perfis gravados, do mais recente para o mais antigo."""
+        itens = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and entry.name.endswith(PROFILE_SUFFIXES):
+                stat = entry.stat()
+                itens.append({
+                    'nome': entry.name,
+                    'bytes': stat.st_size,
+                    'criado_em': datetime.fromtimestamp(stat.st_mtime, timezone.utc).isoformat(timespec='seconds'),
+                    '_mtime': stat.st_mtime_ns,
+                })
+        itens.sort(key=lambda item: (item['_mtime'], item['nome']), reverse=True)
+        for item in itens:
+            del item['_mtime']
+        return itens
+
+    def path(self, name: str) -> Optional[str]:
+        """Caminho do perfil, ou None se o nome for inválido ou não existir."""
+        if not self.NAME_PATTERN.match(name) or not name.endswith(PROFILE_SUFFIXES):
+            return None
+        path = os.path.join(self.directory, name)
+        return path if os.path.isfile(path) else None
+
+
+def _slug(value: str) -> str:
+    return re.sub(r'[^\w-]+', '_', value).strip('_')[:40] or 'raiz'
+
+
+class RequestProfiler:
+    """Decide quais requisições perfilar e grava o resultado no `ProfileStore`."""
+
+    def __init__(self, store: ProfileStore, sample_rate: float = 0.0, header: str = 'X-Profile',
+                 token: Optional[str] = None, admins: Optional[List[str]] = None, mode: str = 'sample',
+                 interval: float = 0.005, min_ms: float = 0.0):
+        if mode not in ('sample', 'cprofile'):
+            raise ValueError(f"Modo de perfil desconhecido: {mode}")
+        self.store = store
+        self.sample_rate = sample_rate
+        self.header = header
+        self.token = token
+        self.admins = set(admins or ())
+        self.mode = mode
+        self.interval = interval
+        self.min_ms = min_ms
+        self.profiled = 0
+        self.saved = 0
+
+    def is_admin(self, user) -> bool:
+        return bool(getattr(user, 'is_authenticated', False)) and getattr(user, 'username', None) in self.admins
+
+    def requested(self) -> bool:
+        """Se a requisição pede o perfil pelo cabeçalho, com o token ou vinda de um administrador."""
+        valor = request.headers.get(self.header)
+        if not valor:
+            return False
+        if self.token and hmac.compare_digest(valor.encode(), self.token.encode()):
+            return True
+        from flask_login import current_user
+        return self.is_admin(current_user)
+
+    def should_profile(self) -> bool:
+        return (self.sample_rate > 0 and random.random() < self.sample_rate) or self.requested()
+
+    def before_request(self) -> None:
+        if not self.should_profile():
+            return
+        if self.mode == 'cprofile':
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError:
+                # Outro profiler já ativo nesta thread
+                return
+        else:
+            profiler = StackSampler(threading.get_ident(), self.interval)
+            profiler.start()
+        g._profiler = profiler
+        g._profile_start = time.perf_counter()
+        self.profiled += 1
+
+    def after_request(self, response: Response) -> Response:
+        profiler = g.pop('_profiler', None)
+        if profiler is None:
+            return response
+        duracao_ms = (time.perf_counter() - g.pop('_profile_start')) * 1000
+        self._stop(profiler)
+        if duracao_ms < self.min_ms:
+            return response
+        try:
+            name = self._save(profiler, duracao_ms)
+        except OSError as e:
+            logger.error(f"Erro ao gravar o perfil da requisição: {str(e)}")
+            return response
+        response.headers['X-Profile-Id'] = name
+        return response
+
+    def teardown_request(self, exc: Optional[BaseException]) -> None:
+        """
+        Para e descarta o profiler de uma requisição cujo `after_request` não
+        rodou (exceção propagada pela view ou por outro hook). Sem isso a
+        thread de amostragem seguiria viva e o cProfile ficaria ligado na
+        thread, fazendo os próximos perfis falharem.
+        """
+        profiler = g.pop('_profiler', None)
+        if profiler is None:
+            return
+        g.pop('_profile_start', None)
+        self._stop(profiler)
+        logger.info(f"Perfil de {request.method} {request.path} descartado: a requisição terminou com erro")
+
+    @staticmethod
+    def _stop(profiler) -> None:
+        if isinstance(profiler, cProfile.Profile):
+            profiler.disable()
+        else:
+            profiler.stop()
+
+    def _save(self, profiler, duracao_ms: float) -> str:
+        instante = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S%f')
+        base = f"{instante}-{os.getpid()}-{request.method}-{_slug(request.path)}-{duracao_ms:.0f}ms"
+        if isinstance(profiler, cProfile.Profile):
+            path = os.path.join(self.store.directory, f"{base}.prof.tmp")
+            profiler.dump_stats(path)
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.remove(path)
+            name = self.store.save(f"{base}.prof", data)
+        else:
+            name = self.store.save(f"{base}.folded", profiler.collapsed().encode('utf-8'))
+        self.saved += 1
+        logger.info(f"Perfil de {request.method} {request.path} gravado em {name} ({duracao_ms:.0f} ms)")
+        return name
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'mode': self.mode,
+            'sample_rate': self.sample_rate,
+            'profiled': self.profiled,
+            'saved': self.saved,
+            'files': len(self.store.list()),
+        }
+
+
+def init_profiler(app: Flask) -> Optional[RequestProfiler]:
+    """Registra os hooks de perfil quando `PROFILING_ENABLED` estiver ligado; desligado, não custa nada por requisição."""
+    if not app.config.get('PROFILING_ENABLED', False):
+        return None
+    store = ProfileStore(
+        app.config.get('PROFILING_DIR') or os.path.join(app.instance_path, 'profiles'),
+        max_files=app.config.get('PROFILING_MAX_FILES', 50),
+    )
+    profiler = RequestProfiler(
+        store,
+        sample_rate=app.config.get('PROFILING_SAMPLE_RATE', 0.0),
+        header=app.config.get('PROFILING_HEADER', 'X-Profile'),
+        token=app.config.get('PROFILING_TOKEN'),
+        admins=app.config.get('PROFILING_ADMINS', []),
+        mode=app.config.get('PROFILING_MODE', 'sample'),
+        interval=app.config.get('PROFILING_INTERVAL', 0.005),
+        min_ms=app.config.get('PROFILING_MIN_MS', 0.0),
+    )
+    app.before_request(profiler.before_request)
+    app.after_request(profiler.after_request)
+    app.teardown_request(profiler.teardown_request)
+    app.extensions['profiler'] = profiler
+    return profiler
+
+def get_profiler() -> Optional[RequestProfiler]:
+    """Retorna o profiler de requisições do app corrente, se habilitado."""
+    return current_app.extensions.get('profiler')
@@ -0,0 +1,214 @@
+from typing import Iterable, Iterator, List, Optional, Sequence
+from flask import Flask
+from reportlab.graphics import renderPDF
+from reportlab.graphics.charts.lineplots import LinePlot
+from reportlab.graphics.shapes import Drawing, String
+from reportlab import rl_config
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.units import cm
+from reportlab.pdfbase.pdfmetrics import getFont, stringWidth
+from reportlab.pdfgen import canvas
+from reportlab.platypus import Flowable
+import io
+import logging
+
+logger = logging.getLogger(__name__)
+
+PAGE_SIZE = letter
+MARGIN = 1.5 * cm
+ROW_HEIGHT = 16
+HEADER_HEIGHT = 22
+
+TITLE_FONT_SIZE = 16
+HEADER_FONT = 'Helvetica-Bold'
+HEADER_FONT_SIZE = 11
+BODY_FONT = 'Helvetica'
+BODY_FONT_SIZE = 9
+
+
+
+def format_cell(value) -> str:
+    if isinstance(value, float):
+        return f"{value:,.2f}"
+    return str(value)
+
+
+def build_chart(labels: Sequence[str], values: Sequence[float], title: str = 'RPK mensal') -> Optional[Drawing]:
+    """Gráfico de linha da série mensal, desenhado uma vez por relatório."""
+    if not values:
+        return None
+    width = PAGE_SIZE[0] - 2 * MARGIN
+    drawing = Drawing(width, 200)
+    plot = LinePlot()
+    plot.x, plot.y = 40, 30
+    plot.width, plot.height = width - 60, 140
+    plot.data = [list(enumerate(values))]
+    plot.lines[0].strokeColor = colors.HexColor('#FF6200')
+    plot.lines[0].strokeWidth = 1.5
+    plot.xValueAxis.valueMin = 0
+    plot.xValueAxis.valueMax = max(len(values) - 1, 1)
+    step = max(1, len(labels) // 8)
+    plot.xValueAxis.valueSteps = list(range(0, len(labels), step))
+    plot.xValueAxis.labelTextFormat = lambda i: labels[int(i)] if 0 <= int(i) < len(labels) else ''
+    plot.xValueAxis.labels.fontName = BODY_FONT
+    plot.xValueAxis.labels.fontSize = 7
+    plot.yValueAxis.valueMin = 0
+    plot.yValueAxis.labels.fontName = BODY_FONT
+    plot.yValueAxis.labels.fontSize = 7
+    plot.yValueAxis.labelTextFormat = lambda v: f"{v:,.0f}"
+    drawing.add(plot)
+    drawing.add(String(width / 2, 185, title, textAnchor='middle', fontName=HEADER_FONT, fontSize=HEADER_FONT_SIZE))
+    return drawing
+
+
+class RowsPage(Flowable):
+    """
+    Uma página de tabela desenhada direto no canvas.
+
+    Posições de coluna, fontes e cores vêm de um `TableLayout` calculado uma
+    vez por relatório; aqui só se emitem os textos e a grade, sem a medição
+    célula a célula que torna o `Table` do reportlab lento em milhares de linhas.
+    """
+
+    def __init__(self, layout: 'TableLayout', rows: List[List[str]]):
+        super().__init__()
+        self.layout = layout
+        self.rows = rows
+        self.width = layout.width
+        self.height = HEADER_HEIGHT + ROW_HEIGHT * len(rows)
+
+    def wrap(self, available_width, available_height):
+        return self.width, self.height
+
+    def draw(self):
+        canv = self.canv
+        layout = self.layout
+        top = self.height
+        body = top - HEADER_HEIGHT
+
+        canv.setFillColor(colors.beige)
+        canv.rect(0, 0, self.width, body, stroke=0, fill=1)
+        canv.setFillColor(colors.grey)
+        canv.rect(0, body, self.width, HEADER_HEIGHT, stroke=0, fill=1)
+        canv.setStrokeColor(colors.black)
+        canv.setLineWidth(0.5)
+        canv.addLiteral(layout.grid_ops(top, len(self.rows)))
+
+        canv.setFillColor(colors.whitesmoke)
+        canv.setFont(HEADER_FONT, HEADER_FONT_SIZE)
+        baseline = body + (HEADER_HEIGHT - HEADER_FONT_SIZE) / 2 + 2
+        for center, label in zip(layout.centers, layout.columns):
+            canv.drawCentredString(center, baseline, label)
+
+        # O corpo vai num único objeto de texto: só a origem muda por célula,
+        # sem o estado gráfico salvo e restaurado de cada drawCentredString
+        text = canv.beginText()
+        text.setFont(BODY_FONT, BODY_FONT_SIZE)
+        text.setFillColor(colors.black)
+        baseline = body - ROW_HEIGHT + (ROW_HEIGHT - BODY_FONT_SIZE) / 2 + 1
+        for row in self.rows:
+            for center, value in zip(layout.centers, row):
+                text.setTextOrigin(center - layout.text_width(value) / 2, baseline)
+                text.textOut(value)
+            baseline -= ROW_HEIGHT
+        canv.drawText(text)
+
+
+class TableLayout:
+    """Geometria de colunas compartilhada por todas as páginas de um relatório."""
+
+    def __init__(self, columns: List[str], width: float):
+        self.columns = columns
+        self.width = width
+        step = width / len(columns)
+        self.edges = [step * i for i in range(len(columns) + 1)]
+        self.centers = [step * (i + 0.5) for i in range(len(columns))]
+        widths = getFont(BODY_FONT).widths
+        self._char_widths = [widths[code] * BODY_FONT_SIZE / 1000 for code in range(128)]
+        self._columns_ops = ' '.join(f"{x:.2f} {{top:.2f}} m {x:.2f} 0 l" for x in self.edges)
+
+    def text_width(self, value: str) -> float:
+        if value.isascii():
+            return sum(map(self._char_widths.__getitem__, value.encode('ascii')))
+        return stringWidth(value, BODY_FONT, BODY_FONT_SIZE)
+
+    def grid_ops(self, top: float, rows: int) -> str:
+        """Operadores PDF da grade de uma página com `rows` linhas abaixo do cabeçalho."""
+        ops = [self._columns_ops.format(top=top), f"0 {top:.2f} m {self.width:.2f} {top:.2f} l"]
+        y = top - HEADER_HEIGHT
+        for _ in range(rows + 1):
+            ops.append(f"0 {y:.2f} m {self.width:.2f} {y:.2f} l")
+            y -= ROW_HEIGHT
+        ops.append("S")
+        return "\n".join(ops)
+
+
+def _page_chunks(layout: TableLayout, rows: Iterable[Sequence], rows_per_page: int, first_page_rows: int) -> Iterator[RowsPage]:
+    """Quebra as linhas em blocos de uma página, cada um com o cabeçalho."""
+    page: List[List[str]] = []
+    limit = first_page_rows
+    for row in rows:
+        page.append([format_cell(value) for value in row])
+        if len(page) >= limit:
+            yield RowsPage(layout, page)
+            page = []
+            limit = rows_per_page
+    if page:
+        yield RowsPage(layout, page)
+
+
+def build_pdf_report(
+    title: str,
+    columns: List[str],
+    rows: Iterable[Sequence],
+    chart: Optional[Drawing] = None,
+) -> io.BytesIO:
+    """
+    Monta o relatório em PDF paginado.
+
+    As linhas são consumidas do iterável uma página por vez e desenhadas com
+    o mesmo `TableLayout`, então o custo cresce linearmente com o número de
+    linhas e só a página corrente fica em memória como texto. O gráfico, se
+    informado, entra só na primeira página.
+    """
+    buffer = io.BytesIO()
+    canv = canvas.Canvas(buffer, pagesize=PAGE_SIZE)
+    canv.setTitle(title)
+    width, height = PAGE_SIZE
+    layout = TableLayout(columns, width - 2 * MARGIN)
+    rows_per_page = int((height - 2 * MARGIN - HEADER_HEIGHT) // ROW_HEIGHT)
+
+    top = height - MARGIN - TITLE_FONT_SIZE
+    canv.setFont(HEADER_FONT, TITLE_FONT_SIZE)
+    canv.drawCentredString(width / 2, top, title)
+    top -= 12
+    if chart is not None:
+        renderPDF.draw(chart, canv, MARGIN, top - chart.height)
+        top -= chart.height + 12
+    first_page_rows = max(int((top - MARGIN - HEADER_HEIGHT) // ROW_HEIGHT), 1)
+
+    pages = 0
+    for page in _page_chunks(layout, rows, rows_per_page, first_page_rows):
+        if pages:
+            canv.showPage()
+            top = height - MARGIN
+        page.drawOn(canv, MARGIN, top - page.height)
+        pages += 1
+
+    canv.save()
+    buffer.seek(0)
+    logger.info(f"PDF gerado com {pages} página(s) de tabela, {buffer.getbuffer().nbytes} bytes")
+    return buffer
+
+
+def init_reports(app: Flask) -> None:
+    """
+    Aplica `PDF_ASCII85` ao `rl_config` do reportlab.
+
+    A opção é global do processo: vale para todo PDF gerado pelo reportlab
+    no worker, não só para os relatórios deste módulo. Sem o ASCII85, os
+    streams vão só com zlib; o filtro é Python puro e dominava o tempo de
+    geração dos relatórios grandes.
+    """
+    rl_config.useA85 = 1 if app.config.get('PDF_ASCII85', False) else 0
@@ -1,14 +1,71 @@
-from flask import Blueprint, render_template, request, redirect, url_for, jsonify, flash, Response
+from flask import Blueprint, current_app, render_template, request, redirect, url_for, jsonify, flash, Response, abort, send_file, stream_with_context
 from flask_login import login_user, login_required, logout_user, current_user
 from . import db, login_manager
-from .models import User, FilterData, UserFilter
-from .services import get_flight_data, get_flight_RPK, get_flight_data_csv, get_dashboard_initial_data, FlightDataRepository, get_flight_data_pdf
-from datetime import datetime
+from .models import User, ChartFormat, FilterData, RankingRequest, SeriesRequest, UserFilter
+from .services import get_flight_data, get_flight_RPK, get_flight_data_csv, stream_flight_data_csv, get_dashboard_initial_data, get_flight_data_pdf, get_flight_detail_pdf, get_market_series, get_market_ranking, get_result_cache, get_compact_chart, dense_cache_metric, search_markets, ResultCache
+from .repositories import FlightDataRepository, get_repository
+from .database import engine_registry
+from .exports import ExportJob, ExportQueueFull, get_export_manager
+from .history import get_history_recorder
+from .warmup import get_cache_warmer
+from .instrumentation import metrics_authorized, render_metrics
+from .profiling import RequestProfiler, get_profiler
+from datetime import datetime, timezone
+from typing import Callable, Optional, Tuple
 import logging
 
 bp = Blueprint('main', __name__)
 logger = logging.getLogger(__name__)
 
+def _data_validators(kind: str, filter_data: FilterData, repo: FlightDataRepository) -> Tuple[str, Optional[datetime]]:
+    """ETag forte e Last-Modified de uma resposta que só muda quando a ingestão publica uma nova geração."""
+    etag = ResultCache.make_key(kind, filter_data, repo.get_data_generation())[:32]
+    last_modified = repo.get_data_last_modified()
+    if last_modified is not None and last_modified.tzinfo is None:
+        last_modified = last_modified.replace(tzinfo=timezone.utc)
+    return etag, last_modified
+
+def _with_validators(response: Response, etag: str, last_modified: Optional[datetime]) -> Response:
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    # O navegador pode guardar a resposta, mas deve revalidar a cada uso
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+def _not_modified(etag: str, last_modified: Optional[datetime]) -> Optional[Response]:
+    """
+    Retorna um 304 se o ETag enviado ainda corresponde aos dados atuais.
+
+    Só o ETag identifica o filtro: as rotas são POST na mesma URL e o
+    Last-Modified é o mesmo para qualquer filtro, então o If-Modified-Since
+    sozinho validaria um corpo que o cliente nunca recebeu.
+    """
+    if not request.if_none_match or not request.if_none_match.contains(etag):
+        return None
+    return _with_validators(Response(status=304), etag, last_modified)
+
+def _save_filter_history(filter_data: FilterData) -> None:
+    """Registra o filtro no histórico do usuário atual, em segundo plano quando o gravador estiver habilitado."""
+    if not current_user.is_authenticated:
+        return
+    recorder = get_history_recorder()
+    if recorder is not None:
+        recorder.record(current_user.id, filter_data)
+        return
+    user_filter = UserFilter(
+        user_id=current_user.id,
+        mercado=filter_data.mercado,
+        ano_inicio=filter_data.ano_inicio,
+        ano_fim=filter_data.ano_fim,
+        mes_inicio=filter_data.mes_inicio,
+        mes_fim=filter_data.mes_fim
+    )
+    db.session.add(user_filter)
+    db.session.commit()
+    logger.info(f"Filtro salvo no histórico para usuário {current_user.id}")
+
 @login_manager.user_loader
 def load_user(user_id):
     return User.query.get(int(user_id))
@@ -25,6 +82,9 @@ def login():
         user = User.query.filter_by(username=username).first()
         if user and user.check_password(password):
             login_user(user)
+            warmer = get_cache_warmer()
+            if warmer is not None:
+                warmer.schedule(user_id=user.id)
             flash('Login realizado com sucesso!', 'success')
             return redirect(url_for('main.dashboard'))
         flash('Usuário ou senha inválidos.', 'danger')
@@ -61,6 +121,62 @@ def logout():
     return redirect(url_for('main.login'))
 
 
+def _record_warmup(metric: str, filter_data: FilterData, repo: FlightDataRepository) -> None:
+    """
+    Conta o POST do gráfico no relatório de acertos do aquecimento e agenda
+    uma passada quando a ingestão (outro processo) publicar uma nova geração.
+    """
+    warmer = get_cache_warmer()
+    if warmer is None:
+        return
+    generation = repo.get_data_generation()
+    warmer.record_request(metric, filter_data, generation, get_result_cache())
+    warmer.notice_generation(generation)
+
+
+def _chart_format() -> Optional[ChartFormat]:
+    """Opções do formato compacto pedidas no formulário, ou None para o formato de listas (labels/values)."""
+    if request.form.get('formato') != 'compacto':
+        return None
+    max_pontos = request.form.get('max_pontos')
+    return ChartFormat(
+        granularidade=request.form.get('granularidade', 'mensal'),
+        max_pontos=int(max_pontos) if max_pontos else None,
+        codificacao=request.form.get('codificacao', 'json'),
+    )
+
+def _chart_response(filter_data: FilterData, repo: FlightDataRepository, metrica: str, kind: str,
+                    service: Callable[[FilterData, FlightDataRepository], dict]) -> Response:
+    """
+    Resposta condicional de um gráfico do dashboard.
+
+    Com `formato=compacto`, devolve a série densa da métrica na granularidade
+    pedida, reduzida a `max_pontos` (limitado por `CHART_MAX_POINTS`); senão,
+    o formato de listas do serviço legado.
+    """
+    chart_format = _chart_format()
+    if chart_format is None:
+        etag_kind = kind
+        render = lambda: service(filter_data, repo)
+    else:
+        limite = current_app.config.get('CHART_MAX_POINTS', 1000)
+        max_pontos = min(chart_format.max_pontos or limite, limite)
+        kind = dense_cache_metric(metrica, chart_format.granularidade)
+        etag_kind = f"{kind}:{max_pontos}:{chart_format.codificacao}"
+        render = lambda: get_compact_chart(filter_data, repo, metrica, chart_format, max_pontos)
+
+    etag, last_modified = _data_validators(etag_kind, filter_data, repo)
+    _record_warmup(kind, filter_data, repo)
+    not_modified = _not_modified(etag, last_modified)
+    if not_modified:
+        _save_filter_history(filter_data)
+        return not_modified
+
+    chart_data = render()
+    _save_filter_history(filter_data)
+    return _with_validators(jsonify(chart_data), etag, last_modified)
+
+
 @bp.route('/dashboard', methods=['GET', 'POST'])
 @login_required
 def dashboard():
@@ -71,22 +187,7 @@ def dashboard():
         Para GET: Renderiza o template do dashboard.
         Para POST: Retorna JSON com dados do gráfico.
     """
-    repo = FlightDataRepository()
-    initial_data = get_dashboard_initial_data(repo)
-    mercados = initial_data['mercados']
-    anos = initial_data['anos']
-    current_year, current_month = datetime.now().year, datetime.now().month
-
-    # Pega histórico de consultas do usuário e formata os meses
-    history = UserFilter.query.filter_by(user_id=current_user.id).order_by(UserFilter.timestamp.desc()).limit(5).all()
-    history_formatted = [
-        {
-            'mercado': f.mercado,
-            'periodo': f"{f.ano_inicio}-{f.mes_inicio:02d} a {f.ano_fim}-{f.mes_fim:02d}",
-            'timestamp': f.timestamp.strftime('%d/%m/%Y %H:%M')
-        }
-        for f in history
-    ]
+    repo = get_repository()
 
     if request.method == 'POST':
         try:
@@ -97,22 +198,7 @@ def dashboard():
                 mes_inicio=int(request.form.get('mes_inicio', 1)),
                 mes_fim=int(request.form.get('mes_fim', 12))
             )
-            chart_data = get_flight_data(filter_data, repo)
-            
-            # Salva o filtro no histórico
-            user_filter = UserFilter(
-                user_id=current_user.id,
-                mercado=filter_data.mercado,
-                ano_inicio=filter_data.ano_inicio,
-                ano_fim=filter_data.ano_fim,
-                mes_inicio=filter_data.mes_inicio,
-                mes_fim=filter_data.mes_fim
-            )
-            db.session.add(user_filter)
-            db.session.commit()
-            logger.info(f"Filtro salvo no histórico para usuário {current_user.id}")
-
-            return jsonify(chart_data)
+            return _chart_response(filter_data, repo, 'RPK', 'chart_rpk', get_flight_data)
         except ValueError as e:
             logger.error(f"Erro de validação: {str(e)}")
             return jsonify({'error': str(e)}), 400
@@ -120,9 +206,26 @@ def dashboard():
             logger.error(f"Erro interno: {str(e)}")
             return jsonify({'error': 'Erro interno no servidor.'}), 500
 
+    # Os mercados não vão no HTML: o campo os busca em /api/markets conforme o usuário digita
+    initial_data = get_dashboard_initial_data(repo)
+    total_mercados = len(initial_data['mercados'])
+    anos = initial_data['anos']
+    current_year, current_month = datetime.now().year, datetime.now().month
+
+    # Pega histórico de consultas do usuário e formata os meses
+    history = UserFilter.query.filter_by(user_id=current_user.id).order_by(UserFilter.timestamp.desc()).limit(5).all()
+    history_formatted = [
+        {
+            'mercado': f.mercado,
+            'periodo': f"{f.ano_inicio}-{f.mes_inicio:02d} a {f.ano_fim}-{f.mes_fim:02d}",
+            'timestamp': f.timestamp.strftime('%d/%m/%Y %H:%M')
+        }
+        for f in history
+    ]
+
     return render_template(
         'dashboard.html',
-        mercados=mercados,
+        total_mercados=total_mercados,
         anos=anos,
         current_year=current_year,
         current_month=current_month,
@@ -132,7 +235,13 @@ def dashboard():
 @bp.route('/export_csv', methods=['POST'])
 @login_required
 def export_csv():
-    repo = FlightDataRepository()
+    """
+    Exporta os dados filtrados como CSV.
+
+    Com `modo=voos` exporta os voos individuais em streaming (gzip quando o
+    cliente aceita); caso contrário, o agregado mensal.
+    """
+    repo = get_repository()
     try:
         filter_data = FilterData(
             mercado=request.form['mercado'],
@@ -141,13 +250,21 @@ def export_csv():
             mes_inicio=int(request.form.get('mes_inicio', 1)),
             mes_fim=int(request.form.get('mes_fim', 12))
         )
+        if request.form.get('modo') == 'voos':
+            return _export_flights_csv(filter_data, repo)
+
+        etag, last_modified = _data_validators('csv', filter_data, repo)
+        not_modified = _not_modified(etag, last_modified)
+        if not_modified:
+            return not_modified
+
         csv_content = get_flight_data_csv(filter_data, repo)
         filename = f"rpk_{filter_data.mercado}_{filter_data.ano_inicio}-{filter_data.mes_inicio}_to_{filter_data.ano_fim}-{filter_data.mes_fim}.csv"
-        return Response(
+        return _with_validators(Response(
             csv_content,
             mimetype="text/csv",
             headers={"Content-Disposition": f"attachment;filename={filename}"}
-        )
+        ), etag, last_modified)
     except ValueError as e:
         logger.error(f"Erro ao exportar CSV: {str(e)}")
         flash(f"Erro: {str(e)}", 'danger')
@@ -157,70 +274,124 @@ def export_csv():
         flash("Erro interno ao gerar o CSV.", 'danger')
         return redirect(url_for('main.dashboard'))
 
-@bp.route('/rpk', methods=['POST'] )
-def rpk_quadrado():
+def _export_flights_csv(filter_data: FilterData, repo: FlightDataRepository) -> Response:
+    """Resposta em streaming com os voos filtrados, lidos do banco em lotes."""
+    compress = current_app.config.get('CSV_EXPORT_GZIP', True) and 'gzip' in request.accept_encodings
+    etag, last_modified = _data_validators('csv_voos', filter_data, repo)
+    if compress:
+        etag += '-gz'
+    not_modified = _not_modified(etag, last_modified)
+    if not_modified:
+        return not_modified
 
-    repo = FlightDataRepository()
-    initial_data = get_dashboard_initial_data(repo)
-    mercados = initial_data['mercados']
-    anos = initial_data['anos']
-    current_year, current_month = datetime.now().year, datetime.now().month
-
-    logger.info("")
-    logger.info("INFOFOFOFOO")
-    logger.info("")
+    chunks = stream_flight_data_csv(
+        filter_data, repo,
+        batch_size=current_app.config.get('CSV_EXPORT_BATCH_SIZE', 10000),
+        compress=compress,
+    )
+    filename = f"voos_{filter_data.mercado}_{filter_data.ano_inicio}-{filter_data.mes_inicio}_to_{filter_data.ano_fim}-{filter_data.mes_fim}.csv"
+    response = Response(
+        stream_with_context(chunks),
+        mimetype="text/csv",
+        headers={"Content-Disposition": f"attachment;filename={filename}"}
+    )
+    response.vary.add('Accept-Encoding')
+    if compress:
+        response.content_encoding = 'gzip'
+    return _with_validators(response, etag, last_modified)
 
-    if request.method == 'POST':
-        try:
-            filter_data = FilterData(
-                mercado=request.form['mercado'],
-                ano_inicio=int(request.form['ano_inicio']),
-                ano_fim=int(request.form['ano_fim']),
-                mes_inicio=int(request.form.get('mes_inicio', 1)),
-                mes_fim=int(request.form.get('mes_fim', 12))
-            )
+@bp.route('/rpk', methods=['POST'] )
+def rpk_quadrado():
+    repo = get_repository()
 
-            logger.info("")
-            logger.info(filter_data)
-            logger.info("")
-            
-            chart_data = get_flight_RPK(filter_data, repo)
-            
-            # Salva o filtro no histórico
-            user_filter = UserFilter(
-                user_id=current_user.id,
-                mercado=filter_data.mercado,
-                ano_inicio=filter_data.ano_inicio,
-                ano_fim=filter_data.ano_fim,
-                mes_inicio=filter_data.mes_inicio,
-                mes_fim=filter_data.mes_fim
-            )
-            db.session.add(user_filter)
-            db.session.commit()
-            logger.info(f"Filtro salvo no histórico para usuário {current_user.id}")
+    try:
+        filter_data = FilterData(
+            mercado=request.form['mercado'],
+            ano_inicio=int(request.form['ano_inicio']),
+            ano_fim=int(request.form['ano_fim']),
+            mes_inicio=int(request.form.get('mes_inicio', 1)),
+            mes_fim=int(request.form.get('mes_fim', 12))
+        )
 
-            return jsonify(chart_data)
-        except ValueError as e:
-            logger.error(f"Erro de validação: {str(e)}")
-            return jsonify({'error': str(e)}), 400
-        except Exception as e:
-            logger.error(f"Erro interno: {str(e)}")
-            return jsonify({'error': 'Erro interno no servidor.'}), 500
+        return _chart_response(filter_data, repo, 'LOAD_FACTOR', 'chart_load_factor', get_flight_RPK)
+    except ValueError as e:
+        logger.error(f"Erro de validação: {str(e)}")
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Erro interno: {str(e)}")
+        return jsonify({'error': 'Erro interno no servidor.'}), 500
 
-    return render_template(
-        'dashboard.html',
+def _series_request() -> SeriesRequest:
+    """Lê a consulta de séries do corpo JSON ou dos parâmetros (`mercados` e `metricas` repetidos ou separados por vírgula)."""
+    if request.is_json:
+        return SeriesRequest.model_validate(request.get_json())
+    args = request.values
+    mercados = [mercado for valor in args.getlist('mercados') for mercado in valor.split(',')]
+    metricas = [metrica for valor in args.getlist('metricas') for metrica in valor.split(',')] or ['RPK']
+    return SeriesRequest(
         mercados=mercados,
-        anos=anos,
-        current_year=current_year,
-        current_month=current_month,
-        history=history_formatted 
+        metricas=metricas,
+        ano_inicio=int(args['ano_inicio']),
+        ano_fim=int(args['ano_fim']),
+        mes_inicio=int(args.get('mes_inicio', 1)),
+        mes_fim=int(args.get('mes_fim', 12)),
     )
 
+@bp.route('/api/series', methods=['GET', 'POST'])
+@login_required
+def market_series():
+    """Retorna as séries de vários mercados no mesmo período, alinhadas num eixo de períodos comum."""
+    try:
+        series_request = _series_request()
+        data = get_market_series(series_request, get_repository(), current_app.config.get('SERIES_MAX_MARKETS', 20))
+    except KeyError as e:
+        return jsonify({'error': f"Parâmetro obrigatório ausente: {e.args[0]}"}), 400
+    except ValueError as e:
+        logger.error(f"Erro de validação: {str(e)}")
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Erro interno: {str(e)}")
+        return jsonify({'error': 'Erro interno no servidor.'}), 500
+    response = jsonify(data)
+    response.headers['Server-Timing'] = ', '.join(f"{etapa};dur={duracao}" for etapa, duracao in data['tempos_ms'].items())
+    return response
+
+@bp.route('/api/rankings')
+@login_required
+def market_rankings():
+    """Retorna os `n` mercados com maior valor de uma métrica (RPK, ASK, VOOS ou LOAD_FACTOR) no período."""
+    args = request.args
+    try:
+        ranking_request = RankingRequest(
+            metrica=args.get('metrica', 'RPK'),
+            n=int(args.get('n', 10)),
+            ano_inicio=int(args['ano_inicio']),
+            ano_fim=int(args['ano_fim']),
+            mes_inicio=int(args.get('mes_inicio', 1)),
+            mes_fim=int(args.get('mes_fim', 12)),
+        )
+        data = get_market_ranking(ranking_request, get_repository(), current_app.config.get('RANKINGS_MAX_N', 100))
+    except KeyError as e:
+        return jsonify({'error': f"Parâmetro obrigatório ausente: {e.args[0]}"}), 400
+    except ValueError as e:
+        logger.error(f"Erro de validação: {str(e)}")
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Erro interno: {str(e)}")
+        return jsonify({'error': 'Erro interno no servidor.'}), 500
+    response = jsonify(data)
+    response.headers['Server-Timing'] = f"ranking;dur={data['tempo_ms']};desc=\"{data['fonte']}\""
+    return response
+
 @bp.route('/export_pdf', methods=['POST'])
 @login_required
 def export_pdf():
-    """Exporta os dados filtrados do dashboard como PDF."""
-    repo = FlightDataRepository()
+    """
+    Exporta os dados filtrados do dashboard como PDF.
+
+    Por padrão o relatório traz o resumo mensal; com `modo=voos`, os voos individuais.
+    """
+    repo = get_repository()
     try:
         filter_data = FilterData(
             mercado=request.form['mercado'],
@@ -229,16 +400,25 @@ def export_pdf():
             mes_inicio=int(request.form.get('mes_inicio', 1)),
             mes_fim=int(request.form.get('mes_fim', 12))
         )
-        pdf_buffer = get_flight_data_pdf(filter_data, repo)
+        detalhado = request.form.get('modo') == 'voos'
+        etag, last_modified = _data_validators('pdf_voos' if detalhado else 'pdf', filter_data, repo)
+        not_modified = _not_modified(etag, last_modified)
+        if not_modified:
+            return not_modified
+
+        if detalhado:
+            pdf_buffer = get_flight_detail_pdf(filter_data, repo, current_app.config.get('CSV_EXPORT_BATCH_SIZE', 10000))
+        else:
+            pdf_buffer = get_flight_data_pdf(filter_data, repo)
         if not pdf_buffer:
             flash("Nenhum dado para exportar em PDF.", 'danger')
             return redirect(url_for('main.dashboard'))
-        filename = f"rpk_{filter_data.mercado}_{filter_data.ano_inicio}-{filter_data.mes_inicio}_to_{filter_data.ano_fim}-{filter_data.mes_fim}.pdf"
-        return Response(
+        filename = f"{'voos' if detalhado else 'rpk'}_{filter_data.mercado}_{filter_data.ano_inicio}-{filter_data.mes_inicio}_to_{filter_data.ano_fim}-{filter_data.mes_fim}.pdf"
+        return _with_validators(Response(
             pdf_buffer,
             mimetype="application/pdf",
             headers={"Content-Disposition": f"attachment;filename={filename}"}
-        )
+        ), etag, last_modified)
     except ValueError as e:
         logger.error(f"Erro ao exportar PDF: {str(e)}")
         flash(f"Erro: {str(e)}", 'danger')
@@ -246,4 +426,156 @@ def export_pdf():
     except Exception as e:
         logger.error(f"Erro interno ao exportar PDF: {str(e)}")
         flash("Erro interno ao gerar o PDF.", 'danger')
-        return redirect(url_for('main.dashboard'))
\ No newline at end of file
+        return redirect(url_for('main.dashboard'))
+
+def _export_status(job: ExportJob) -> dict:
+    data = job.to_dict()
+    data['status_url'] = url_for('main.export_status', job_id=job.id)
+    data['download_url'] = url_for('main.export_download', job_id=job.id) if job.arquivo else None
+    return data
+
+@bp.route('/exports', methods=['POST'])
+@login_required
+def create_export():
+    """
+    Enfileira uma exportação em segundo plano.
+
+    Recebe os filtros do dashboard mais `formato` (csv ou pdf) e `modo`
+    (mensal ou voos) e retorna o job; pedidos idênticos compartilham o mesmo job.
+    """
+    repo = get_repository()
+    try:
+        filter_data = FilterData(
+            mercado=request.form['mercado'],
+            ano_inicio=int(request.form['ano_inicio']),
+            ano_fim=int(request.form['ano_fim']),
+            mes_inicio=int(request.form.get('mes_inicio', 1)),
+            mes_fim=int(request.form.get('mes_fim', 12))
+        )
+        job = get_export_manager().submit(
+            request.form.get('formato', 'csv'), request.form.get('modo', 'mensal'), filter_data, repo
+        )
+        return jsonify(_export_status(job)), 202
+    except ExportQueueFull as e:
+        return jsonify({'error': str(e)}), 503, {'Retry-After': '5'}
+    except ValueError as e:
+        logger.error(f"Erro de validação: {str(e)}")
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Erro interno ao enfileirar exportação: {str(e)}")
+        return jsonify({'error': 'Erro interno no servidor.'}), 500
+
+@bp.route('/exports/<job_id>')
+@login_required
+def export_status(job_id):
+    """Retorna o status e o progresso de uma exportação."""
+    job = get_export_manager().get(job_id)
+    if job is None:
+        return jsonify({'error': 'Exportação não encontrada ou expirada.'}), 404
+    return jsonify(_export_status(job))
+
+@bp.route('/exports/<job_id>/download')
+@login_required
+def export_download(job_id):
+    """Serve o arquivo de uma exportação concluída."""
+    manager = get_export_manager()
+    job = manager.get(job_id)
+    if job is None:
+        abort(404)
+    path = manager.result_path(job)
+    if path is None:
+        return jsonify({'error': 'Exportação ainda não concluída.', 'status': job.status}), 409
+    return send_file(path, mimetype=job.mimetype, as_attachment=True, download_name=job.filename)
+
+@bp.route('/metrics')
+def metrics():
+    """Métricas do worker atual no formato texto do Prometheus, só com o token ou de um endereço liberado."""
+    if current_app.extensions.get('metrics') is None:
+        abort(404)
+    if not metrics_authorized():
+        return Response('Não autorizado.', status=401, headers={'WWW-Authenticate': 'Bearer'})
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+def _profiling_admin() -> RequestProfiler:
+    """Profiler do app, se habilitado e se o usuário for administrador de perfis; senão 404/403."""
+    profiler = get_profiler()
+    if profiler is None:
+        abort(404)
+    if not profiler.is_admin(current_user):
+        abort(403)
+    return profiler
+
+@bp.route('/admin/profiles')
+@login_required
+def profiles():
+    """Lista os perfis de requisições gravados, do mais recente para o mais antigo."""
+    profiler = _profiling_admin()
+    return jsonify({'profiles': profiler.store.list(), **profiler.stats()})
+
+@bp.route('/admin/profiles/<name>')
+@login_required
+def profile_download(name):
+    """Baixa um perfil gravado (`.folded` para flamegraph, `.prof` para pstats)."""
+    profiler = _profiling_admin()
+    path = profiler.store.path(name)
+    if path is None:
+        abort(404)
+    mimetype = 'text/plain' if name.endswith('.folded') else 'application/octet-stream'
+    return send_file(path, mimetype=mimetype, as_attachment=True, download_name=name)
+
+@bp.route('/api/markets')
+@login_required
+def markets():
+    """
+    Autocompletar de mercados do dashboard.
+
+    `q` casa com o início do mercado ou com o início de um dos aeroportos
+    (`SBGR` traz todos os mercados de Guarulhos); sem `q`, os mais
+    consultados. `limit` vai até `MARKET_SEARCH_MAX_LIMIT`.
+    """
+    try:
+        limit = int(request.args.get('limit', current_app.config.get('MARKET_SEARCH_LIMIT', 20)))
+    except ValueError:
+        return jsonify({'error': 'O parâmetro limit deve ser um número inteiro.'}), 400
+    limit = max(1, min(limit, current_app.config.get('MARKET_SEARCH_MAX_LIMIT', 100)))
+    data = search_markets(request.args.get('q', ''), get_repository(), limit)
+    data['limit'] = limit
+    response = jsonify(data)
+    # A lista muda pouco: o navegador reaproveita a resposta por alguns segundos enquanto o usuário digita
+    response.cache_control.private = True
+    response.cache_control.max_age = current_app.config.get('MARKET_SEARCH_MAX_AGE', 60)
+    return response
+
+@bp.route('/api/pool-stats')
+@login_required
+def pool_stats():
+    """Retorna o estado dos pools de conexão do worker atual."""
+    return jsonify(engine_registry.stats())
+
+@bp.route('/api/cache-stats')
+@login_required
+def cache_stats():
+    """Retorna os contadores do cache de resultados do worker atual."""
+    cache = get_result_cache()
+    return jsonify(cache.stats() if cache else {})
+
+@bp.route('/api/history-stats')
+@login_required
+def history_stats():
+    """Retorna a profundidade da fila e os tempos de gravação do histórico de filtros do worker atual."""
+    recorder = get_history_recorder()
+    return jsonify(recorder.stats() if recorder else {})
+
+@bp.route('/api/warmup-stats')
+@login_required
+def warmup_stats():
+    """Retorna a taxa de POSTs do dashboard atendidos pelo cache e o resultado das passadas de aquecimento do worker atual."""
+    warmer = get_cache_warmer()
+    return jsonify(warmer.stats() if warmer else {})
+
+@bp.route('/api/cube-stats')
+@login_required
+def cube_stats():
+    """Retorna dimensões, memória e tempo de montagem do cubo de métricas do worker atual."""
+    provider = current_app.extensions.get('metric_cube')
+    return jsonify(provider.stats() if provider else {})
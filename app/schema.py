@@ -0,0 +1,84 @@
+from sqlalchemy import MetaData, Table, Column, Index, Integer, String, Float, DateTime
+
+# Metadados das tabelas derivadas dos dados da ANAC. Ficam separados do
+# `db.metadata` do Flask-SQLAlchemy para que `db.create_all()` não crie
+# tabelas de dados vazias no banco da aplicação.
+flight_metadata = MetaData()
+
+flight_catalog = Table(
+    'flight_catalog',
+    flight_metadata,
+    Column('MERCADO', String(16), primary_key=True),
+    Column('ANO', Integer, primary_key=True),
+    Column('MES', Integer, primary_key=True),
+)
+
+flight_data = Table(
+    'flight_data',
+    flight_metadata,
+    Column('ANO', Integer),
+    Column('MES', Integer),
+    Column('MERCADO', String),
+    Column('RPK', Float),
+    Column('ASK', Float),
+    # Chave inteira ANO * 100 + MES, permite filtrar períodos com BETWEEN
+    Column('PERIODO', Integer),
+    Index('ix_flight_data_mercado_periodo', 'MERCADO', 'PERIODO'),
+    Index('ix_flight_data_periodo', 'PERIODO'),
+)
+
+# Cópia vazia de flight_data onde os períodos novos são carregados antes da troca
+flight_data_staging = Table(
+    'flight_data_staging',
+    flight_metadata,
+    *[Column(c.name, c.type) for c in flight_data.columns],
+)
+
+# Uma linha por arquivo ingerido; `generation` só avança quando algum período muda
+ingest_manifest = Table(
+    'ingest_manifest',
+    flight_metadata,
+    Column('id', Integer, primary_key=True, autoincrement=True),
+    Column('generation', Integer, nullable=False),
+    Column('source', String(512), nullable=False),
+    Column('checksum', String(64), nullable=False),
+    Column('periods_loaded', Integer, nullable=False),
+    Column('rows_loaded', Integer, nullable=False),
+    Column('loaded_at', DateTime, nullable=False),
+)
+
+# Resumo do conteúdo de cada período carregado, usado para detectar mudanças
+ingest_periods = Table(
+    'ingest_periods',
+    flight_metadata,
+    Column('ANO', Integer, primary_key=True),
+    Column('MES', Integer, primary_key=True),
+    Column('digest', String(64), nullable=False),
+    Column('rows', Integer, nullable=False),
+    Column('generation', Integer, nullable=False),
+)
+
+# Agregado mensal por mercado, reconstruído a cada ingestão para os períodos alterados
+flight_monthly = Table(
+    'flight_monthly',
+    flight_metadata,
+    Column('MERCADO', String(16), primary_key=True),
+    Column('PERIODO', Integer, primary_key=True),
+    Column('ANO', Integer, nullable=False),
+    Column('MES', Integer, nullable=False),
+    Column('RPK', Float),
+    Column('ASK', Float),
+    Column('VOOS', Integer, nullable=False),
+)
+
+# Os RANKING_DEPTH maiores mercados de cada período em cada métrica do
+# ranking, reconstruído a cada ingestão junto com o agregado mensal
+flight_rankings = Table(
+    'flight_rankings',
+    flight_metadata,
+    Column('METRICA', String(16), primary_key=True),
+    Column('PERIODO', Integer, primary_key=True),
+    Column('POSICAO', Integer, primary_key=True),
+    Column('MERCADO', String(16), nullable=False),
+    Column('VALOR', Float, nullable=False),
+)
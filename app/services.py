@@ -1,16 +1,513 @@
-from typing import List, Dict, Union
-from flask import flash
+from typing import Any, Callable, Iterator, List, Dict, Optional, Sequence, Tuple, Union
+from dataclasses import dataclass
+from collections import OrderedDict
+from flask import Flask, current_app, has_app_context
+import numpy as np
 import pandas as pd
+import base64
+import csv
+import functools
+import itertools
+import hashlib
+import json
 import logging
 import io 
-from .models import FilterData
+import os
+import pickle
+import sqlite3
+import threading
+import time
+import zlib
+from .cube import MarketSeries, get_metric_cube, period_labels
+from .catalog import MarketCoverage
+from .downsampling import lttb_indices
+from .instrumentation import timed
+from .market_index import get_market_popularity
+from .ingest import RANKING_DEPTH, RANKING_EXPRESSIONS
+from .models import GRANULARIDADES, ChartFormat, FilterData, RankingRequest, SeriesRequest
 from .repositories import FlightDataRepository
-from reportlab.lib.pagesizes import letter
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle
-from reportlab.lib import colors
+from .reports import build_chart, build_pdf_report
 
 logger = logging.getLogger(__name__)
 
+
+class MemoryCacheBackend:
+    """Backend em memória do processo, com despejo LRU por número de entradas e bytes."""
+
+    def __init__(self, max_entries: int = 512, max_bytes: int = 64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: 'OrderedDict[str, Tuple[int, bytes, Optional[float]]]' = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[2] is not None and entry[2] < time.time():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key: str, value: bytes, generation: int, expires_at: Optional[float]) -> int:
+        """Grava a entrada e retorna quantas outras foram despejadas."""
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (generation, value, expires_at)
+            self._bytes += len(value)
+            evicted = 0
+            while len(self._entries) > 1 and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                self._remove(next(iter(self._entries)))
+                evicted += 1
+            return evicted
+
+    def purge(self, generation: int) -> None:
+        """Remove as entradas de gerações diferentes da informada."""
+        with self._lock:
+            for key in [k for k, entry in self._entries.items() if entry[0] != generation]:
+                self._remove(key)
+
+    def _remove(self, key: str) -> None:
+        _, value, _ = self._entries.pop(key)
+        self._bytes -= len(value)
+
+    def size(self) -> Tuple[int, int]:
+        with self._lock:
+            return len(self._entries), self._bytes
+
+
+class SQLiteCacheBackend:
+    """
+    Backend em arquivo SQLite, compartilhado pelos workers do gunicorn.
+
+    O LRU usa a coluna `last_access`, atualizada a cada leitura.
+    """
+
+    def __init__(self, path: str, max_entries: int = 4096, max_bytes: int = 256 * 1024 * 1024):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS result_cache ('
+                'key TEXT PRIMARY KEY, generation INTEGER NOT NULL, value BLOB NOT NULL, '
+                'size INTEGER NOT NULL, expires_at REAL, last_access REAL NOT NULL)'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS ix_result_cache_last_access ON result_cache (last_access)')
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=5, isolation_level=None)
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._connect() as conn:
+            row = conn.execute('SELECT value, expires_at FROM result_cache WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                return None
+            if row[1] is not None and row[1] < time.time():
+                conn.execute('DELETE FROM result_cache WHERE key = ?', (key,))
+                return None
+            conn.execute('UPDATE result_cache SET last_access = ? WHERE key = ?', (time.time(), key))
+            return row[0]
+
+    def set(self, key: str, value: bytes, generation: int, expires_at: Optional[float]) -> int:
+        """Grava a entrada e retorna quantas outras foram despejadas."""
+        with self._connect() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO result_cache (key, generation, value, size, expires_at, last_access) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (key, generation, value, len(value), expires_at, time.time())
+            )
+            evicted = 0
+            count, total = conn.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM result_cache').fetchone()
+            while count > 1 and (count > self.max_entries or total > self.max_bytes):
+                oldest = conn.execute(
+                    'SELECT key, size FROM result_cache WHERE key != ? ORDER BY last_access LIMIT 1', (key,)
+                ).fetchone()
+                if oldest is None:
+                    break
+                conn.execute('DELETE FROM result_cache WHERE key = ?', (oldest[0],))
+                count, total, evicted = count - 1, total - oldest[1], evicted + 1
+            return evicted
+
+    def purge(self, generation: int) -> None:
+        with self._connect() as conn:
+            conn.execute('DELETE FROM result_cache WHERE generation != ?', (generation,))
+
+    def size(self) -> Tuple[int, int]:
+        with self._connect() as conn:
+            return conn.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM result_cache').fetchone()
+
+
+class ResultCache:
+    """
+    Cache de resultados dos serviços, chaveado pelo filtro normalizado e pela métrica.
+
+    As entradas são gravadas serializadas junto com a geração de dados; quando
+    a ingestão publica uma nova geração, as entradas antigas são descartadas.
+    """
+
+    def __init__(self, backend, ttl: Optional[float] = None):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._generation: Optional[int] = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(metric: str, filter_data: FilterData, generation: int) -> str:
+        raw = json.dumps({'metric': metric, 'generation': generation, 'filter': filter_data.model_dump()}, sort_keys=True)
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def _check_generation(self, generation: int) -> None:
+        if generation == self._generation:
+            return
+        with self._lock:
+            if self._generation is not None and generation != self._generation:
+                self.backend.purge(generation)
+                self.invalidations += 1
+                logger.info(f"Cache de resultados invalidado pela geração de dados {generation}")
+            self._generation = generation
+
+    def get_or_compute(self, metric: str, filter_data: FilterData, generation: int, compute: Callable[[], Any]) -> Any:
+        """Retorna o resultado em cache ou calcula, grava e retorna. Resultados `None` não são gravados."""
+        self._check_generation(generation)
+        key = self.make_key(metric, filter_data, generation)
+        cached = self.backend.get(key)
+        if cached is not None:
+            with self._lock:
+                self.hits += 1
+            return pickle.loads(cached)
+
+        with self._lock:
+            self.misses += 1
+        value = compute()
+        if value is None:
+            return value
+        data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        expires_at = time.time() + self.ttl if self.ttl else None
+        evicted = self.backend.set(key, data, generation, expires_at)
+        with self._lock:
+            self.evictions += evicted
+        # Devolve uma cópia, como num acerto, para que o chamador não altere a entrada
+        return pickle.loads(data)
+
+    def contains(self, metric: str, filter_data: FilterData, generation: int) -> bool:
+        """Se o resultado está em cache, sem contar acerto ou falta."""
+        self._check_generation(generation)
+        return self.backend.get(self.make_key(metric, filter_data, generation)) is not None
+
+    def stats(self) -> Dict[str, Any]:
+        entries, size = self.backend.size()
+        return {
+            'backend': type(self.backend).__name__,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'invalidations': self.invalidations,
+            'entries': entries,
+            'bytes': size,
+            'generation': self._generation,
+        }
+
+
+def init_result_cache(app: Flask) -> Optional[ResultCache]:
+    """Configura o cache de resultados do app a partir das chaves `RESULT_CACHE_*`."""
+    backend_name = app.config.get('RESULT_CACHE_BACKEND', 'memory')
+    if not backend_name:
+        return None
+    max_entries = app.config.get('RESULT_CACHE_MAX_ENTRIES', 512)
+    max_bytes = app.config.get('RESULT_CACHE_MAX_BYTES', 64 * 1024 * 1024)
+    if backend_name == 'sqlite':
+        path = app.config.get('RESULT_CACHE_PATH') or os.path.join(app.instance_path, 'result_cache.db')
+        backend = SQLiteCacheBackend(path, max_entries=max_entries, max_bytes=max_bytes)
+    elif backend_name == 'memory':
+        backend = MemoryCacheBackend(max_entries=max_entries, max_bytes=max_bytes)
+    else:
+        raise ValueError(f"Backend de cache desconhecido: {backend_name}")
+    cache = ResultCache(backend, ttl=app.config.get('RESULT_CACHE_TTL'))
+    app.extensions['result_cache'] = cache
+    return cache
+
+def get_result_cache() -> Optional[ResultCache]:
+    """Retorna o cache de resultados do app corrente, se houver."""
+    if not has_app_context():
+        return None
+    return current_app.extensions.get('result_cache')
+
+def cached_result(metric: str):
+    """Decora um serviço `(filter_data, repo)` para passar pelo cache de resultados do app."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(filter_data: FilterData, repo: FlightDataRepository):
+            cache = get_result_cache()
+            if cache is None:
+                return func(filter_data, repo)
+            return cache.get_or_compute(metric, filter_data, repo.get_data_generation(), lambda: func(filter_data, repo))
+        return wrapper
+    return decorator
+
+# --- Motor de métricas -------------------------------------------------------
+#
+# Cada métrica é uma função vetorizada sobre a série mensal de um mercado
+# (`MarketSeries`, só os meses com voos). O registro declara quanto histórico
+# anterior ao período a métrica precisa, para que uma única busca atenda a
+# todas as métricas pedidas.
+
+@dataclass(frozen=True)
+class Metric:
+    """Métrica registrada no motor: nome, título para gráficos e cálculo vetorizado."""
+    nome: str
+    titulo: str
+    calcular: Callable[[MarketSeries], np.ndarray]
+    meses_anteriores: int = 0
+
+METRICS: Dict[str, Metric] = {}
+
+def register_metric(nome: str, titulo: str, meses_anteriores: int = 0):
+    """Registra a função decorada como a métrica `nome`."""
+    def decorator(func: Callable[[MarketSeries], np.ndarray]):
+        METRICS[nome] = Metric(nome, titulo, func, meses_anteriores)
+        return func
+    return decorator
+
+@register_metric('RPK', 'RPK mensal')
+def _rpk(series: MarketSeries) -> np.ndarray:
+    return series.rpk
+
+@register_metric('ASK', 'ASK mensal')
+def _ask(series: MarketSeries) -> np.ndarray:
+    return series.ask
+
+@register_metric('VOOS', 'Voos por mês')
+def _voos(series: MarketSeries) -> np.ndarray:
+    return series.voos
+
+@register_metric('LOAD_FACTOR', 'Load factor (RPK/ASK)')
+def _load_factor(series: MarketSeries) -> np.ndarray:
+    # Razão das somas do mês; meses sem ASK ficam sem valor em vez de inf
+    return np.divide(series.rpk, series.ask, out=np.full(len(series), np.nan), where=series.ask > 0)
+
+def _year_over_year(calcular: Callable[[MarketSeries], np.ndarray], relativa: bool) -> Callable[[MarketSeries], np.ndarray]:
+    """Variação de cada mês contra o mesmo mês do ano anterior, sem valor quando ele não existe."""
+    def year_over_year(series: MarketSeries) -> np.ndarray:
+        valores = calcular(series)
+        resultado = np.full(len(valores), np.nan)
+        if not len(valores):
+            return resultado
+        meses = (series.periodos // 100) * 12 + series.periodos % 100
+        anterior = np.minimum(np.searchsorted(meses, meses - 12), len(meses) - 1)
+        existe = meses[anterior] == meses - 12
+        base = valores[anterior]
+        if relativa:
+            np.divide(valores - base, base, out=resultado, where=existe & (base != 0))
+        else:
+            np.subtract(valores, base, out=resultado, where=existe)
+        return resultado
+    return year_over_year
+
+for _nome, _relativa in (('RPK', True), ('ASK', True), ('LOAD_FACTOR', False)):
+    METRICS[f'{_nome}_YOY'] = Metric(
+        f'{_nome}_YOY',
+        f"{METRICS[_nome].titulo} - variação anual" + ('' if _relativa else ' (pontos)'),
+        _year_over_year(METRICS[_nome].calcular, _relativa),
+        meses_anteriores=12,
+    )
+
+@dataclass(frozen=True)
+class MetricTable:
+    """Métricas de um mercado calculadas numa passada, alinhadas aos períodos do filtro."""
+    periodos: np.ndarray
+    valores: Dict[str, np.ndarray]
+
+    def __len__(self) -> int:
+        return len(self.periodos)
+
+    @property
+    def labels(self) -> List[str]:
+        return period_labels(self.periodos)
+
+    def values(self, metrica: str) -> List[Optional[float]]:
+        """Valores da métrica prontos para JSON (None onde não há valor)."""
+        return [None if valor != valor else valor for valor in self.valores[metrica].tolist()]
+
+def validate_metrics(metricas: Sequence[str]) -> List[str]:
+    """Normaliza os nomes das métricas pedidas (maiúsculas, sem repetição)."""
+    nomes = list(dict.fromkeys(metrica.strip().upper() for metrica in metricas))
+    desconhecidas = [nome for nome in nomes if nome not in METRICS]
+    if desconhecidas or not nomes:
+        raise ValueError(f"Métrica inválida: {', '.join(desconhecidas) or 'nenhuma informada'}.")
+    return nomes
+
+def _shift_period(periodo: int, meses: int) -> int:
+    mes_absoluto = (periodo // 100) * 12 + periodo % 100 - 1 - meses
+    return (mes_absoluto // 12) * 100 + mes_absoluto % 12 + 1
+
+def fetch_series(mercados: List[str], periodo_inicio: int, periodo_fim: int, repo: FlightDataRepository) -> Dict[str, MarketSeries]:
+    """Séries mensais dos mercados numa única busca: no cubo de métricas ou numa consulta ao banco."""
+    cube = get_metric_cube(repo)
+    if cube is not None:
+        return {mercado: cube.series(mercado, periodo_inicio, periodo_fim) for mercado in mercados}
+    if len(mercados) == 1:
+        filtro = FilterData(
+            mercado=mercados[0],
+            ano_inicio=periodo_inicio // 100, mes_inicio=periodo_inicio % 100,
+            ano_fim=periodo_fim // 100, mes_fim=periodo_fim % 100,
+        )
+        return {mercados[0]: MarketSeries.from_frame(repo.get_monthly_flight_data(filtro))}
+    frame = repo.get_markets_monthly_flight_data(mercados, periodo_inicio, periodo_fim)
+    grupos = dict(tuple(frame.groupby('MERCADO', sort=False))) if not frame.empty else {}
+    return {mercado: MarketSeries.from_frame(grupos.get(mercado, pd.DataFrame())) for mercado in mercados}
+
+def evaluate_metrics(series: MarketSeries, metricas: Sequence[str], periodo_inicio: int, periodo_fim: int) -> MetricTable:
+    """Calcula as métricas sobre a série (que pode incluir histórico anterior) e recorta o período."""
+    janela = (series.periodos >= periodo_inicio) & (series.periodos <= periodo_fim)
+    return MetricTable(
+        series.periodos[janela],
+        {metrica: np.asarray(METRICS[metrica].calcular(series), dtype=np.float64)[janela] for metrica in metricas},
+    )
+
+def _bucket_period(periodo: int, passo: int) -> int:
+    """Período do primeiro mês do bloco de `passo` meses do calendário que contém `periodo`."""
+    mes_absoluto = (periodo // 100) * 12 + periodo % 100 - 1
+    mes_absoluto -= mes_absoluto % passo
+    return (mes_absoluto // 12) * 100 + mes_absoluto % 12 + 1
+
+def compute_metrics(mercados: List[str], metricas: Sequence[str], periodo_inicio: int, periodo_fim: int,
+                    repo: FlightDataRepository, passo: int = 1) -> Dict[str, MetricTable]:
+    """
+    Busca uma vez, com o histórico que as métricas exigirem, e calcula todas as métricas de cada mercado.
+
+    Com `passo` maior que 1, as séries são somadas em blocos do calendário
+    (trimestres, anos) antes do cálculo e o período se estende aos blocos
+    inteiros que toca; os períodos da tabela são os primeiros meses dos blocos.
+    """
+    historico = max(METRICS[metrica].meses_anteriores for metrica in metricas)
+    inicio, ultimo = _bucket_period(periodo_inicio, passo), _bucket_period(periodo_fim, passo)
+    with timed('transform'):
+        series = fetch_series(mercados, _shift_period(inicio, historico), _shift_period(ultimo, 1 - passo), repo)
+        return {
+            mercado: evaluate_metrics(serie.resample(passo), metricas, inicio, ultimo)
+            for mercado, serie in series.items()
+        }
+
+def compute_market_metrics(filter_data: FilterData, metricas: Sequence[str], repo: FlightDataRepository) -> MetricTable:
+    """Métricas do mercado do filtro do dashboard."""
+    return compute_metrics([filter_data.mercado], metricas, filter_data.periodo_inicio, filter_data.periodo_fim, repo)[filter_data.mercado]
+
+def get_market_series(series_request: SeriesRequest, repo: FlightDataRepository, max_markets: int = 20) -> Dict[str, Any]:
+    """
+    Séries mensais de vários mercados alinhadas num eixo de períodos comum.
+
+    Os mercados são validados uma vez pelo catálogo e as séries vêm do motor
+    de métricas, numa única busca no cubo ou no banco. Cada métrica de cada
+    mercado é uma lista do tamanho do eixo, com None nos meses sem valor.
+
+    Raises:
+        ValueError: Se a lista de mercados for vazia ou maior que `max_markets`,
+            se algum mercado não existir ou se alguma métrica for desconhecida.
+    """
+    timings: Dict[str, float] = {}
+    stage = time.perf_counter()
+
+    def lap(name: str) -> None:
+        nonlocal stage
+        now = time.perf_counter()
+        timings[name] = round((now - stage) * 1000, 3)
+        stage = now
+
+    mercados = list(dict.fromkeys(mercado.strip().upper() for mercado in series_request.mercados if mercado.strip()))
+    if not mercados:
+        raise ValueError("Informe ao menos um mercado.")
+    if len(mercados) > max_markets:
+        raise ValueError(f"No máximo {max_markets} mercados por consulta.")
+    metricas = validate_metrics(series_request.metricas)
+    catalog = repo.get_catalog()
+    inexistentes = [mercado for mercado in mercados if not catalog.has_market(mercado)]
+    if inexistentes:
+        raise ValueError(f"Mercado(s) inexistente(s): {', '.join(inexistentes)}.")
+    lap('validacao')
+
+    fonte = 'cubo' if get_metric_cube(repo) is not None else 'sql'
+    tabelas = compute_metrics(mercados, metricas, series_request.periodo_inicio, series_request.periodo_fim, repo)
+    lap('consulta')
+
+    with timed('transform'):
+        eixo = np.unique(np.concatenate([tabela.periodos for tabela in tabelas.values()]).astype(np.int64))
+        resultado: Dict[str, Dict[str, List[Optional[float]]]] = {}
+        for mercado, tabela in tabelas.items():
+            posicoes = np.searchsorted(eixo, tabela.periodos)
+            resultado[mercado] = {}
+            for metrica in metricas:
+                valores = np.full(len(eixo), np.nan)
+                valores[posicoes] = tabela.valores[metrica]
+                resultado[mercado][metrica] = [None if valor != valor else valor for valor in valores.tolist()]
+    lap('alinhamento')
+
+    return {
+        'periodos': period_labels(eixo),
+        'mercados': mercados,
+        'metricas': metricas,
+        'series': resultado,
+        'fonte': fonte,
+        'tempos_ms': timings,
+    }
+
+def get_market_ranking(ranking_request: RankingRequest, repo: FlightDataRepository, max_n: int = 100) -> Dict[str, Any]:
+    """
+    Os `n` mercados com maior valor da métrica no período, do maior para o menor.
+
+    Um único mês com `n` até `RANKING_DEPTH` sai do ranking guardado na
+    ingestão; intervalos quaisquer saem das somas de prefixo do cubo com
+    seleção parcial ou, sem o cubo, de uma agregação no banco.
+
+    Raises:
+        ValueError: Se a métrica não tiver ranking ou se `n` estiver fora de 1..`max_n`.
+    """
+    start = time.perf_counter()
+    metrica = ranking_request.metrica.strip().upper()
+    if metrica not in RANKING_EXPRESSIONS:
+        raise ValueError(f"Métrica de ranking inválida: {metrica}. Use {', '.join(RANKING_EXPRESSIONS)}.")
+    if not 1 <= ranking_request.n <= max_n:
+        raise ValueError(f"O ranking deve ter de 1 a {max_n} mercados.")
+    periodo_inicio, periodo_fim = ranking_request.periodo_inicio, ranking_request.periodo_fim
+
+    linhas = None
+    if periodo_inicio == periodo_fim and ranking_request.n <= RANKING_DEPTH:
+        linhas = repo.get_period_ranking(metrica, periodo_inicio, ranking_request.n)
+        fonte = 'ranking'
+    if linhas is None:
+        cube = get_metric_cube(repo)
+        if cube is not None:
+            linhas = cube.top_markets(metrica, periodo_inicio, periodo_fim, ranking_request.n)
+            fonte = 'cubo'
+        else:
+            linhas = repo.get_range_ranking(metrica, periodo_inicio, periodo_fim, ranking_request.n)
+            fonte = 'sql'
+
+    inicio, fim = period_labels([periodo_inicio, periodo_fim])
+    return {
+        'metrica': metrica,
+        'titulo': METRICS[metrica].titulo,
+        'inicio': inicio,
+        'fim': fim,
+        'n': ranking_request.n,
+        'fonte': fonte,
+        'ranking': [
+            {'posicao': posicao, 'mercado': mercado, 'valor': valor}
+            for posicao, (mercado, valor) in enumerate(linhas, start=1)
+        ],
+        'tempo_ms': round((time.perf_counter() - start) * 1000, 3),
+    }
+
 def get_dashboard_initial_data(repo: FlightDataRepository) -> Dict[str, List]:
     """Recupera os mercados e anos disponíveis para o dashboard."""
     return {
@@ -18,13 +515,36 @@ def get_dashboard_initial_data(repo: FlightDataRepository) -> Dict[str, List]:
         'anos': repo.get_available_years()
     }
 
-def get_flight_data(filter_data: FilterData, repo: FlightDataRepository) -> Dict[str, Union[List, str]]:
+def search_markets(q: str, repo: FlightDataRepository, limit: int = 20) -> Dict[str, Any]:
+    """Autocompletar de mercados: até `limit` mercados que casam com `q`, os mais consultados primeiro."""
+    popularity = get_market_popularity()
+    return repo.get_catalog().market_index.search(q, limit, popularity.counts() if popularity else None)
+
+def _empty_chart(filter_data: FilterData, coverage: MarketCoverage) -> Dict[str, Union[List, str]]:
+    """Resposta do gráfico sem dados, sugerindo os trechos com dados mais próximos do período pedido."""
+    faixas = coverage.nearest_ranges(filter_data.periodo_inicio, filter_data.periodo_fim)
+    labels = period_labels([periodo for faixa in faixas for periodo in faixa])
+    sugestoes = [{'inicio': inicio, 'fim': fim} for inicio, fim in zip(labels[::2], labels[1::2])]
+    message = f"Nenhum dado encontrado para {filter_data.mercado} entre {filter_data.ano_inicio}-{filter_data.mes_inicio} e {filter_data.ano_fim}-{filter_data.mes_fim}."
+    if sugestoes:
+        message += " Períodos disponíveis mais próximos: " + ', '.join(f"{s['inicio']} a {s['fim']}" for s in sugestoes) + "."
+    logger.info(f"Sem dados para {filter_data.mercado} no período; cobertura {coverage.periodo_inicio} a {coverage.periodo_fim}")
+    return {
+        'labels': [],
+        'values': [],
+        'message': message,
+        'single_point': False,
+        'sugestoes': sugestoes,
+    }
+
+def get_metric_chart(filter_data: FilterData, repo: FlightDataRepository, metrica: str) -> Dict[str, Union[List, str]]:
     """
-    Recupera dados filtrados do banco e retorna no formato para o gráfico.
+    Série de uma métrica do motor no formato do gráfico do dashboard.
 
     Args:
         filter_data: Filtros de mercado e período.
         repo: Repositório para acesso aos dados de voos.
+        metrica: Nome da métrica registrada em `METRICS`.
 
     Returns:
         Dicionário com labels, valores, mensagem e indicador de ponto único.
@@ -32,61 +552,235 @@ def get_flight_data(filter_data: FilterData, repo: FlightDataRepository) -> Dict
     Raises:
         ValueError: Se o mercado não existir nos dados.
     """
-    logger.info(f"Filtros aplicados: {filter_data.dict()}")
+    logger.info(f"Filtros aplicados: {filter_data.model_dump()}")
 
-    flight_data: pd.DataFrame = repo.get_filtered_flight_data(filter_data)
-    available_markets: List[str] = repo.get_available_markets()
-    if filter_data.mercado not in available_markets:
+    coverage = repo.get_market_coverage(filter_data.mercado)
+    if coverage is None:
         logger.warning(f"Mercado inválido: {filter_data.mercado}")
         raise ValueError("Mercado selecionado não existe.")
 
-    logger.info(f"Dados filtrados: {len(flight_data)} linhas encontradas")
+    # O bitmap de cobertura responde ao período sem dados sem consultar o banco
+    if not coverage.overlaps(filter_data.periodo_inicio, filter_data.periodo_fim):
+        return _empty_chart(filter_data, coverage)
 
-    if flight_data.empty:
-        full_data = repo.get_all_flight_data()
-        available_years = full_data[full_data['MERCADO'] == filter_data.mercado]['ANO'].unique().tolist()
-        available_months = full_data[full_data['MERCADO'] == filter_data.mercado]['MES'].unique().tolist()
-        logger.info(f"Dados disponíveis para {filter_data.mercado} - Anos: {available_years}, Meses: {available_months}")
-        return {
-            'labels': [],
-            'values': [],
-            'message': f"Nenhum dado encontrado para {filter_data.mercado} entre {filter_data.ano_inicio}-{filter_data.mes_inicio} e {filter_data.ano_fim}-{filter_data.mes_fim}.",
-            'single_point': False
-        }
+    table = compute_market_metrics(filter_data, [metrica], repo)
+    logger.info(f"Dados filtrados: {len(table)} meses encontrados")
 
-    flight_data['RPK'] = pd.to_numeric(flight_data['RPK'], errors='coerce').fillna(0)
-    logger.info("OLÁA")
-    labels: List[str] = (
-        flight_data['ANO'].astype(str) + '-' + 
-        flight_data['MES'].astype(str).str.zfill(2)
-    ).tolist()
-    values: List[float] = flight_data['RPK'].tolist()
+    if not len(table):
+        return _empty_chart(filter_data, coverage)
 
+    labels: List[str] = table.labels
     logger.info(f"Labels gerados: {labels[:5]}... (total: {len(labels)})")
 
     return {
         'labels': labels,
-        'values': values,
+        'values': table.values(metrica),
         'single_point': len(labels) == 1,
         'message': None
     }
 
-def get_flight_data_csv(filter_data: FilterData, repo: FlightDataRepository) -> str:
-    """Gera uma string CSV com os dados filtrados para exportação."""
-    flight_data: pd.DataFrame = repo.get_filtered_flight_data(filter_data)
+@dataclass(frozen=True)
+class DenseSeries:
+    """Série de uma métrica em grade regular: `passo` meses entre pontos, NaN onde não há valor."""
+    inicio: int
+    passo: int
+    valores: np.ndarray
+
+    @classmethod
+    def from_table(cls, table: MetricTable, metrica: str, passo: int) -> 'DenseSeries':
+        meses = (table.periodos // 100) * 12 + table.periodos % 100
+        posicoes = (meses - meses[0]) // passo
+        valores = np.full(int(posicoes[-1]) + 1, np.nan)
+        valores[posicoes] = table.valores[metrica]
+        return cls(int(table.periodos[0]), passo, valores)
+
+def dense_cache_metric(metrica: str, granularidade: str) -> str:
+    """Nome no cache de resultados da série densa de uma métrica numa granularidade."""
+    return f"serie_densa:{metrica}:{granularidade}"
+
+def get_dense_series(filter_data: FilterData, repo: FlightDataRepository, metrica: str,
+                     granularidade: str = 'mensal') -> Optional[DenseSeries]:
+    """
+    Série densa de uma métrica do mercado filtrado, via cache de resultados.
+
+    É o núcleo do formato compacto do gráfico: a redução e a codificação
+    pedidas pelo cliente são aplicadas sobre ela a cada resposta.
+
+    Returns:
+        A série, ou None se o mercado não tiver dados no período.
+
+    Raises:
+        ValueError: Se o mercado não existir nos dados.
+    """
+    def compute() -> Optional[DenseSeries]:
+        coverage = repo.get_market_coverage(filter_data.mercado)
+        if coverage is None:
+            raise ValueError("Mercado selecionado não existe.")
+        if not coverage.overlaps(filter_data.periodo_inicio, filter_data.periodo_fim):
+            return None
+        passo = GRANULARIDADES[granularidade]
+        table = compute_metrics([filter_data.mercado], [metrica], filter_data.periodo_inicio, filter_data.periodo_fim,
+                                repo, passo)[filter_data.mercado]
+        return DenseSeries.from_table(table, metrica, passo) if len(table) else None
+
+    cache = get_result_cache()
+    if cache is None:
+        return compute()
+    return cache.get_or_compute(dense_cache_metric(metrica, granularidade), filter_data, repo.get_data_generation(), compute)
+
+def _encode_column(valores: np.ndarray, codificacao: str, dtype: str) -> Union[List, str]:
+    """Coluna do payload compacto: lista JSON (None no lugar de NaN) ou bytes little-endian em base64."""
+    if codificacao == 'base64':
+        return base64.b64encode(np.ascontiguousarray(valores, dtype=dtype).tobytes()).decode('ascii')
+    if np.dtype(dtype).kind == 'u':
+        return valores.astype(np.int64).tolist()
+    if codificacao == 'float32':
+        # 7 algarismos significativos bastam para um float32 e encurtam o JSON
+        return [None if valor != valor else float(f"{valor:.7g}") for valor in valores.astype(np.float32).tolist()]
+    return [None if valor != valor else valor for valor in valores.tolist()]
 
-    if flight_data.empty:
+def compact_chart(series: DenseSeries, chart_format: ChartFormat, max_pontos: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Payload compacto do gráfico: período inicial, passo e a coluna de valores.
+
+    Sem redução, o ponto `i` é o período `inicio + i * passo`. Quando a série
+    tem mais pontos com valor que `max_pontos`, o LTTB escolhe os pontos e a
+    coluna `x` traz a posição de cada um na grade.
+    """
+    valores = series.valores
+    validos = np.flatnonzero(~np.isnan(valores))
+    x = None
+    if max_pontos and len(validos) > max_pontos:
+        x = validos[lttb_indices(validos, valores[validos], max_pontos)]
+        valores = valores[x]
+
+    sufixo = '_b64' if chart_format.codificacao == 'base64' else ''
+    payload: Dict[str, Any] = {
+        'formato': 'compacto',
+        'granularidade': chart_format.granularidade,
+        'inicio': period_labels([series.inicio])[0],
+        'passo': series.passo,
+        'n': len(valores),
+        'total_pontos': len(series.valores),
+        'codificacao': chart_format.codificacao,
+        f'values{sufixo}': _encode_column(valores, chart_format.codificacao, '<f4'),
+        'single_point': len(validos) == 1,
+        'message': None,
+    }
+    if x is not None:
+        payload[f'x{sufixo}'] = _encode_column(x, chart_format.codificacao, '<u4')
+    return payload
+
+def get_compact_chart(filter_data: FilterData, repo: FlightDataRepository, metrica: str, chart_format: ChartFormat,
+                      max_pontos: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Gráfico de uma métrica no formato compacto, com granularidade e limite de pontos.
+
+    Raises:
+        ValueError: Se o mercado não existir nos dados.
+    """
+    series = get_dense_series(filter_data, repo, metrica, chart_format.granularidade)
+    if series is None:
+        chart = _empty_chart(filter_data, repo.get_market_coverage(filter_data.mercado))
+        chart.update({'formato': 'compacto', 'granularidade': chart_format.granularidade, 'n': 0})
+        return chart
+    with timed('render'):
+        return compact_chart(series, chart_format, max_pontos)
+
+@cached_result('chart_rpk')
+def get_flight_data(filter_data: FilterData, repo: FlightDataRepository) -> Dict[str, Union[List, str]]:
+    """Série mensal de RPK do mercado filtrado, para o gráfico do dashboard."""
+    return get_metric_chart(filter_data, repo, 'RPK')
+
+def _csv_number(value: float) -> Union[int, float]:
+    return int(value) if value.is_integer() else value
+
+@cached_result('csv')
+def get_flight_data_csv(filter_data: FilterData, repo: FlightDataRepository) -> str:
+    """Gera uma string CSV com o RPK mensal do filtro para exportação."""
+    table = compute_market_metrics(filter_data, ['RPK'], repo)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+    writer.writerow(['ANO', 'MES', 'MERCADO', 'RPK'])
+    if not len(table):
         logger.info("Nenhum dado para exportar em CSV")
-        return "ANO,MES,MERCADO,RPK\n"
+        return buffer.getvalue()
+
+    with timed('render'):
+        writer.writerows(
+            (periodo // 100, periodo % 100, filter_data.mercado, _csv_number(rpk))
+            for periodo, rpk in zip(table.periodos.tolist(), table.valores['RPK'].tolist())
+        )
+    logger.info(f"Gerado CSV com {len(table)} linhas")
+    return buffer.getvalue()
 
-    flight_data['RPK'] = pd.to_numeric(flight_data['RPK'], errors='coerce').fillna(0)
-    csv_content: str = flight_data[['ANO', 'MES', 'MERCADO', 'RPK']].to_csv(index=False)
-    logger.info(f"Gerado CSV com {len(flight_data)} linhas")
-    return csv_content
+FLIGHT_CSV_COLUMNS = ['ANO', 'MES', 'MERCADO', 'RPK', 'ASK']
 
+def stream_flight_data_csv(filter_data: FilterData, repo: FlightDataRepository, batch_size: int = 10000, compress: bool = False,
+                           on_progress: Optional[Callable[[int], None]] = None) -> Iterator[bytes]:
+    """
+    Exporta os voos filtrados, linha a linha, como CSV em blocos de bytes.
+
+    O mercado é validado antes de a resposta começar; depois disso cada lote
+    lido do cursor vira um bloco de CSV, opcionalmente comprimido em gzip, e o
+    uso de memória não depende do tamanho da exportação. `on_progress`, se
+    informado, recebe o total de linhas escritas após cada lote.
+
+    Raises:
+        ValueError: Se o mercado não existir nos dados.
+    """
+    if not repo.has_market(filter_data.mercado):
+        logger.warning(f"Mercado inválido: {filter_data.mercado}")
+        raise ValueError("Mercado selecionado não existe.")
+
+    def generate() -> Iterator[bytes]:
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, lineterminator='\n')
+        writer.writerow(FLIGHT_CSV_COLUMNS)
+        rows = 0
+        for batch in repo.iter_filtered_flight_data(filter_data, batch_size):
+            with timed('render'):
+                writer.writerows(batch)
+                rows += len(batch)
+                if on_progress:
+                    on_progress(rows)
+                data = buffer.getvalue().encode('utf-8')
+                buffer.seek(0)
+                buffer.truncate()
+                chunk = compressor.compress(data) if compressor else data
+            if chunk:
+                yield chunk
+        tail = buffer.getvalue().encode('utf-8')
+        if compressor:
+            yield compressor.compress(tail) + compressor.flush()
+        elif tail:
+            yield tail
+        logger.info(f"CSV de voos exportado com {rows} linhas")
+
+    return generate()
+
+PDF_MONTHLY_COLUMNS = ['ANO', 'MES', 'MERCADO', 'RPK', 'ASK', 'VOOS']
+
+def _monthly_rpk_chart(table: MetricTable):
+    return build_chart(table.labels, table.valores['RPK'].tolist(), METRICS['RPK'].titulo)
+
+def _report_progress(batches: Iterator[List[tuple]], on_progress: Optional[Callable[[int], None]]) -> Iterator[List[tuple]]:
+    rows = 0
+    for batch in batches:
+        yield batch
+        rows += len(batch)
+        if on_progress:
+            on_progress(rows)
+
+def _report_title(filter_data: FilterData) -> str:
+    return (f"RPK {filter_data.mercado} - {filter_data.ano_inicio}-{filter_data.mes_inicio:02d} "
+            f"a {filter_data.ano_fim}-{filter_data.mes_fim:02d}")
+
+@cached_result('pdf')
 def get_flight_data_pdf(filter_data: FilterData, repo: FlightDataRepository) -> io.BytesIO:
     """
-    Gera um PDF com os dados filtrados do dashboard.
+    Gera um PDF com o resumo mensal dos dados filtrados do dashboard.
 
     Args:
         filter_data: Filtros de mercado e período.
@@ -96,101 +790,61 @@ def get_flight_data_pdf(filter_data: FilterData, repo: FlightDataRepository) ->
         Buffer de bytes contendo o PDF gerado, ou None se não houver dados ou erro.
     """
     logger.info(f"Gerando PDF para filtros: {filter_data.model_dump()}")
-    flight_data: pd.DataFrame = repo.get_filtered_flight_data(filter_data)
-    
-    if flight_data.empty:
+    table = compute_market_metrics(filter_data, ['RPK', 'ASK', 'VOOS'], repo)
+
+    if not len(table):
         logger.info("Nenhum dado para exportar em PDF")
-        flash("Nenhum dado encontrado para os filtros selecionados.", "warning")  # Adiciona flash aqui pra debug
         return None
 
-    logger.info(f"Dados para PDF (primeiras 5 linhas): {flight_data.head().to_dict(orient='records')}")
-    flight_data['RPK'] = pd.to_numeric(flight_data['RPK'], errors='coerce').fillna(0)
-    
-    # Prepara os dados pra tabela no PDF
-    data = [flight_data.columns.tolist()] + flight_data.values.tolist()
-    logger.info(f"Dados preparados para tabela (primeiras 2 linhas): {data[:2]}")
-    
+    rows = zip(
+        (table.periodos // 100).tolist(),
+        (table.periodos % 100).tolist(),
+        itertools.repeat(filter_data.mercado),
+        table.valores['RPK'].tolist(),
+        table.valores['ASK'].tolist(),
+        table.valores['VOOS'].astype(np.int64).tolist(),
+    )
     try:
-        buffer = io.BytesIO()
-        doc = SimpleDocTemplate(buffer, pagesize=letter)
-        table = Table(data)
-        
-        # Estiliza a tabela
-        table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 12),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black),
-        ]))
-        
-        doc.build([table])
-        buffer.seek(0)
-        logger.info(f"PDF gerado com {len(flight_data)} linhas, tamanho do buffer: {buffer.getbuffer().nbytes} bytes")
-        
-        # Verifica se o buffer tem conteúdo
-        if buffer.getbuffer().nbytes == 0:
-            logger.error("Buffer do PDF está vazio após geração")
-            return None
-        
-        # Salva o buffer em um arquivo temporário pra debug
-        with open("debug_output.pdf", "wb") as f:
-            f.write(buffer.getvalue())
-        logger.info("PDF salvo em 'debug_output.pdf' para inspeção")
-        
-        return buffer
+        with timed('render'):
+            return build_pdf_report(_report_title(filter_data), PDF_MONTHLY_COLUMNS, rows, _monthly_rpk_chart(table))
     except Exception as e:
         logger.error(f"Erro ao gerar PDF: {str(e)}", exc_info=True)
         return None
-    
 
-def get_flight_RPK(filter_data: FilterData, repo: FlightDataRepository) -> Dict[str, Union[List, str]]:
+def get_flight_detail_pdf(filter_data: FilterData, repo: FlightDataRepository, batch_size: int = 10000,
+                          on_progress: Optional[Callable[[int], None]] = None) -> io.BytesIO:
+    """
+    Gera um PDF com os voos individuais filtrados, lidos do banco em lotes.
 
-    logger.info(f"Filtros aplicados: {filter_data.dict()}")
+    O gráfico vem do agregado mensal; as linhas entram no relatório à medida
+    que o cursor avança, sem montar um DataFrame com todos os voos.
+    `on_progress`, se informado, recebe o total de linhas lidas após cada lote.
 
-    flight_data: pd.DataFrame = repo.get_filtered_flight_data(filter_data)
-    available_markets: List[str] = repo.get_available_markets()
-    if filter_data.mercado not in available_markets:
-        logger.warning(f"Mercado inválido: {filter_data.mercado}")
-        raise ValueError("Mercado selecionado não existe.")
-
-    logger.info(f"Dados filtrados: {len(flight_data)} linhas encontradas")
+    Returns:
+        Buffer de bytes contendo o PDF gerado, ou None se não houver dados ou erro.
+    """
+    logger.info(f"Gerando PDF de voos para filtros: {filter_data.model_dump()}")
+    table = compute_market_metrics(filter_data, ['RPK'], repo)
 
-    if flight_data.empty:
-        full_data = repo.get_all_flight_data()
-        available_years = full_data[full_data['MERCADO'] == filter_data.mercado]['ANO'].unique().tolist()
-        available_months = full_data[full_data['MERCADO'] == filter_data.mercado]['MES'].unique().tolist()
-        logger.info(f"Dados disponíveis para {filter_data.mercado} - Anos: {available_years}, Meses: {available_months}")
-        return {
-            'labels': [],
-            'values': [],
-            'message': f"Nenhum dado encontrado para {filter_data.mercado} entre {filter_data.ano_inicio}-{filter_data.mes_inicio} e {filter_data.ano_fim}-{filter_data.mes_fim}.",
-            'single_point': False
-        }
+    if not len(table):
+        logger.info("Nenhum dado para exportar em PDF")
+        return None
 
-    flight_data['RPK'] = pd.to_numeric(flight_data['RPK'], errors='coerce').fillna(0) 
+    try:
+        # As linhas são lidas do cursor durante a montagem; o SQL conta como `db`
+        with timed('render'):
+            return build_pdf_report(
+                _report_title(filter_data),
+                FLIGHT_CSV_COLUMNS,
+                itertools.chain.from_iterable(_report_progress(repo.iter_filtered_flight_data(filter_data, batch_size), on_progress)),
+                _monthly_rpk_chart(table),
+            )
+    except Exception as e:
+        logger.error(f"Erro ao gerar PDF: {str(e)}", exc_info=True)
+        return None
     
 
-    logger.info("")
-    logger.info(flight_data['ASK'])
-    logger.info("")
-
-    flight_data['RPK'] = flight_data['RPK'] / flight_data['ASK']
-
-    labels: List[str] = (
-        flight_data['ANO'].astype(str) + '-' + 
-        flight_data['MES'].astype(str).str.zfill(2)
-    ).tolist()
-    values: List[float] = flight_data['RPK'].tolist()
-
-    logger.info(f"Labels gerados: {labels[:5]}... (total: {len(labels)})")
-
-    return {
-        'labels': labels,
-        'values': values,
-        'single_point': len(labels) == 1,
-        'message': None
-    }
+@cached_result('chart_load_factor')
+def get_flight_RPK(filter_data: FilterData, repo: FlightDataRepository) -> Dict[str, Union[List, str]]:
+    """Série mensal do load factor (soma de RPK / soma de ASK) do mercado filtrado."""
+    return get_metric_chart(filter_data, repo, 'LOAD_FACTOR')
@@ -0,0 +1,235 @@
+"""
+Snapshot colunar de `flight_data` em arquivos NumPy.
+
+Cada coluna vira um `.npy` com as linhas ordenadas por (MERCADO, PERIODO); o
+MERCADO é gravado como código inteiro de um dicionário e `offsets.npy` guarda
+onde começa cada mercado. Os workers abrem os arquivos com
+`np.load(mmap_mode='r')`: um filtro vira um fatiamento sem cópia, e as páginas
+são compartilhadas entre os processos pelo cache do sistema operacional.
+
+Layout de `<diretório>`::
+
+    CURRENT              nome da versão publicada (ex.: gen-000012-18f3a2b4c10)
+    gen-000012-18f3a2b4c10/
+        meta.json        geração de dados, linhas e mercados (na ordem dos códigos)
+        offsets.npy      int64[len(mercados) + 1]
+        ANO.npy MES.npy PERIODO.npy MERCADO.npy RPK.npy ASK.npy
+        ORDER.npy        posições das linhas na ordem original de `flight_data`
+"""
+from typing import Dict, Iterator, List, Optional, Tuple
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Engine
+import argparse
+import json
+import logging
+import os
+import shutil
+import time
+import numpy as np
+import pandas as pd
+from .catalog import FlightCatalog
+from .ingest import get_data_generation
+
+logger = logging.getLogger(__name__)
+
+COLUMN_DTYPES = {
+    'ANO': np.int16,
+    'MES': np.int8,
+    'PERIODO': np.int32,
+    'MERCADO': np.int32,
+    'RPK': np.float64,
+    'ASK': np.float64,
+}
+
+CURRENT_FILE = 'CURRENT'
+KEEP_VERSIONS = 2
+
+
+def write_snapshot(engine: Engine, directory: str, chunksize: int = 500_000) -> str:
+    """
+    Grava um snapshot de `flight_data` e o publica em `CURRENT`.
+
+    A versão anterior é mantida para workers que ainda a tenham mapeada; as
+    mais antigas são removidas.
+
+    Returns:
+        Caminho da versão publicada.
+    """
+    start = time.perf_counter()
+    with engine.connect() as conn:
+        generation = get_data_generation(conn)
+        columns: Dict[str, List[np.ndarray]] = {name: [] for name in ('ANO', 'MES', 'PERIODO', 'MERCADO', 'RPK', 'ASK')}
+        query = text('SELECT "ANO", "MES", "PERIODO", "MERCADO", "RPK", "ASK" FROM flight_data')
+        for chunk in pd.read_sql(query, conn.execution_options(stream_results=True), chunksize=chunksize):
+            for name in columns:
+                columns[name].append(chunk[name].to_numpy())
+
+    data = {name: np.concatenate(parts) if parts else np.empty(0) for name, parts in columns.items()}
+    mercados, codes = np.unique(data['MERCADO'].astype(str), return_inverse=True)
+    data['MERCADO'] = codes
+    for name in ('RPK', 'ASK'):
+        data[name] = pd.to_numeric(data[name], errors='coerce')
+    data = {name: np.asarray(values, dtype=COLUMN_DTYPES[name]) for name, values in data.items()}
+
+    # lexsort é estável: dentro do mesmo período a ordem original é mantida
+    sort = np.lexsort((data['PERIODO'], data['MERCADO']))
+    order = np.empty_like(sort)
+    order[sort] = np.arange(len(sort))
+    offsets = np.searchsorted(data['MERCADO'][sort], np.arange(len(mercados) + 1)).astype(np.int64)
+
+    version = f'gen-{generation:06d}-{int(time.time() * 1000):x}'
+    path = os.path.join(directory, version)
+    os.makedirs(path)
+    for name, values in data.items():
+        np.save(os.path.join(path, f'{name}.npy'), values[sort])
+    np.save(os.path.join(path, 'ORDER.npy'), order)
+    np.save(os.path.join(path, 'offsets.npy'), offsets)
+    with open(os.path.join(path, 'meta.json'), 'w', encoding='utf-8') as f:
+        json.dump({'generation': generation, 'rows': int(len(sort)), 'mercados': mercados.tolist()}, f)
+
+    tmp = os.path.join(directory, CURRENT_FILE + '.tmp')
+    with open(tmp, 'w', encoding='utf-8') as f:
+        f.write(version)
+    os.replace(tmp, os.path.join(directory, CURRENT_FILE))
+    _remove_old_versions(directory, version)
+    logger.info(f"Snapshot {version} gravado com {len(sort)} linhas e {len(mercados)} mercados em {time.perf_counter() - start:.1f}s")
+    return path
+
+
+def refresh_snapshot(engine: Engine, directory: str) -> Optional[str]:
+    """Grava um novo snapshot se o publicado não corresponder à geração de dados atual."""
+    snapshot = FlightSnapshot.open_current(directory)
+    with engine.connect() as conn:
+        generation = get_data_generation(conn)
+    if snapshot is not None and snapshot.generation == generation:
+        logger.info(f"Snapshot já está na geração {generation}")
+        return None
+    return write_snapshot(engine, directory)
+
+
+def _remove_old_versions(directory: str, current: str) -> None:
+    versions = sorted(name for name in os.listdir(directory) if name.startswith('gen-') and name != current)
+    for name in versions[:max(len(versions) - (KEEP_VERSIONS - 1), 0)]:
+        # Em POSIX, workers que ainda mapeiam os arquivos continuam lendo normalmente
+        shutil.rmtree(os.path.join(directory, name), ignore_errors=True)
+
+
+def current_version(directory: str) -> Optional[str]:
+    try:
+        with open(os.path.join(directory, CURRENT_FILE), encoding='utf-8') as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+class FlightSnapshot:
+    """Uma versão do snapshot aberta em modo somente leitura, mapeada em memória."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, 'meta.json'), encoding='utf-8') as f:
+            meta = json.load(f)
+        self.generation: int = meta['generation']
+        self.rows: int = meta['rows']
+        self.markets: List[str] = meta['mercados']
+        self._codes = {mercado: code for code, mercado in enumerate(self.markets)}
+        self.columns: Dict[str, np.ndarray] = {
+            name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r') for name in COLUMN_DTYPES
+        }
+        self.order = np.load(os.path.join(path, 'ORDER.npy'), mmap_mode='r')
+        self.offsets = np.load(os.path.join(path, 'offsets.npy'))
+        self._catalog: Optional[FlightCatalog] = None
+
+    @classmethod
+    def open_current(cls, directory: str) -> Optional['FlightSnapshot']:
+        version = current_version(directory)
+        if version is None:
+            return None
+        try:
+            return cls(os.path.join(directory, version))
+        except FileNotFoundError:
+            return None
+
+    def market_slice(self, mercado: str, periodo_inicio: int, periodo_fim: int) -> slice:
+        """Fatia das linhas do mercado no intervalo de períodos (busca binária dentro do mercado)."""
+        code = self._codes.get(mercado)
+        if code is None:
+            return slice(0, 0)
+        start, end = int(self.offsets[code]), int(self.offsets[code + 1])
+        periodos = self.columns['PERIODO'][start:end]
+        return slice(
+            start + int(np.searchsorted(periodos, periodo_inicio, side='left')),
+            start + int(np.searchsorted(periodos, periodo_fim, side='right')),
+        )
+
+    def frame(self, rows, columns: Tuple[str, ...] = ('ANO', 'MES', 'MERCADO', 'RPK', 'ASK')) -> pd.DataFrame:
+        """Monta um DataFrame das linhas indicadas, decodificando o MERCADO."""
+        data = {}
+        for name in columns:
+            values = self.columns[name][rows]
+            if name == 'MERCADO':
+                values = pd.Categorical.from_codes(values, categories=self.markets).astype(object)
+            data[name] = values
+        return pd.DataFrame(data, columns=list(columns))
+
+    def iter_batches(self, rows: slice, batch_size: int) -> Iterator[List[tuple]]:
+        """Percorre as linhas da fatia em lotes de tuplas (ANO, MES, MERCADO, RPK, ASK)."""
+        for start in range(rows.start, rows.stop, batch_size):
+            batch = slice(start, min(start + batch_size, rows.stop))
+            mercados = [self.markets[code] for code in self.columns['MERCADO'][batch].tolist()]
+            yield list(zip(
+                self.columns['ANO'][batch].tolist(),
+                self.columns['MES'][batch].tolist(),
+                mercados,
+                self.columns['RPK'][batch].tolist(),
+                self.columns['ASK'][batch].tolist(),
+            ))
+
+    def monthly(self, rows: slice) -> pd.DataFrame:
+        """Agrega a fatia em uma linha por (mercado, período) com RPK, ASK e número de voos."""
+        periodos = self.columns['PERIODO'][rows]
+        if len(periodos) == 0:
+            return pd.DataFrame(columns=['ANO', 'MES', 'MERCADO', 'RPK', 'ASK', 'VOOS'])
+        mercados = self.columns['MERCADO'][rows]
+        # As linhas estão ordenadas por (MERCADO, PERIODO): cada grupo é contíguo
+        changes = (np.diff(periodos) != 0) | (np.diff(mercados) != 0)
+        starts = np.concatenate(([0], np.flatnonzero(changes) + 1))
+        first = rows.start + starts
+        return pd.DataFrame({
+            'ANO': self.columns['ANO'][first],
+            'MES': self.columns['MES'][first],
+            'MERCADO': pd.Categorical.from_codes(mercados[starts], categories=self.markets).astype(object),
+            'RPK': np.add.reduceat(self.columns['RPK'][rows], starts),
+            'ASK': np.add.reduceat(self.columns['ASK'][rows], starts),
+            'VOOS': np.diff(np.append(starts, len(periodos))),
+        })
+
+    def catalog(self) -> FlightCatalog:
+        """Catálogo de mercados e períodos, montado uma vez por versão do snapshot."""
+        if self._catalog is None:
+            keys = np.unique(self.columns['MERCADO'].astype(np.int64) * 1_000_000 + self.columns['PERIODO'])
+            codes, periodos = np.divmod(keys, 1_000_000)
+            self._catalog = FlightCatalog(
+                (self.markets[code], periodo // 100, periodo % 100)
+                for code, periodo in zip(codes.tolist(), periodos.tolist())
+            )
+        return self._catalog
+
+
+def main(argv=None):
+    from .data_processing import DEFAULT_DB_URL
+    from sqlalchemy import create_engine
+    parser = argparse.ArgumentParser(description="Grava o snapshot colunar de flight_data a partir do banco.")
+    parser.add_argument('directory', help="Diretório dos snapshots (FLIGHT_SNAPSHOT_DIR)")
+    parser.add_argument('--db-url', default=os.environ.get('DATABASE_URL', DEFAULT_DB_URL), help="URL SQLAlchemy do banco")
+    args = parser.parse_args(argv)
+    engine = create_engine(args.db_url)
+    try:
+        if not inspect(engine).has_table('flight_data'):
+            raise SystemExit("Tabela flight_data não encontrada; rode a ingestão antes.")
+        write_snapshot(engine, args.directory)
+    finally:
+        engine.dispose()
+
+if __name__ == '__main__':
+    main()
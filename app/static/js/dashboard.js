@@ -10,32 +10,113 @@ document.addEventListener('DOMContentLoaded', () => {
     const filterBtn = document.getElementById('filterBtn');
     const exportCsvBtn = document.getElementById('exportCsvBtn');
     const exportPdfBtn = document.getElementById('exportPdfBtn');
+    const exportFlightsCsvBtn = document.getElementById('exportFlightsCsvBtn');
+    const exportFlightsPdfBtn = document.getElementById('exportFlightsPdfBtn');
     const loading = document.getElementById('loading');
     const messageDiv = document.getElementById('message');
 
-    filterForm.addEventListener('submit', async (e) => {
-        e.preventDefault();
-        filterBtn.disabled = true;
+    // Mercados sob demanda: o HTML não traz a lista; o campo consulta
+    // /api/markets (por prefixo do mercado ou de um dos aeroportos) enquanto o usuário digita
+    const mercadoInput = document.getElementById('mercado');
+    const mercadoOptions = document.getElementById('mercadoOptions');
+    let marketSearch = null;
+    let marketTimer = null;
+
+    async function loadMarkets(q) {
+        if (marketSearch) marketSearch.abort();
+        marketSearch = new AbortController();
+        try {
+            const response = await fetch(`/api/markets?q=${encodeURIComponent(q)}`, { signal: marketSearch.signal });
+            if (!response.ok) return;
+            const data = await response.json();
+            mercadoOptions.replaceChildren(...data.mercados.map(item => {
+                const option = document.createElement('option');
+                option.value = item.mercado;
+                option.label = item.aeroportos.join(' - ');
+                return option;
+            }));
+        } catch (error) {
+            if (error.name !== 'AbortError') console.error('Erro ao buscar mercados:', error);
+        }
+    }
+
+    mercadoInput.addEventListener('input', () => {
+        mercadoInput.value = mercadoInput.value.toUpperCase();
+        clearTimeout(marketTimer);
+        marketTimer = setTimeout(() => loadMarkets(mercadoInput.value.trim()), 150);
+    });
+    mercadoInput.addEventListener('focus', () => {
+        if (!mercadoOptions.children.length) loadMarkets(mercadoInput.value.trim());
+    }, { once: true });
+
+    // Respostas anteriores por rota + filtros; o servidor responde 304 enquanto os dados não mudarem
+    const responseCache = new Map();
+
+    async function conditionalFetch(url, parse, extra = {}) {
+        const formData = new FormData(filterForm);
+        for (const [name, value] of Object.entries(extra)) formData.append(name, value);
+        const key = url + '?' + new URLSearchParams(formData).toString();
+        const cached = responseCache.get(key);
+        const headers = cached ? { 'If-None-Match': cached.etag } : {};
+
+        const response = await fetch(url, { method: 'POST', body: formData, headers });
+        if (response.status === 304 && cached) return cached.result;
+        if (!response.ok) throw new Error(`Erro ${response.status}: ${await response.text()}`);
+
+        const result = await parse(response);
+        const etag = response.headers.get('ETag');
+        if (etag) responseCache.set(key, { etag, result });
+        return result;
+    }
+
+    // Formato compacto: período inicial, passo e colunas (listas ou bytes
+    // little-endian em base64); `x` só vem quando o servidor reduziu a série
+    function decodeColumn(data, name, ArrayType) {
+        const packed = data[name + '_b64'];
+        if (packed === undefined) return data[name];
+        const binary = atob(packed);
+        const bytes = new Uint8Array(binary.length);
+        for (let i = 0; i < binary.length; i++) bytes[i] = binary.charCodeAt(i);
+        return Array.from(new ArrayType(bytes.buffer), value => Number.isNaN(value) ? null : value);
+    }
+
+    function periodLabel(mesAbsoluto, passo) {
+        const ano = Math.floor(mesAbsoluto / 12);
+        const mes = mesAbsoluto % 12 + 1;
+        if (passo === 12) return `${ano}`;
+        if (passo === 3) return `${ano}-T${Math.floor((mes - 1) / 3) + 1}`;
+        return `${ano}-${String(mes).padStart(2, '0')}`;
+    }
+
+    function decodeCompactChart(data) {
+        const values = decodeColumn(data, 'values', Float32Array) || [];
+        const x = decodeColumn(data, 'x', Uint32Array) || values.map((_, i) => i);
+        const [ano, mes] = data.inicio.split('-').map(Number);
+        const inicio = ano * 12 + mes - 1;
+        return { labels: x.map(i => periodLabel(inicio + i * data.passo, data.passo)), values };
+    }
+
+    const AXIS_TITLES = { mensal: 'Data (Ano-Mês)', trimestral: 'Trimestre', anual: 'Ano' };
+
+    async function renderChart(url, label, axisTitle) {
         loading.classList.remove('d-none');
         messageDiv.innerHTML = '';
 
         try {
-            const response = await fetch('/dashboard', {
-                method: 'POST',
-                body: new FormData(filterForm),
+            // Um ponto a cada 2 px do canvas: além disso a linha não mostra mais detalhe
+            const data = await conditionalFetch(url, response => response.json(), {
+                formato: 'compacto',
+                codificacao: 'base64',
+                max_pontos: Math.max(3, Math.floor(ctx.canvas.clientWidth / 2)),
             });
 
-            if (!response.ok) throw new Error(`Erro ${response.status}: ${await response.text()}`);
-            const data = await response.json();
-
             if (data.error) {
                 messageDiv.innerHTML = `<div class="alert alert-danger">${data.error}</div>`;
                 if (chart) chart.destroy();
                 return;
             }
 
-            const labels = data.labels || [];
-            const values = data.values || [];
+            const { labels, values } = data.n ? decodeCompactChart(data) : { labels: [], values: [] };
             const isSinglePoint = data.single_point || false;
 
             if (labels.length === 0) {
@@ -55,13 +136,14 @@ document.addEventListener('DOMContentLoaded', () => {
                 data: {
                     labels: labels,
                     datasets: [{
-                        label: 'RPK (Revenue Passenger Kilometers)',
+                        label: label,
                         data: values,
                         backgroundColor: isSinglePoint ? '#FF6200' : 'rgba(255, 98, 0, 0.2)',
                         borderColor: '#FF6200',
                         borderWidth: isSinglePoint ? 0 : 2,
                         fill: !isSinglePoint,
-                        pointRadius: !isSinglePoint ? 3 : 0,
+                        pointRadius: !isSinglePoint && labels.length <= 120 ? 3 : 0,
+                        spanGaps: true,
                         tension: 0.1
                     }]
                 },
@@ -70,16 +152,16 @@ document.addEventListener('DOMContentLoaded', () => {
                     scales: {
                         y: {
                             beginAtZero: true,
-                            title: { display: true, text: 'RPK' },
+                            title: { display: true, text: axisTitle },
                             ticks: { callback: value => value.toLocaleString('pt-BR') }
                         },
-                        x: { title: { display: true, text: 'Data (Ano-Mês)' } }
+                        x: { title: { display: true, text: AXIS_TITLES[data.granularidade] || AXIS_TITLES.mensal } }
                     },
                     plugins: {
                         legend: { display: true },
                         tooltip: { callbacks: { label: ctx => `${ctx.dataset.label}: ${ctx.raw.toLocaleString('pt-BR')}` } }
                     },
-                    animation: { duration: 1000, easing: 'easeInOutQuart' }
+                    animation: labels.length > 500 ? false : { duration: 1000, easing: 'easeInOutQuart' }
                 }
             });
         } catch (error) {
@@ -87,153 +169,133 @@ document.addEventListener('DOMContentLoaded', () => {
             console.error('Erro:', error);
         } finally {
             loading.classList.add('d-none');
+        }
+    }
+
+    filterForm.addEventListener('submit', async (e) => {
+        e.preventDefault();
+        filterBtn.disabled = true;
+        try {
+            await renderChart('/dashboard', 'RPK (Revenue Passenger Kilometers)', 'RPK');
+        } finally {
             filterBtn.disabled = false;
         }
     });
 
-    exportCsvBtn.addEventListener('click', async () => {
-        exportCsvBtn.disabled = true;
+    // Exportações rodam em segundo plano no servidor: o pedido cria (ou
+    // reaproveita) um job, o status é consultado periodicamente e o arquivo
+    // pronto é baixado por um link comum, sem prender a página nem um worker
+    const sleep = ms => new Promise(resolve => setTimeout(resolve, ms));
+
+    async function runExport(button, formato, modo, rotulo) {
+        if (!filterForm.reportValidity()) return;
+        button.disabled = true;
         loading.classList.remove('d-none');
         messageDiv.innerHTML = '';
 
         try {
-            const response = await fetch('/export_csv', {
-                method: 'POST',
-                body: new FormData(filterForm),
-            });
+            const formData = new FormData(filterForm);
+            formData.append('formato', formato);
+            formData.append('modo', modo);
+            const response = await fetch('/exports', { method: 'POST', body: formData });
+            let job = await response.json();
+            if (!response.ok) throw new Error(job.error || `Erro ${response.status}`);
 
-            if (!response.ok) throw new Error(`Erro ${response.status}: ${await response.text()}`);
+            let delay = 500;
+            while (job.status === 'pendente' || job.status === 'executando') {
+                const progresso = job.progresso != null ? ` ${Math.round(job.progresso * 100)}%` : '';
+                messageDiv.innerHTML = `<div class="alert alert-info">Gerando ${rotulo}...${progresso}</div>`;
+                await sleep(delay);
+                delay = Math.min(delay * 1.5, 3000);
+                const status = await fetch(job.status_url);
+                job = await status.json();
+                if (!status.ok) throw new Error(job.error || `Erro ${status.status}`);
+            }
+            if (job.status !== 'concluido') throw new Error(job.erro || 'Falha na exportação.');
 
-            const blob = await response.blob();
-            const url = window.URL.createObjectURL(blob);
             const a = document.createElement('a');
-            a.href = url;
-            a.download = response.headers.get('Content-Disposition')?.split('filename=')[1] || 'rpk_report.csv';
+            a.href = job.download_url;
             document.body.appendChild(a);
             a.click();
             a.remove();
-            window.URL.revokeObjectURL(url);
 
-            messageDiv.innerHTML = `<div class="alert alert-success">CSV exportado com sucesso!</div>`;
+            messageDiv.innerHTML = `<div class="alert alert-success">${rotulo} exportado com sucesso!</div>`;
         } catch (error) {
-            messageDiv.innerHTML = `<div class="alert alert-danger">Erro ao exportar CSV: ${error.message}</div>`;
+            messageDiv.innerHTML = `<div class="alert alert-danger">Erro ao exportar ${rotulo}: ${error.message}</div>`;
             console.error('Erro:', error);
         } finally {
             loading.classList.add('d-none');
-            exportCsvBtn.disabled = false;
+            button.disabled = false;
         }
-    });
+    }
 
-    exportPdfBtn.addEventListener('click', async () => {
-        exportPdfBtn.disabled = true;
-        loading.classList.remove('d-none');
-        messageDiv.innerHTML = '';
+    exportCsvBtn.addEventListener('click', () => runExport(exportCsvBtn, 'csv', 'mensal', 'CSV'));
+    exportPdfBtn.addEventListener('click', () => runExport(exportPdfBtn, 'pdf', 'mensal', 'PDF'));
+    if (exportFlightsCsvBtn) {
+        exportFlightsCsvBtn.addEventListener('click', () => runExport(exportFlightsCsvBtn, 'csv', 'voos', 'CSV'));
+    }
+    if (exportFlightsPdfBtn) {
+        exportFlightsPdfBtn.addEventListener('click', () => runExport(exportFlightsPdfBtn, 'pdf', 'voos', 'PDF'));
+    }
+
+    // Ranking de mercados no período do filtro; clicar num mercado o seleciona no filtro
+    const rankingForm = document.getElementById('rankingForm');
+    const rankingTable = document.getElementById('rankingTable');
+    const rankingMessage = document.getElementById('rankingMessage');
+
+    rankingForm.addEventListener('submit', async (e) => {
+        e.preventDefault();
+        const rankingBtn = document.getElementById('rankingBtn');
+        rankingBtn.disabled = true;
+        rankingMessage.innerHTML = '';
 
         try {
-            const response = await fetch('/export_pdf', {
-                method: 'POST',
-                body: new FormData(filterForm),
+            const formData = new FormData(filterForm);
+            const params = new URLSearchParams({
+                metrica: document.getElementById('rankingMetrica').value,
+                n: document.getElementById('rankingN').value,
             });
+            for (const name of ['ano_inicio', 'mes_inicio', 'ano_fim', 'mes_fim']) params.set(name, formData.get(name));
 
-            if (!response.ok) throw new Error(`Erro ${response.status}: ${await response.text()}`);
-
-            const blob = await response.blob();
-            const url = window.URL.createObjectURL(blob);
-            const a = document.createElement('a');
-            a.href = url;
-            a.download = response.headers.get('Content-Disposition')?.split('filename=')[1] || 'rpk_report.pdf';
-            document.body.appendChild(a);
-            a.click();
-            a.remove();
-            window.URL.revokeObjectURL(url);
+            const response = await fetch(`/api/rankings?${params}`);
+            const data = await response.json();
+            if (!response.ok) throw new Error(data.error || `Erro ${response.status}`);
 
-            messageDiv.innerHTML = `<div class="alert alert-success">PDF exportado com sucesso!</div>`;
+            const percentual = data.metrica === 'LOAD_FACTOR';
+            document.getElementById('rankingValorHeader').textContent = data.titulo;
+            rankingTable.tBodies[0].replaceChildren(...data.ranking.map(item => {
+                const row = document.createElement('tr');
+                const valor = percentual
+                    ? item.valor.toLocaleString('pt-BR', { style: 'percent', minimumFractionDigits: 1 })
+                    : item.valor.toLocaleString('pt-BR');
+                for (const [texto, classe] of [[item.posicao, ''], [item.mercado, ''], [valor, 'text-end']]) {
+                    const cell = document.createElement('td');
+                    cell.textContent = texto;
+                    if (classe) cell.className = classe;
+                    row.appendChild(cell);
+                }
+                row.style.cursor = 'pointer';
+                row.addEventListener('click', () => { mercadoInput.value = item.mercado; });
+                return row;
+            }));
+            rankingTable.classList.toggle('d-none', data.ranking.length === 0);
+            if (data.ranking.length === 0) {
+                rankingMessage.innerHTML = `<div class="alert alert-warning">Nenhum voo entre ${data.inicio} e ${data.fim}.</div>`;
+            }
         } catch (error) {
-            messageDiv.innerHTML = `<div class="alert alert-danger">Erro ao exportar PDF: ${error.message}</div>`;
+            rankingTable.classList.add('d-none');
+            rankingMessage.innerHTML = `<div class="alert alert-danger">Erro ao carregar o ranking: ${error.message}</div>`;
             console.error('Erro:', error);
         } finally {
-            loading.classList.add('d-none');
-            exportPdfBtn.disabled = false;
+            rankingBtn.disabled = false;
         }
     });
 
     if (btnrpk) {
-        btnrpk.addEventListener('click', async (e) => {
+        btnrpk.addEventListener('click', (e) => {
             e.preventDefault();
-            loading.classList.remove('d-none');
-            messageDiv.innerHTML = '';
-    
-            try {
-                const response = await fetch('/rpk', {
-                    method: 'POST',
-                    body: new FormData(filterForm),
-                });
-    
-                if (!response.ok) throw new Error(`Erro ${response.status}: ${await response.text()}`);
-                const data = await response.json();
-    
-                if (data.error) {
-                    messageDiv.innerHTML = `<div class="alert alert-danger">${data.error}</div>`;
-                    if (chart) chart.destroy();
-                    return;
-                }
-    
-                const labels = data.labels || [];
-                const values = data.values || [];
-                const isSinglePoint = data.single_point || false;
-    
-                if (labels.length === 0) {
-                    messageDiv.innerHTML = `<div class="alert alert-warning">${data.message || 'Nenhum dado disponível.'}</div>`;
-                    if (chart) chart.destroy();
-                    return;
-                }
-    
-                if (isSinglePoint) {
-                    messageDiv.innerHTML = `<div class="alert alert-info">Apenas um ponto de dados encontrado.</div>`;
-                }
-    
-                if (chart) chart.destroy();
-    
-                chart = new Chart(ctx, {
-                    type: isSinglePoint ? 'bar' : 'line',
-                    data: {
-                        labels: labels,
-                        datasets: [{
-                            label: 'RPK / ASK',
-                            data: values,
-                            backgroundColor: isSinglePoint ? '#FF6200' : 'rgba(255, 98, 0, 0.2)',
-                            borderColor: '#FF6200',
-                            borderWidth: isSinglePoint ? 0 : 2,
-                            fill: !isSinglePoint,
-                            pointRadius: !isSinglePoint ? 3 : 0,
-                            tension: 0.1
-                        }]
-                    },
-                    options: {
-                        responsive: true,
-                        scales: {
-                            y: {
-                                beginAtZero: true,
-                                title: { display: true, text: 'RPK / ASK' },
-                                ticks: { callback: value => value.toLocaleString('pt-BR') }
-                            },
-                            x: { title: { display: true, text: 'Data (Ano-Mês)' } }
-                        },
-                        plugins: {
-                            legend: { display: true },
-                            tooltip: { callbacks: { label: ctx => `${ctx.dataset.label}: ${ctx.raw.toLocaleString('pt-BR')}` } }
-                        },
-                        animation: { duration: 1000, easing: 'easeInOutQuart' }
-                    }
-                });
-            } catch (error) {
-                messageDiv.innerHTML = `<div class="alert alert-danger">Erro ao carregar o gráfico: ${error.message}</div>`;
-                console.error('Erro:', error);
-            } finally {
-                loading.classList.add('d-none');
-                filterBtn.disabled = false;
-            }
+            renderChart('/rpk', 'RPK / ASK', 'RPK / ASK');
         });
     }
-    
+
 });
\ No newline at end of file
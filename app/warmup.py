@@ -0,0 +1,253 @@
+"""
+Aquecimento do cache de resultados a partir do histórico de filtros.
+
+No login de um usuário e a cada nova geração de dados publicada pela
+ingestão, uma tarefa em segundo plano calcula os gráficos dos filtros mais
+recentes e mais frequentes dos usuários ativos, além dos mais populares no
+geral, e os grava no cache de resultados. Cada passada respeita um limite
+de filtros e de tempo.
+"""
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from flask import Flask, current_app
+from sqlalchemy import func
+import functools
+import logging
+import threading
+import time
+from . import db
+from .models import FilterData, UserFilter
+from .repositories import FlightDataRepository, get_repository
+from .services import ResultCache, dense_cache_metric, get_dense_series, get_result_cache
+
+logger = logging.getLogger(__name__)
+
+# Gráficos do dashboard aquecidos para cada filtro: (métrica do cache, serviço).
+# O dashboard pede o formato compacto; a série densa mensal é o que ele reaproveita
+WARMUP_CHARTS: Tuple[Tuple[str, Callable[[FilterData, FlightDataRepository], Any]], ...] = tuple(
+    (dense_cache_metric(metrica, 'mensal'), functools.partial(get_dense_series, metrica=metrica))
+    for metrica in ('RPK', 'LOAD_FACTOR')
+)
+
+FILTER_COLUMNS = (UserFilter.mercado, UserFilter.ano_inicio, UserFilter.ano_fim, UserFilter.mes_inicio, UserFilter.mes_fim)
+
+
+def _as_filter(row) -> Optional[FilterData]:
+    mercado, ano_inicio, ano_fim, mes_inicio, mes_fim = row[:5]
+    try:
+        return FilterData(mercado=mercado, ano_inicio=ano_inicio, ano_fim=ano_fim, mes_inicio=mes_inicio, mes_fim=mes_fim)
+    except ValueError:
+        return None
+
+
+class CacheWarmer:
+    """
+    Calcula em segundo plano os gráficos que os usuários provavelmente vão pedir.
+
+    Só uma passada roda por vez em cada worker; pedidos feitos durante uma
+    passada são ignorados. Também conta quantos POSTs do dashboard foram
+    atendidos pelo cache e quantos deles por um resultado aquecido aqui.
+    """
+
+    def __init__(self, app: Flask, max_filters: int = 50, max_seconds: float = 10.0, recent_per_user: int = 3,
+                 frequent_per_user: int = 3, popular: int = 10, active_days: int = 30, max_tracked_keys: int = 4096):
+        self.app = app
+        self.max_filters = max_filters
+        self.max_seconds = max_seconds
+        self.recent_per_user = recent_per_user
+        self.frequent_per_user = frequent_per_user
+        self.popular = popular
+        self.active_days = active_days
+        self.max_tracked_keys = max_tracked_keys
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='warmup')
+        self._lock = threading.Lock()
+        self._running = False
+        self._generation: Optional[int] = None
+        # Chaves de cache gravadas pelo aquecimento, para atribuir os acertos
+        self._warmed_keys: 'OrderedDict[str, None]' = OrderedDict()
+        self.passes = 0
+        self.warmed = 0
+        self.already_cached = 0
+        self.errors = 0
+        self.last_pass: Dict[str, Any] = {}
+        self.dashboard_posts = 0
+        self.cache_hits = 0
+        self.warm_hits = 0
+
+    def schedule(self, user_id: Optional[int] = None, reason: str = 'login') -> Optional[Future]:
+        """Agenda uma passada para o usuário (ou para todos os usuários ativos); None se já houver uma em andamento."""
+        with self._lock:
+            if self._running:
+                return None
+            self._running = True
+        try:
+            return self._executor.submit(self._run, user_id, reason)
+        except RuntimeError:
+            with self._lock:
+                self._running = False
+            return None
+
+    def notice_generation(self, generation: int) -> Optional[Future]:
+        """Agenda uma passada para todos os usuários ativos quando a geração de dados mudar."""
+        if generation == self._generation:
+            return None
+        future = self.schedule(reason=f'geração {generation}')
+        if future is not None:
+            self._generation = generation
+        return future
+
+    def candidate_filters(self, user_id: Optional[int] = None) -> List[FilterData]:
+        """Filtros a aquecer, em ordem de prioridade e sem repetição: do usuário (ou dos ativos) e depois os populares."""
+        since = datetime.utcnow() - timedelta(days=self.active_days)
+        if user_id is not None:
+            users = [user_id]
+        else:
+            rows = (db.session.query(UserFilter.user_id, func.max(UserFilter.timestamp).label('ultimo'))
+                    .filter(UserFilter.timestamp >= since)
+                    .group_by(UserFilter.user_id)
+                    .order_by(func.max(UserFilter.timestamp).desc())
+                    .all())
+            users = [row.user_id for row in rows]
+
+        candidates: List[Tuple] = []
+        for user in users:
+            recent = (db.session.query(*FILTER_COLUMNS)
+                      .filter(UserFilter.user_id == user, UserFilter.timestamp >= since)
+                      .order_by(UserFilter.timestamp.desc())
+                      .limit(self.recent_per_user * 4)
+                      .all())
+            candidates.extend(list(OrderedDict.fromkeys(tuple(row) for row in recent))[:self.recent_per_user])
+            frequent = (db.session.query(*FILTER_COLUMNS, func.count().label('usos'))
+                        .filter(UserFilter.user_id == user, UserFilter.timestamp >= since)
+                        .group_by(*FILTER_COLUMNS)
+                        .order_by(func.count().desc())
+                        .limit(self.frequent_per_user)
+                        .all())
+            candidates.extend(tuple(row[:5]) for row in frequent)
+        popular = (db.session.query(*FILTER_COLUMNS, func.count().label('usos'))
+                   .filter(UserFilter.timestamp >= since)
+                   .group_by(*FILTER_COLUMNS)
+                   .order_by(func.count().desc())
+                   .limit(self.popular)
+                   .all())
+        candidates.extend(tuple(row[:5]) for row in popular)
+
+        filters = []
+        for row in OrderedDict.fromkeys((row[0].strip().upper(),) + tuple(row[1:5]) for row in candidates):
+            filter_data = _as_filter(row)
+            if filter_data is not None:
+                filters.append(filter_data)
+        return filters
+
+    def _run(self, user_id: Optional[int], reason: str) -> Dict[str, Any]:
+        start = time.perf_counter()
+        warmed = already_cached = errors = 0
+        filters: List[FilterData] = []
+        stopped = None
+        try:
+            with self.app.app_context():
+                cache = get_result_cache()
+                if cache is None:
+                    return {}
+                repo = get_repository()
+                filters = self.candidate_filters(user_id)[:self.max_filters]
+                generation = repo.get_data_generation()
+                for filter_data in filters:
+                    if time.perf_counter() - start > self.max_seconds:
+                        stopped = 'tempo'
+                        break
+                    for metric, service in WARMUP_CHARTS:
+                        if cache.contains(metric, filter_data, generation):
+                            already_cached += 1
+                            continue
+                        try:
+                            service(filter_data, repo)
+                        except ValueError:
+                            # Mercado que deixou de existir na nova geração
+                            errors += 1
+                            continue
+                        warmed += 1
+                        self._track(ResultCache.make_key(metric, filter_data, generation))
+                db.session.remove()
+        except Exception as e:
+            errors += 1
+            logger.error(f"Erro no aquecimento do cache ({reason}): {str(e)}", exc_info=True)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.last_pass = {
+                'motivo': reason,
+                'usuario': user_id,
+                'filtros': len(filters),
+                'aquecidos': warmed,
+                'ja_em_cache': already_cached,
+                'erros': errors,
+                'interrompido_por': stopped,
+                'segundos': round(elapsed, 3),
+                'em': datetime.utcnow().isoformat(timespec='seconds'),
+            }
+            self.passes += 1
+            self.warmed += warmed
+            self.already_cached += already_cached
+            self.errors += errors
+            with self._lock:
+                self._running = False
+            logger.info(f"Aquecimento do cache ({reason}): {warmed} gráfico(s) calculado(s) para {len(filters)} filtro(s) em {elapsed:.2f}s")
+        return self.last_pass
+
+    def _track(self, key: str) -> None:
+        with self._lock:
+            self._warmed_keys[key] = None
+            self._warmed_keys.move_to_end(key)
+            if len(self._warmed_keys) > self.max_tracked_keys:
+                self._warmed_keys.popitem(last=False)
+
+    def record_request(self, metric: str, filter_data: FilterData, generation: int, cache: Optional[ResultCache]) -> None:
+        """Conta um POST de gráfico do dashboard, antes do cálculo, como atendido pelo cache ou não."""
+        hit = cache is not None and cache.contains(metric, filter_data, generation)
+        warm = hit and ResultCache.make_key(metric, filter_data, generation) in self._warmed_keys
+        with self._lock:
+            self.dashboard_posts += 1
+            self.cache_hits += hit
+            self.warm_hits += warm
+
+    def stats(self) -> Dict[str, Any]:
+        posts = self.dashboard_posts
+        return {
+            'dashboard_posts': posts,
+            'cache_hits': self.cache_hits,
+            'warm_hits': self.warm_hits,
+            'hit_rate': round(self.cache_hits / posts, 4) if posts else None,
+            'warm_hit_rate': round(self.warm_hits / posts, 4) if posts else None,
+            'passes': self.passes,
+            'warmed': self.warmed,
+            'already_cached': self.already_cached,
+            'errors': self.errors,
+            'running': self._running,
+            'last_pass': self.last_pass,
+        }
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._executor.shutdown(wait=wait)
+
+
+def init_cache_warmer(app: Flask) -> Optional[CacheWarmer]:
+    """Habilita o aquecimento do cache a partir das chaves `WARMUP_*`; exige o cache de resultados."""
+    if not app.config.get('WARMUP_ENABLED', True) or 'result_cache' not in app.extensions:
+        return None
+    warmer = CacheWarmer(
+        app,
+        max_filters=app.config.get('WARMUP_MAX_FILTERS', 50),
+        max_seconds=app.config.get('WARMUP_MAX_SECONDS', 10.0),
+        recent_per_user=app.config.get('WARMUP_RECENT_PER_USER', 3),
+        frequent_per_user=app.config.get('WARMUP_FREQUENT_PER_USER', 3),
+        popular=app.config.get('WARMUP_POPULAR', 10),
+        active_days=app.config.get('WARMUP_ACTIVE_DAYS', 30),
+    )
+    app.extensions['cache_warmer'] = warmer
+    return warmer
+
+def get_cache_warmer() -> Optional[CacheWarmer]:
+    """Retorna o aquecedor de cache do app corrente, se habilitado."""
+    return current_app.extensions.get('cache_warmer')
@@ -0,0 +1,84 @@
+"""
+Compara a geração de PDF antiga (um único `Table` do reportlab com todas as
+linhas) com `app.reports.build_pdf_report` em linhas sintéticas de voos.
+
+O caminho antigo tem custo de layout superlinear; acima de --legacy-max
+linhas ele é omitido.
+
+Uso: python -m benchmarks.bench_pdf --rows 1000,100000,1000000 [--json resultados.json]
+"""
+import argparse
+import io
+import time
+import tracemalloc
+import numpy as np
+from reportlab import rl_config
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import letter
+from reportlab.platypus import SimpleDocTemplate, Table, TableStyle
+from app.reports import build_chart, build_pdf_report
+from .results import Results
+
+COLUMNS = ['ANO', 'MES', 'MERCADO', 'RPK', 'ASK']
+
+def synthetic_rows(rows: int, seed: int = 42):
+    rng = np.random.default_rng(seed)
+    rpk = rng.integers(0, 300_000, rows).astype(float)
+    ask = rng.integers(1, 400_000, rows).astype(float)
+    for i in range(rows):
+        yield (2015 + (i // 12) % 10, i % 12 + 1, 'SBGRSBSV', float(rpk[i]), float(ask[i]))
+
+def legacy_path(rows: int) -> int:
+    data = [COLUMNS] + [list(row) for row in synthetic_rows(rows)]
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=letter)
+    table = Table(data)
+    table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), 12),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black),
+    ]))
+    doc.build([table])
+    return buffer.getbuffer().nbytes
+
+def paged_path(rows: int) -> int:
+    labels = [f"2015-{mes:02d}" for mes in range(1, 13)]
+    chart = build_chart(labels, [float(mes) for mes in range(12)])
+    return build_pdf_report('Benchmark', COLUMNS, synthetic_rows(rows), chart).getbuffer().nbytes
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', default='1000,100000,1000000', help='tamanhos separados por vírgula')
+    parser.add_argument('--legacy-max', type=int, default=10_000)
+    parser.add_argument('--memory', action='store_true', help='mede o pico de alocações (mais lento)')
+    parser.add_argument('--json', help='arquivo de saída dos resultados')
+    parser.add_argument('--ascii85', action='store_true', help='liga o ASCII85 (o app o desliga por padrão, PDF_ASCII85)')
+    args = parser.parse_args()
+    rl_config.useA85 = 1 if args.ascii85 else 0
+
+    results = Results('bench_pdf', legacy_max=args.legacy_max, memory=args.memory)
+
+    for rows in (int(valor) for valor in args.rows.split(',')):
+        for nome, func in (('table', legacy_path), ('paginado', paged_path)):
+            if nome == 'table' and rows > args.legacy_max:
+                print(f"{rows:>9} {nome:>9}: omitido (acima de --legacy-max)")
+                continue
+            if args.memory:
+                tracemalloc.start()
+            inicio = time.perf_counter()
+            tamanho = func(rows)
+            duracao = time.perf_counter() - inicio
+            dados = {'kb_pdf': round(tamanho / 1024)}
+            if args.memory:
+                dados['pico_mb'] = round(tracemalloc.get_traced_memory()[1] / 2**20)
+                tracemalloc.stop()
+            results.add(f'pdf.{nome}', duracao, parametros={'linhas': rows}, **dados)
+    results.write(args.json)
+
+if __name__ == '__main__':
+    main()
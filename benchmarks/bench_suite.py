@@ -0,0 +1,124 @@
+"""
+Benchmark de ponta a ponta em dados sintéticos da ANAC, em vários tamanhos.
+
+Para cada tamanho gera o CSV (`benchmarks.dataset`), mede a ingestão com
+`process_data` num SQLite temporário e, sobre o banco carregado, as leituras
+do repositório (`get_filtered_flight_data`, `get_available_markets`, agregado
+mensal), os serviços dos gráficos (sem cache de resultados, pelo SQL e pelo
+cubo de métricas) e as exportações CSV e PDF. O mercado medido é o de maior
+movimento, no período completo do arquivo.
+
+Uso: python -m benchmarks.bench_suite --rows 100000,1000000 --json resultados.json
+"""
+import argparse
+import io
+import os
+import tempfile
+import time
+from app import create_app
+from app.cube import MetricCube
+from app.data_processing import process_data
+from app.models import FilterData, RankingRequest
+from app.repositories import FlightDataRepository, SnapshotFlightDataRepository
+from app.services import (
+    get_dashboard_initial_data, get_flight_RPK, get_flight_data, get_flight_data_csv, get_flight_data_pdf,
+    get_flight_detail_pdf, get_market_ranking, stream_flight_data_csv,
+)
+from .dataset import DatasetSpec, write_csv
+from .results import Results
+
+def busiest_market(repo: FlightDataRepository) -> str:
+    monthly = repo.get_all_monthly_flight_data()
+    return str(monthly.groupby('MERCADO', observed=True)['VOOS'].sum().idxmax())
+
+def bench_size(results: Results, rows: int, args, directory: str) -> None:
+    spec = DatasetSpec(rows=rows, seed=args.seed, airports=args.airports, routes=args.routes)
+    csv_path = os.path.join(directory, 'anac.csv')
+    db_url = f"sqlite:///{os.path.join(directory, 'flight_stats.db')}"
+    snapshot_dir = os.path.join(directory, 'snapshot')
+    base = {'linhas': rows}
+
+    tamanho, _ = results.measure('dataset.write_csv', lambda: write_csv(csv_path, spec), parametros=base)
+    inicio = time.perf_counter()
+    gravadas = process_data(csv_path, chunksize=args.chunksize, db_url=db_url, workers=args.workers, snapshot_dir=snapshot_dir)
+    duracao = time.perf_counter() - inicio
+    results.add('ingest.process_data', duracao, parametros={**base, 'workers': args.workers},
+                linhas_gravadas=gravadas, linhas_por_segundo=round(rows / duracao), mb_csv=round(tamanho / 2**20, 1))
+
+    repos = {
+        'sql': FlightDataRepository(db_url),
+        'snapshot': SnapshotFlightDataRepository(snapshot_dir, db_url),
+    }
+    mercado = busiest_market(repos['sql'])
+    ano_inicio, ano_fim = spec.ano_inicio, spec.ano_fim
+    filter_data = FilterData(mercado=mercado, ano_inicio=ano_inicio, ano_fim=ano_fim)
+    historico = RankingRequest(metrica='RPK', n=20, ano_inicio=ano_inicio, ano_fim=ano_fim)
+    repeat = args.repeat
+
+    for backend, repo in repos.items():
+        params = {**base, 'backend': backend}
+        frame, medicao = results.measure('repo.get_filtered_flight_data', lambda: repo.get_filtered_flight_data(filter_data),
+                                         repeat, parametros=params)
+        medicao['linhas_lidas'] = len(frame)
+        results.measure('repo.get_available_markets', repo.get_available_markets, repeat, parametros=params)
+        results.measure('repo.get_monthly_flight_data', lambda: repo.get_monthly_flight_data(filter_data), repeat, parametros=params)
+        results.measure('services.get_dashboard_initial_data', lambda: get_dashboard_initial_data(repo), repeat, parametros=params)
+        # Fora do contexto do app: sem cache de resultados e sem cubo
+        results.measure('services.get_flight_data', lambda: get_flight_data(filter_data, repo), repeat, parametros=params)
+        results.measure('services.get_flight_RPK', lambda: get_flight_RPK(filter_data, repo), repeat, parametros=params)
+        results.measure('services.get_market_ranking', lambda: get_market_ranking(historico, repo), repeat, parametros=params)
+
+    repo = repos['sql']
+    cube, _ = results.measure('cube.build', lambda: MetricCube.build(repo), parametros=base)
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': db_url,
+        'RESULT_CACHE_BACKEND': None,
+        'HISTORY_WRITE_BEHIND': False,
+        'WARMUP_ENABLED': False,
+    })
+    with app.app_context():
+        app_repo = app.extensions['flight_data_repository']
+        # A primeira chamada monta o cubo da geração
+        get_flight_data(filter_data, app_repo)
+        params = {**base, 'backend': 'cubo'}
+        results.measure('services.get_flight_data', lambda: get_flight_data(filter_data, app_repo), repeat, parametros=params)
+        results.measure('services.get_flight_RPK', lambda: get_flight_RPK(filter_data, app_repo), repeat, parametros=params)
+        results.measure('cube.series', lambda: cube.series(mercado, ano_inicio * 100 + 1, ano_fim * 100 + 12), repeat, parametros=params)
+        # Ranking de todos os mercados em todo o histórico (somas de prefixo + seleção parcial)
+        results.measure('services.get_market_ranking', lambda: get_market_ranking(historico, app_repo), repeat, parametros=params)
+        mes = RankingRequest(metrica='RPK', n=20, ano_inicio=ano_fim, ano_fim=ano_fim, mes_inicio=12, mes_fim=12)
+        results.measure('services.get_market_ranking', lambda: get_market_ranking(mes, app_repo), repeat,
+                        parametros={**base, 'backend': 'ranking'})
+
+        params = {**base, 'backend': 'sql'}
+        results.measure('export.csv_mensal', lambda: get_flight_data_csv(filter_data, app_repo), repeat, parametros=params)
+        tamanho, medicao = results.measure('export.csv_voos', lambda: sum(len(bloco) for bloco in stream_flight_data_csv(filter_data, app_repo)),
+                                           parametros=params)
+        medicao['bytes'] = tamanho
+        results.measure('export.pdf_mensal', lambda: get_flight_data_pdf(filter_data, app_repo), parametros=params)
+        if rows <= args.pdf_max_rows:
+            pdf, medicao = results.measure('export.pdf_voos', lambda: get_flight_detail_pdf(filter_data, app_repo), parametros=params)
+            medicao['bytes'] = pdf.getbuffer().nbytes if isinstance(pdf, io.BytesIO) else None
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', default='100000,1000000', help='tamanhos separados por vírgula')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--airports', type=int, default=20)
+    parser.add_argument('--routes', type=int, default=150)
+    parser.add_argument('--chunksize', type=int, default=100_000)
+    parser.add_argument('--workers', type=int, default=1, help='processos de transformação da ingestão')
+    parser.add_argument('--repeat', type=int, default=5, help='repetições das leituras (vale o melhor tempo)')
+    parser.add_argument('--pdf-max-rows', type=int, default=2_000_000, help='omite o PDF dos voos acima deste tamanho')
+    parser.add_argument('--json', help='arquivo de saída dos resultados')
+    args = parser.parse_args()
+
+    sizes = [int(valor) for valor in args.rows.split(',')]
+    results = Results('bench_suite', seed=args.seed, airports=args.airports, routes=args.routes)
+    for rows in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            bench_size(results, rows, args, tmp)
+    results.write(args.json)
+
+if __name__ == '__main__':
+    main()
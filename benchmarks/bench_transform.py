@@ -0,0 +1,55 @@
+"""
+Compara o caminho antigo (apply linha a linha) com o caminho vetorizado
+de `app.data_processing` num CSV sintético no formato da ANAC.
+
+Uso: python -m benchmarks.bench_transform --rows 3000000 [--json resultados.json]
+"""
+import argparse
+import os
+import tempfile
+import pandas as pd
+from app.data_processing import read_chunks, transform_chunk
+from .dataset import write_synthetic_csv
+from .results import Results
+
+def legacy_path(csv_path: str, chunksize: int) -> int:
+    total = 0
+    for chunk in pd.read_csv(csv_path, encoding='utf-8', delimiter=';', chunksize=chunksize, skiprows=1):
+        chunk_filtered = chunk[
+            (chunk['EMPRESA_SIGLA'] == 'GLO') &
+            (chunk['GRUPO_DE_VOO'] == 'REGULAR') &
+            (chunk['NATUREZA'] == 'DOMÉSTICA')
+        ].copy()
+        chunk_filtered['MERCADO'] = chunk_filtered.apply(
+            lambda row: ''.join(sorted([
+                str(row['AEROPORTO_DE_ORIGEM_SIGLA']) if pd.notna(row['AEROPORTO_DE_ORIGEM_SIGLA']) else '',
+                str(row['AEROPORTO_DE_DESTINO_SIGLA']) if pd.notna(row['AEROPORTO_DE_DESTINO_SIGLA']) else ''
+            ])),
+            axis=1
+        )
+        total += len(chunk_filtered[['ANO', 'MES', 'MERCADO', 'RPK', 'ASK']])
+    return total
+
+def vectorized_path(csv_path: str, chunksize: int) -> int:
+    return sum(len(transform_chunk(chunk)) for chunk in read_chunks(csv_path, chunksize))
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=3_000_000)
+    parser.add_argument('--chunksize', type=int, default=100_000)
+    parser.add_argument('--json', help='arquivo de saída dos resultados')
+    args = parser.parse_args()
+
+    results = Results('bench_transform', rows=args.rows, chunksize=args.chunksize)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = os.path.join(tmp, 'anac.csv')
+        write_synthetic_csv(csv_path, args.rows)
+        for nome, func in (('apply', legacy_path), ('vetorizado', vectorized_path)):
+            linhas, medicao = results.measure(f'transform.{nome}', lambda: func(csv_path, args.chunksize),
+                                              parametros={'linhas': args.rows})
+            medicao['linhas_filtradas'] = linhas
+    results.write(args.json)
+
+if __name__ == '__main__':
+    main()
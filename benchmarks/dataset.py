@@ -0,0 +1,156 @@
+"""
+Gerador determinístico de CSVs sintéticos no formato da ANAC.
+
+O arquivo segue o `Dados_Estatisticos.csv`: uma linha de título antes do
+cabeçalho, `;` como separador e as linhas em ordem de ANO e MES. As rotas são
+sorteadas uma vez entre `airports` aeroportos com popularidade em cauda longa
+(poucos mercados concentram a maior parte dos voos), e o RPK sai do ASK com
+um aproveitamento entre 55% e 95%. A mesma semente gera sempre o mesmo
+arquivo, então os tempos são comparáveis entre commits.
+
+Uso: python -m benchmarks.dataset anac.csv --rows 10000000
+"""
+import argparse
+import os
+import tempfile
+import time
+from dataclasses import dataclass
+from itertools import product
+from typing import List, Optional, Tuple
+import numpy as np
+import pandas as pd
+
+AEROPORTOS = ['SBGR', 'SBSP', 'SBRJ', 'SBGL', 'SBBR', 'SBSV', 'SBFL', 'SBPA', 'SBCF', 'SBKP',
+              'SBRF', 'SBFZ', 'SBCT', 'SBBE', 'SBEG', 'SBGO', 'SBVT', 'SBNT', 'SBMO', 'SBCY']
+
+EMPRESAS = {'GLO': 'GOL LINHAS AÉREAS S.A.', 'AZU': 'AZUL LINHAS AÉREAS BRASILEIRAS S/A',
+            'TAM': 'TAM LINHAS AÉREAS S.A.', 'PTB': 'PASSAREDO TRANSPORTES AÉREOS S.A.'}
+EMPRESA_PESOS = [0.35, 0.3, 0.3, 0.05]
+GRUPOS_DE_VOO = ['REGULAR', 'IMPRODUTIVO', 'NÃO REGULAR']
+GRUPO_PESOS = [0.85, 0.05, 0.1]
+NATUREZAS = ['DOMÉSTICA', 'INTERNACIONAL']
+NATUREZA_PESOS = [0.9, 0.1]
+
+BLOCK_ROWS = 500_000
+
+
+def airport_codes(count: int) -> List[str]:
+    """Siglas dos aeroportos: as reais primeiro, depois siglas 'SBxx' fictícias."""
+    extras = (f"SB{a}{b}" for a, b in product('ABCDEFGHIJKLMNOPQRSTUVWXYZ', repeat=2))
+    codes = list(AEROPORTOS[:count])
+    for code in extras:
+        if len(codes) >= count:
+            break
+        if code not in codes:
+            codes.append(code)
+    return codes
+
+
+@dataclass(frozen=True)
+class DatasetSpec:
+    """Parâmetros do CSV sintético; o arquivo é função apenas destes valores."""
+    rows: int
+    seed: int = 42
+    airports: int = 20
+    routes: int = 150
+    ano_inicio: int = 2015
+    ano_fim: int = 2024
+
+    @property
+    def periods(self) -> List[Tuple[int, int]]:
+        return [(ano, mes) for ano in range(self.ano_inicio, self.ano_fim + 1) for mes in range(1, 13)]
+
+
+def _routes(spec: DatasetSpec, rng: np.random.Generator) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Pares (origem, destino) distintos e a probabilidade de cada um (lei de Zipf)."""
+    codes = np.array(airport_codes(spec.airports), dtype=object)
+    pares = [(a, b) for a in range(len(codes)) for b in range(len(codes)) if a != b]
+    escolhidos = rng.permutation(len(pares))[:spec.routes]
+    origem = codes[[pares[i][0] for i in escolhidos]]
+    destino = codes[[pares[i][1] for i in escolhidos]]
+    pesos = 1.0 / np.arange(1, len(escolhidos) + 1)
+    return origem, destino, pesos / pesos.sum()
+
+
+def iter_blocks(spec: DatasetSpec, block_rows: int = BLOCK_ROWS):
+    """Gera o conteúdo do CSV em DataFrames de até `block_rows` linhas, em ordem de período."""
+    rng = np.random.default_rng(spec.seed)
+    origem, destino, probabilidades = _routes(spec, rng)
+    periods = np.array(spec.periods, dtype=np.int64)
+    empresas = list(EMPRESAS)
+    nomes = np.array([EMPRESAS[sigla] for sigla in empresas], dtype=object)
+    for inicio in range(0, spec.rows, block_rows):
+        n = min(block_rows, spec.rows - inicio)
+        # Linhas distribuídas por igual entre os períodos, em ordem, como no arquivo real
+        periodo = (np.arange(inicio, inicio + n, dtype=np.int64) * len(periods)) // spec.rows
+        rota = rng.choice(len(origem), n, p=probabilidades)
+        empresa = rng.choice(len(empresas), n, p=EMPRESA_PESOS)
+        distancia = rng.integers(300, 3000, n)
+        assentos = rng.choice([138, 162, 176, 186], n)
+        aproveitamento = rng.uniform(0.55, 0.95, n)
+        pagos = np.floor(assentos * aproveitamento).astype(np.int64)
+        yield pd.DataFrame({
+            'EMPRESA_SIGLA': np.array(empresas, dtype=object)[empresa],
+            'EMPRESA_NOME': nomes[empresa],
+            'EMPRESA_NACIONALIDADE': 'BRASILEIRA',
+            'ANO': periods[periodo, 0],
+            'MES': periods[periodo, 1],
+            'AEROPORTO_DE_ORIGEM_SIGLA': origem[rota],
+            'AEROPORTO_DE_DESTINO_SIGLA': destino[rota],
+            'NATUREZA': rng.choice(NATUREZAS, n, p=NATUREZA_PESOS),
+            'GRUPO_DE_VOO': rng.choice(GRUPOS_DE_VOO, n, p=GRUPO_PESOS),
+            'PASSAGEIROS_PAGOS': pagos,
+            'PASSAGEIROS_GRATIS': rng.integers(0, 3, n),
+            'DECOLAGENS': 1,
+            'ASSENTOS': assentos,
+            'DISTANCIA_VOADA_KM': distancia,
+            'RPK': (pagos * distancia).astype(float),
+            'ASK': (assentos * distancia).astype(float),
+        })
+
+
+def write_csv(path: str, spec: DatasetSpec, block_rows: int = BLOCK_ROWS) -> int:
+    """Grava o CSV sintético em `path` e retorna o tamanho em bytes."""
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        f.write('DADOS ESTATÍSTICOS DO TRANSPORTE AÉREO (SINTÉTICO)\n')
+        for i, block in enumerate(iter_blocks(spec, block_rows)):
+            block.to_csv(f, sep=';', index=False, header=i == 0)
+    return os.path.getsize(path)
+
+
+def write_synthetic_csv(path: str, rows: int, seed: int = 42) -> int:
+    """Atalho para `write_csv` com os parâmetros padrão."""
+    return write_csv(path, DatasetSpec(rows=rows, seed=seed))
+
+
+def build_database(spec: DatasetSpec, directory: str, chunksize: int = 100_000, workers: int = 1,
+                   snapshot_dir: Optional[str] = None) -> str:
+    """Gera o CSV e o ingere num SQLite em `directory`; retorna a URL do banco."""
+    from app.data_processing import process_data
+    csv_path = os.path.join(directory, 'anac.csv')
+    db_url = f"sqlite:///{os.path.join(directory, 'flight_stats.db')}"
+    write_csv(csv_path, spec)
+    process_data(csv_path, chunksize=chunksize, db_url=db_url, workers=workers, snapshot_dir=snapshot_dir)
+    return db_url
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('path', nargs='?', help='arquivo de saída (padrão: arquivo temporário)')
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--airports', type=int, default=20)
+    parser.add_argument('--routes', type=int, default=150)
+    parser.add_argument('--anos', default='2015-2024', help='intervalo de anos, ex.: 2015-2024')
+    args = parser.parse_args()
+
+    ano_inicio, ano_fim = (int(ano) for ano in args.anos.split('-'))
+    spec = DatasetSpec(rows=args.rows, seed=args.seed, airports=args.airports, routes=args.routes,
+                       ano_inicio=ano_inicio, ano_fim=ano_fim)
+    path = args.path or os.path.join(tempfile.mkdtemp(), 'anac.csv')
+    inicio = time.perf_counter()
+    tamanho = write_csv(path, spec)
+    print(f"{path}: {args.rows} linhas, {tamanho / 2**20:.1f} MB em {time.perf_counter() - inicio:.2f}s")
+
+if __name__ == '__main__':
+    main()
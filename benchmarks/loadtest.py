@@ -0,0 +1,340 @@
+"""
+Teste de carga HTTP do dashboard com percentis de latência por rota.
+
+Gera um banco SQLite com dados sintéticos (`benchmarks.dataset`), sobe o app
+com o gunicorn (ou o servidor do werkzeug, em processo) e dispara usuários
+virtuais em threads: cada um se registra, faz login por `/login` e repete
+uma mistura de GET e POST `/dashboard`, `/rpk`, `/export_csv` e
+`/export_pdf` com filtros sorteados. Para cada nível de concorrência
+informa vazão, p50/p95/p99 e taxa de erros por rota; com vários níveis
+(`--concurrency 1,2,4,8,16`) a varredura aponta onde a vazão para de crescer.
+
+Uso:
+    python -m benchmarks.loadtest --rows 500000 --workers 2 --concurrency 1,4,16,32 --duration 20
+    python -m benchmarks.loadtest --url http://localhost:8000 --db-url sqlite:///flight_stats.db
+"""
+import argparse
+import http.cookiejar
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple
+import numpy as np
+from .dataset import DatasetSpec, build_database
+from .results import Results
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Peso de cada rota na mistura padrão: a maior parte da carga são os gráficos
+DEFAULT_MIX = {'dashboard_get': 1, 'dashboard_post': 6, 'rpk': 6, 'export_csv': 1, 'export_pdf': 1}
+
+PERCENTIS = (50, 95, 99)
+
+
+@dataclass
+class RouteStats:
+    """Latências (s) e erros de uma rota num nível de concorrência."""
+    latencias: List[float] = field(default_factory=list)
+    erros: int = 0
+    status: Dict[int, int] = field(default_factory=dict)
+
+    def summary(self, duracao: float) -> Dict[str, float]:
+        total = len(self.latencias) + self.erros
+        resumo = {
+            'requisicoes': total,
+            'erros': self.erros,
+            'taxa_erros': round(self.erros / total, 4) if total else 0.0,
+            'vazao_rps': round(len(self.latencias) / duracao, 2) if duracao else 0.0,
+            'status': {str(codigo): n for codigo, n in sorted(self.status.items())},
+        }
+        if self.latencias:
+            valores = np.percentile(np.array(self.latencias) * 1000, PERCENTIS)
+            resumo.update({f'p{p}_ms': round(float(v), 2) for p, v in zip(PERCENTIS, valores)})
+            resumo['max_ms'] = round(max(self.latencias) * 1000, 2)
+        return resumo
+
+
+class VirtualUser:
+    """Um usuário do dashboard, com sessão (cookies) própria."""
+
+    def __init__(self, base_url: str, username: str, password: str, timeout: float):
+        self.base_url = base_url.rstrip('/')
+        self.username = username
+        self.password = password
+        self.timeout = timeout
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+
+    def request(self, path: str, form: Optional[Dict[str, str]] = None) -> Tuple[int, bytes, str]:
+        data = urllib.parse.urlencode(form).encode() if form is not None else None
+        try:
+            with self.opener.open(self.base_url + path, data=data, timeout=self.timeout) as response:
+                return response.status, response.read(), response.geturl()
+        except urllib.error.HTTPError as e:
+            return e.code, e.read(), e.geturl()
+
+    def login(self) -> None:
+        credenciais = {'username': self.username, 'password': self.password}
+        self.request('/register', credenciais)
+        status, _, url = self.request('/login', credenciais)
+        if status != 200 or not urllib.parse.urlparse(url).path.endswith('/dashboard'):
+            raise RuntimeError(f"Login de {self.username} falhou (HTTP {status}, {url})")
+
+
+class Workload:
+    """Sorteia rotas pela mistura de pesos e filtros entre os mercados informados."""
+
+    def __init__(self, mercados: List[str], ano_inicio: int, ano_fim: int, mix: Dict[str, int]):
+        self.mercados = mercados
+        self.anos = list(range(ano_inicio, ano_fim + 1))
+        self.rotas = [rota for rota, peso in mix.items() if peso > 0]
+        self.pesos = [mix[rota] for rota in self.rotas]
+
+    def filtro(self, rng: random.Random) -> Dict[str, str]:
+        # Os primeiros mercados são os mais movimentados e os mais consultados
+        indice = min(int(rng.paretovariate(1.2)) - 1, len(self.mercados) - 1)
+        inicio, fim = sorted(rng.sample(self.anos, 2)) if len(self.anos) > 1 else (self.anos[0], self.anos[0])
+        return {'mercado': self.mercados[indice], 'ano_inicio': str(inicio), 'ano_fim': str(fim),
+                'mes_inicio': '1', 'mes_fim': '12'}
+
+    def next(self, rng: random.Random) -> Tuple[str, str, Optional[Dict[str, str]]]:
+        rota = rng.choices(self.rotas, self.pesos)[0]
+        if rota == 'dashboard_get':
+            return rota, '/dashboard', None
+        caminho = {'dashboard_post': '/dashboard', 'rpk': '/rpk', 'export_csv': '/export_csv', 'export_pdf': '/export_pdf'}[rota]
+        return rota, caminho, self.filtro(rng)
+
+
+def run_level(base_url: str, workload: Workload, concurrency: int, duracao: float, args, seed: int) -> Dict[str, object]:
+    """Roda `concurrency` usuários por `duracao` segundos e resume as latências por rota."""
+    stats: Dict[str, RouteStats] = {rota: RouteStats() for rota in workload.rotas}
+    lock = threading.Lock()
+    fim = [0.0]
+    # O relógio do nível só começa quando todos os usuários terminaram o login
+    pronto = threading.Barrier(concurrency + 1, action=lambda: fim.__setitem__(0, time.monotonic() + duracao))
+    falhas_login: List[str] = []
+
+    def usuario(indice: int) -> None:
+        rng = random.Random(seed * 1000 + indice)
+        user = VirtualUser(base_url, f"{args.username}{indice}", args.password, args.timeout)
+        try:
+            user.login()
+        except Exception as e:
+            falhas_login.append(str(e))
+        pronto.wait()
+        if falhas_login:
+            return
+        locais = {rota: RouteStats() for rota in workload.rotas}
+        while time.monotonic() < fim[0]:
+            rota, caminho, form = workload.next(rng)
+            inicio = time.perf_counter()
+            try:
+                status, _, _ = user.request(caminho, form)
+            except Exception:
+                status = 0
+            latencia = time.perf_counter() - inicio
+            local = locais[rota]
+            local.status[status] = local.status.get(status, 0) + 1
+            if 200 <= status < 400:
+                local.latencias.append(latencia)
+            else:
+                local.erros += 1
+        with lock:
+            for rota, local in locais.items():
+                stats[rota].latencias.extend(local.latencias)
+                stats[rota].erros += local.erros
+                for codigo, n in local.status.items():
+                    stats[rota].status[codigo] = stats[rota].status.get(codigo, 0) + n
+
+    threads = [threading.Thread(target=usuario, args=(i,), daemon=True) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    pronto.wait()
+    inicio = fim[0] - duracao
+    for thread in threads:
+        thread.join()
+    if falhas_login:
+        raise RuntimeError(falhas_login[0])
+    decorrido = time.monotonic() - inicio
+
+    rotas = {rota: rota_stats.summary(decorrido) for rota, rota_stats in stats.items()}
+    todas = RouteStats(
+        latencias=[latencia for rota_stats in stats.values() for latencia in rota_stats.latencias],
+        erros=sum(rota_stats.erros for rota_stats in stats.values()),
+    )
+    return {'concorrencia': concurrency, 'segundos': round(decorrido, 3), 'total': todas.summary(decorrido), 'rotas': rotas}
+
+
+def saturation_point(niveis: List[Dict[str, object]], ganho_minimo: float = 0.1) -> Optional[int]:
+    """Primeiro nível em que a vazão cresce menos que `ganho_minimo` em relação ao anterior."""
+    for anterior, atual in zip(niveis, niveis[1:]):
+        vazao_anterior = anterior['total']['vazao_rps']
+        if vazao_anterior and atual['total']['vazao_rps'] / vazao_anterior - 1 < ganho_minimo:
+            return anterior['concorrencia']
+    return None
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def _wait_ready(base_url: str, timeout: float, processo: Optional[subprocess.Popen] = None) -> None:
+    limite = time.monotonic() + timeout
+    while time.monotonic() < limite:
+        if processo is not None and processo.poll() is not None:
+            raise RuntimeError(f"O servidor terminou ao iniciar (código {processo.returncode})")
+        try:
+            with urllib.request.urlopen(base_url + '/login', timeout=2):
+                return
+        except (urllib.error.URLError, ConnectionError, socket.timeout):
+            time.sleep(0.2)
+    raise RuntimeError(f"O servidor não respondeu em {timeout:.0f}s")
+
+def start_server(args, config: Dict[str, object]) -> Tuple[str, Callable[[], None]]:
+    """Sobe o app com a configuração informada; retorna a URL base e a função que o encerra."""
+    port = args.port or _free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    if args.server == 'werkzeug':
+        from werkzeug.serving import make_server
+        from app import create_app
+        server = make_server('127.0.0.1', port, create_app(config), threaded=True)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        _wait_ready(base_url, args.startup_timeout)
+        return base_url, server.shutdown
+
+    comando = [
+        sys.executable, '-m', 'gunicorn', '--bind', f"127.0.0.1:{port}",
+        '--workers', str(args.workers), '--threads', str(args.threads),
+        '--log-level', 'warning', f"app:create_app({config!r})",
+    ]
+    log = open(os.path.join(args.tmp, 'gunicorn.log'), 'wb')
+    processo = subprocess.Popen(comando, cwd=ROOT, stdout=log, stderr=subprocess.STDOUT)
+
+    def stop() -> None:
+        processo.terminate()
+        try:
+            processo.wait(10)
+        except subprocess.TimeoutExpired:
+            processo.kill()
+        log.close()
+
+    try:
+        _wait_ready(base_url, args.startup_timeout, processo)
+    except Exception:
+        stop()
+        print(open(log.name, encoding='utf-8', errors='replace').read()[-4000:], file=sys.stderr)
+        raise
+    return base_url, stop
+
+
+def _print_level(nivel: Dict[str, object]) -> None:
+    print(f"\nConcorrência {nivel['concorrencia']} ({nivel['segundos']:.1f}s)")
+    print(f"{'rota':<16}{'req':>8}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'erros':>8}")
+    for rota, resumo in list(nivel['rotas'].items()) + [('TOTAL', nivel['total'])]:
+        print(f"{rota:<16}{resumo['requisicoes']:>8}{resumo['vazao_rps']:>9.1f}"
+              f"{resumo.get('p50_ms', 0):>9.1f}{resumo.get('p95_ms', 0):>9.1f}{resumo.get('p99_ms', 0):>9.1f}"
+              f"{resumo['taxa_erros']:>8.1%}")
+
+def _parse_mix(valor: Optional[str]) -> Dict[str, int]:
+    if not valor:
+        return dict(DEFAULT_MIX)
+    mix = {rota: 0 for rota in DEFAULT_MIX}
+    for item in valor.split(','):
+        rota, _, peso = item.partition('=')
+        if rota not in mix:
+            raise argparse.ArgumentTypeError(f"Rota desconhecida: {rota} (use {', '.join(DEFAULT_MIX)})")
+        mix[rota] = int(peso or 1)
+    return mix
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', help='app já em execução (não gera dados nem sobe servidor)')
+    parser.add_argument('--db-url', help='banco já carregado, de onde saem os mercados dos filtros')
+    parser.add_argument('--rows', type=int, default=200_000, help='linhas do CSV sintético gerado')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--server', choices=('gunicorn', 'werkzeug'), default='gunicorn')
+    parser.add_argument('--workers', type=int, default=2, help='workers do gunicorn')
+    parser.add_argument('--threads', type=int, default=1, help='threads por worker do gunicorn')
+    parser.add_argument('--port', type=int, default=0)
+    parser.add_argument('--config', default='{}', help='JSON com chaves extras de configuração do app')
+    parser.add_argument('--concurrency', default='1,2,4,8,16', help='níveis de usuários simultâneos')
+    parser.add_argument('--duration', type=float, default=10.0, help='segundos por nível')
+    parser.add_argument('--mix', help='pesos das rotas, ex.: dashboard_post=5,rpk=5,export_pdf=1')
+    parser.add_argument('--markets', type=int, default=30, help='mercados sorteados nos filtros')
+    parser.add_argument('--username', default='carga')
+    parser.add_argument('--password', default='carga123')
+    parser.add_argument('--timeout', type=float, default=60.0)
+    parser.add_argument('--startup-timeout', type=float, default=60.0)
+    parser.add_argument('--json', help='arquivo de saída dos resultados')
+    args = parser.parse_args()
+
+    mix = _parse_mix(args.mix)
+    niveis_concorrencia = [int(valor) for valor in args.concurrency.split(',')]
+    with tempfile.TemporaryDirectory() as tmp:
+        args.tmp = tmp
+        spec = DatasetSpec(rows=args.rows, seed=args.seed)
+        db_url = args.db_url
+        if not db_url and not args.url:
+            print(f"Gerando {args.rows} linhas sintéticas e ingerindo em SQLite...")
+            db_url = build_database(spec, tmp)
+        if not db_url:
+            parser.error('--url exige --db-url para escolher os mercados dos filtros')
+
+        from app.repositories import FlightDataRepository
+        repo = FlightDataRepository(db_url)
+        monthly = repo.get_all_monthly_flight_data()
+        ranking = monthly.groupby('MERCADO', observed=True)['VOOS'].sum().sort_values(ascending=False)
+        mercados = [str(mercado) for mercado in ranking.index[:args.markets]]
+        anos = repo.get_available_years()
+        workload = Workload(mercados, min(anos), max(anos), mix)
+
+        stop = None
+        base_url = args.url
+        if not base_url:
+            config = {
+                'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.join(tmp, 'app.db')}",
+                'FLIGHT_DATA_DATABASE_URI': db_url,
+                'EXPORT_RESULT_DIR': os.path.join(tmp, 'exports'),
+                **json.loads(args.config),
+            }
+            base_url, stop = start_server(args, config)
+        results = Results('loadtest', url=base_url, server=None if args.url else args.server, workers=args.workers,
+                          threads=args.threads, linhas=None if args.url else args.rows, duracao=args.duration, mix=mix)
+        niveis = []
+        try:
+            for i, concurrency in enumerate(niveis_concorrencia):
+                nivel = run_level(base_url, workload, concurrency, args.duration, args, seed=args.seed + i)
+                niveis.append(nivel)
+                _print_level(nivel)
+                # `segundos` é o p95, a latência comparada entre commits por benchmarks.results
+                for rota, resumo in list(nivel['rotas'].items()) + [('total', nivel['total'])]:
+                    results.medicoes.append({
+                        'nome': f"http.{rota}",
+                        'parametros': {'concorrencia': concurrency},
+                        'segundos': round(resumo.get('p95_ms', 0) / 1000, 6),
+                        **resumo,
+                    })
+        finally:
+            if stop is not None:
+                stop()
+
+        saturacao = saturation_point(niveis)
+        if len(niveis) > 1:
+            print('\nVarredura: ' + ', '.join(f"{n['concorrencia']}→{n['total']['vazao_rps']:.1f} req/s" for n in niveis))
+            print(f"Saturação em {saturacao} usuário(s) simultâneo(s)" if saturacao else 'Vazão ainda crescendo no último nível')
+        results.parametros['saturacao'] = saturacao
+        results.write(args.json)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+"""
+Resultados dos benchmarks em JSON, para comparar tempos entre commits.
+
+Cada arquivo traz o commit, a máquina e uma lista de medições
+`{'nome', 'parametros', 'segundos', ...}`. A comparação casa as medições
+por nome e parâmetros e aponta as que ficaram mais lentas que o limite.
+
+Uso: python -m benchmarks.results antes.json depois.json --limite 0.1
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Results:
+    """Acumula as medições de uma execução e as grava em JSON."""
+
+    def __init__(self, suite: str, **parametros):
+        self.suite = suite
+        self.parametros = parametros
+        self.medicoes: List[Dict[str, Any]] = []
+
+    def add(self, nome: str, segundos: float, **dados) -> Dict[str, Any]:
+        medicao = {'nome': nome, 'segundos': round(segundos, 6), **dados}
+        self.medicoes.append(medicao)
+        extras = ', '.join(f"{chave}={valor}" for chave, valor in dados.items() if chave != 'parametros')
+        print(f"{nome:>32} {json.dumps(dados.get('parametros', {}), ensure_ascii=False):<40} {segundos:9.4f}s  {extras}")
+        return medicao
+
+    def measure(self, nome: str, func: Callable[[], Any], repeat: int = 1, **dados) -> Tuple[Any, Dict[str, Any]]:
+        """Executa `func` `repeat` vezes e registra o melhor tempo (e a mediana, se repetir)."""
+        tempos = []
+        resultado = None
+        for _ in range(max(repeat, 1)):
+            inicio = time.perf_counter()
+            resultado = func()
+            tempos.append(time.perf_counter() - inicio)
+        if repeat > 1:
+            dados['mediana'] = round(sorted(tempos)[len(tempos) // 2], 6)
+        return resultado, self.add(nome, min(tempos), **dados)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'suite': self.suite,
+            'commit': git_commit(),
+            'data': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'python': sys.version.split()[0],
+            'plataforma': platform.platform(),
+            'cpus': os.cpu_count(),
+            'parametros': self.parametros,
+            'medicoes': self.medicoes,
+        }
+
+    def write(self, path: Optional[str]) -> None:
+        if not path:
+            return
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, indent=2)
+        print(f"Resultados gravados em {path}")
+
+
+def _chave(medicao: Dict[str, Any]) -> str:
+    return f"{medicao['nome']} {json.dumps(medicao.get('parametros', {}), sort_keys=True, ensure_ascii=False)}"
+
+def compare(antes: Dict[str, Any], depois: Dict[str, Any], limite: float = 0.1) -> List[Dict[str, Any]]:
+    """Variação relativa de tempo de cada medição presente nos dois arquivos; `regressao` quando passar do limite."""
+    anteriores = {_chave(medicao): medicao for medicao in antes['medicoes']}
+    linhas = []
+    for medicao in depois['medicoes']:
+        anterior = anteriores.get(_chave(medicao))
+        if anterior is None or not anterior['segundos']:
+            continue
+        variacao = medicao['segundos'] / anterior['segundos'] - 1
+        linhas.append({'chave': _chave(medicao), 'antes': anterior['segundos'], 'depois': medicao['segundos'],
+                       'variacao': variacao, 'regressao': variacao > limite})
+    return linhas
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('antes')
+    parser.add_argument('depois')
+    parser.add_argument('--limite', type=float, default=0.1, help='piora relativa tolerada (0.1 = 10%%)')
+    args = parser.parse_args()
+
+    with open(args.antes, encoding='utf-8') as f:
+        antes = json.load(f)
+    with open(args.depois, encoding='utf-8') as f:
+        depois = json.load(f)
+    print(f"{antes.get('commit')} -> {depois.get('commit')}")
+    linhas = compare(antes, depois, args.limite)
+    for linha in linhas:
+        marca = 'REGRESSÃO' if linha['regressao'] else ''
+        print(f"{linha['chave']:<80} {linha['antes']:9.4f}s -> {linha['depois']:9.4f}s {linha['variacao']:+7.1%} {marca}")
+    sys.exit(1 if any(linha['regressao'] for linha in linhas) else 0)
+
+if __name__ == '__main__':
+    main()
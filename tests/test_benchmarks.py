@@ -0,0 +1,46 @@
+import pandas as pd
+from app.data_processing import read_chunks, transform_chunk
+from benchmarks.dataset import DatasetSpec, airport_codes, write_csv
+from benchmarks.loadtest import RouteStats, saturation_point
+from benchmarks.results import compare
+
+def test_dataset_is_deterministic_and_ingestible(tmp_path):
+    """Testa se a mesma semente gera o mesmo arquivo e se ele passa pelo parser da ingestão."""
+    spec = DatasetSpec(rows=5000, seed=7, ano_inicio=2022, ano_fim=2023)
+    a, b = tmp_path / 'a.csv', tmp_path / 'b.csv'
+    write_csv(str(a), spec, block_rows=1000)
+    write_csv(str(b), spec, block_rows=1000)
+    assert a.read_bytes() == b.read_bytes()
+
+    chunks = list(read_chunks(str(a), 2000))
+    assert sum(len(chunk) for chunk in chunks) == 5000
+    frame = pd.concat(transform_chunk(chunk) for chunk in chunks)
+    assert 0 < len(frame) < 5000
+    assert frame['PERIODO'].is_monotonic_increasing
+    assert set(frame['PERIODO']) <= {ano * 100 + mes for ano, mes in spec.periods}
+    assert (frame['RPK'] <= frame['ASK']).all()
+
+def test_airport_codes_extend_real_list():
+    codes = airport_codes(60)
+    assert len(codes) == len(set(codes)) == 60
+    assert codes[0] == 'SBGR' and all(code.startswith('SB') and len(code) == 4 for code in codes)
+
+def test_route_stats_percentiles_and_saturation():
+    """Testa os percentis por rota e o ponto em que a vazão para de crescer."""
+    stats = RouteStats(latencias=[i / 1000 for i in range(1, 101)], erros=5)
+    resumo = stats.summary(10.0)
+    assert resumo['requisicoes'] == 105 and resumo['vazao_rps'] == 10.0
+    assert resumo['p50_ms'] == 50.5 and resumo['p99_ms'] > resumo['p95_ms'] > resumo['p50_ms']
+    niveis = [{'concorrencia': c, 'total': {'vazao_rps': v}} for c, v in ((1, 100), (2, 190), (4, 200), (8, 205))]
+    assert saturation_point(niveis) == 2
+    assert saturation_point(niveis[:2]) is None
+
+def test_compare_flags_regressions():
+    antes = {'medicoes': [{'nome': 'a', 'parametros': {'linhas': 1}, 'segundos': 1.0},
+                          {'nome': 'b', 'parametros': {}, 'segundos': 1.0}]}
+    depois = {'medicoes': [{'nome': 'a', 'parametros': {'linhas': 1}, 'segundos': 1.5},
+                           {'nome': 'b', 'parametros': {}, 'segundos': 0.9},
+                           {'nome': 'c', 'parametros': {}, 'segundos': 1.0}]}
+    linhas = {linha['chave'].split()[0]: linha for linha in compare(antes, depois, limite=0.1)}
+    assert set(linhas) == {'a', 'b'}
+    assert linhas['a']['regressao'] and not linhas['b']['regressao']
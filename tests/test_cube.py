@@ -0,0 +1,80 @@
+import numpy as np
+import pandas as pd
+import pytest
+from flask import Flask
+from app.cube import MetricCube, MetricCubeProvider, init_metric_cube, get_metric_cube
+from app.models import FilterData
+from app.services import get_flight_data, get_flight_RPK
+
+MONTHLY = pd.DataFrame({
+    'ANO': [2023, 2023, 2023, 2024],
+    'MES': [1, 3, 2, 1],
+    'MERCADO': ['SBGRSBSV', 'SBGRSBSV', 'SBFLSBGR', 'SBFLSBGR'],
+    'RPK': [1000.0, 3000.0, 200.0, 400.0],
+    'ASK': [2000.0, 4000.0, 400.0, 500.0],
+    'VOOS': [2, 3, 1, 1],
+})
+
+def test_cube_dense_layout():
+    """Testa se o cubo cobre do primeiro ao último mês, com meses sem voos zerados."""
+    cube = MetricCube.from_monthly(MONTHLY, generation=3)
+    assert cube.markets == ['SBFLSBGR', 'SBGRSBSV']
+    assert cube.months == 13
+    assert cube.values['RPK'][1, :3].tolist() == [1000.0, 0.0, 3000.0]
+    assert cube.generation == 3
+    assert cube.nbytes == sum(a.nbytes for a in (*cube.values.values(), *cube.prefix.values(), *cube.totals_prefix.values()))
+
+def test_cube_series_skips_empty_months_and_clips_range():
+    """Testa se a série só traz meses com voos e aceita períodos fora da cobertura."""
+    cube = MetricCube.from_monthly(MONTHLY)
+    series = cube.series('SBGRSBSV', 202201, 202512)
+    assert series.labels == ['2023-01', '2023-03']
+    assert series.rpk.tolist() == [1000.0, 3000.0]
+    assert series.voos.tolist() == [2, 3]
+    assert cube.series('SBGRSBSV', 202302, 202302).labels == []
+    assert len(cube.series('SBXXSBYY', 202301, 202312)) == 0
+
+def test_cube_range_sums():
+    """Testa as somas de intervalo por mercado e no total de mercados."""
+    cube = MetricCube.from_monthly(MONTHLY)
+    assert cube.range_sum('RPK', 202301, 202312, 'SBGRSBSV') == 4000.0
+    assert cube.range_sum('ASK', 202302, 202401, 'SBFLSBGR') == 900.0
+    assert cube.range_sum('VOOS', 202301, 202312) == 6.0
+    assert cube.range_sum('RPK', 202501, 202512) == 0.0
+
+def test_empty_cube():
+    """Testa o cubo de um banco sem dados."""
+    cube = MetricCube.from_monthly(pd.DataFrame(columns=MONTHLY.columns))
+    assert cube.months == 0
+    assert len(cube.series('SBGRSBSV', 202301, 202312)) == 0
+
+def test_provider_rebuilds_on_new_generation(mocker):
+    """Testa se o cubo é montado uma vez por geração de dados."""
+    repo = mocker.Mock()
+    repo.get_data_generation.return_value = 1
+    repo.get_all_monthly_flight_data.return_value = MONTHLY
+    provider = MetricCubeProvider()
+    first = provider.get(repo)
+    assert provider.get(repo) is first
+    repo.get_data_generation.return_value = 2
+    assert provider.get(repo).generation == 2
+    assert provider.stats()['builds'] == 2
+    assert repo.get_all_monthly_flight_data.call_count == 2
+
+def test_services_read_from_cube(mocker):
+    """Testa se, com o cubo habilitado, os gráficos não consultam o agregado por filtro."""
+    repo = mocker.Mock()
+    repo.get_data_generation.return_value = 1
+    repo.get_all_monthly_flight_data.return_value = MONTHLY
+    repo.get_available_markets.return_value = ['SBFLSBGR', 'SBGRSBSV']
+    app = Flask(__name__)
+    init_metric_cube(app)
+    filter_data = FilterData(mercado='SBGRSBSV', ano_inicio=2023, ano_fim=2023, mes_inicio=1, mes_fim=12)
+    with app.app_context():
+        assert get_metric_cube(repo) is not None
+        chart = get_flight_data(filter_data, repo)
+        load_factor = get_flight_RPK(filter_data, repo)
+    assert chart['labels'] == ['2023-01', '2023-03']
+    assert chart['values'] == [1000.0, 3000.0]
+    assert load_factor['values'] == pytest.approx([0.5, 0.75])
+    repo.get_monthly_flight_data.assert_not_called()
@@ -0,0 +1,170 @@
+import os
+import pandas as pd
+import numpy as np
+import pytest
+from sqlalchemy import create_engine
+from app.data_processing import build_mercado, transform_chunk, read_chunks, process_data, main
+from app.schema import flight_metadata
+
+def _mercado_apply(chunk: pd.DataFrame) -> pd.Series:
+    """Implementação linha a linha original, usada como referência."""
+    return chunk.apply(
+        lambda row: ''.join(sorted([
+            str(row['AEROPORTO_DE_ORIGEM_SIGLA']) if pd.notna(row['AEROPORTO_DE_ORIGEM_SIGLA']) else '',
+            str(row['AEROPORTO_DE_DESTINO_SIGLA']) if pd.notna(row['AEROPORTO_DE_DESTINO_SIGLA']) else ''
+        ])),
+        axis=1
+    )
+
+def _anac_chunk() -> pd.DataFrame:
+    return pd.DataFrame({
+        'EMPRESA_SIGLA': ['GLO', 'GLO', 'AZU', 'GLO', 'GLO', 'GLO'],
+        'GRUPO_DE_VOO': ['REGULAR', 'REGULAR', 'REGULAR', 'IMPRODUTIVO', 'REGULAR', 'REGULAR'],
+        'NATUREZA': ['DOMÉSTICA', 'DOMÉSTICA', 'DOMÉSTICA', 'DOMÉSTICA', 'INTERNACIONAL', 'DOMÉSTICA'],
+        'ANO': [2023, 2023, 2023, 2023, 2023, 2024],
+        'MES': [1, 2, 1, 1, 1, 3],
+        'AEROPORTO_DE_ORIGEM_SIGLA': ['SBSV', 'SBGR', 'SBGR', 'SBGR', 'SBGR', np.nan],
+        'AEROPORTO_DE_DESTINO_SIGLA': ['SBGR', 'SBSV', 'SBSV', 'SBSV', 'KMIA', 'SBFL'],
+        'RPK': [1000.0, 2000.0, 10.0, 20.0, 30.0, 1500.0],
+        'ASK': [1200.0, 2500.0, 11.0, 21.0, 31.0, 1800.0],
+    })
+
+def test_build_mercado_matches_apply():
+    """Testa se o MERCADO vetorizado é idêntico ao montado com apply, inclusive com siglas ausentes."""
+    chunk = _anac_chunk()
+    expected = _mercado_apply(chunk)
+    result = build_mercado(chunk['AEROPORTO_DE_ORIGEM_SIGLA'], chunk['AEROPORTO_DE_DESTINO_SIGLA'])
+    assert result.tolist() == expected.tolist()
+    assert result.index.equals(expected.index)
+
+def test_transform_chunk_filters_and_columns():
+    """Testa os filtros do case e as colunas finais do chunk."""
+    result = transform_chunk(_anac_chunk())
+    assert list(result.columns) == ['ANO', 'MES', 'MERCADO', 'RPK', 'ASK', 'PERIODO']
+    assert result['PERIODO'].tolist() == [202301, 202302, 202403]
+    assert result['MERCADO'].tolist() == ['SBGRSBSV', 'SBGRSBSV', 'SBFL']
+    assert result['ANO'].tolist() == [2023, 2023, 2024]
+    assert result['RPK'].tolist() == [1000.0, 2000.0, 1500.0]
+
+def _write_anac_csv(path, chunk: pd.DataFrame) -> str:
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('ATUALIZADO EM: 2024-01-01\n')
+        chunk.to_csv(f, sep=';', index=False)
+    return str(path)
+
+def test_read_chunks_typed_and_pruned(tmp_path):
+    """Testa se a leitura usa só as colunas do case, com categorias nas siglas."""
+    chunk = _anac_chunk()
+    chunk['OUTRA_COLUNA'] = 'x'
+    csv_path = _write_anac_csv(tmp_path / 'anac.csv', chunk)
+    chunks = list(read_chunks(csv_path, chunksize=4))
+    assert len(chunks) == 2
+    assert 'OUTRA_COLUNA' not in chunks[0].columns
+    assert isinstance(chunks[0]['AEROPORTO_DE_ORIGEM_SIGLA'].dtype, pd.CategoricalDtype)
+    result = pd.concat([transform_chunk(c) for c in chunks])
+    assert result['MERCADO'].tolist() == ['SBGRSBSV', 'SBGRSBSV', 'SBFL']
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_process_data_pipeline(tmp_path, workers):
+    """Testa a ingestão completa em SQLite, serial e com processos de transformação."""
+    csv_path = _write_anac_csv(tmp_path / 'anac.csv', pd.concat([_anac_chunk()] * 5, ignore_index=True))
+    db_url = f"sqlite:///{tmp_path / 'voos.db'}"
+    total = process_data(csv_path, chunksize=4, db_url=db_url, workers=workers, batch_size=4)
+    assert total == 15
+    stored = pd.read_sql('SELECT * FROM flight_data', create_engine(db_url))
+    assert list(stored.columns) == ['ANO', 'MES', 'MERCADO', 'RPK', 'ASK', 'PERIODO']
+    assert stored['MERCADO'].tolist() == ['SBGRSBSV', 'SBGRSBSV', 'SBFL'] * 5
+    catalog = pd.read_sql('SELECT * FROM flight_catalog', create_engine(db_url))
+    assert len(catalog) == 3
+
+def test_cli_options(tmp_path):
+    """Testa o ponto de entrada de linha de comando com --db-url, --workers e --chunksize."""
+    csv_path = _write_anac_csv(tmp_path / 'anac.csv', _anac_chunk())
+    db_url = f"sqlite:///{tmp_path / 'voos.db'}"
+    main([csv_path, '--db-url', db_url, '--workers', '1', '--chunksize', '2'])
+    stored = pd.read_sql('SELECT * FROM flight_data', create_engine(db_url))
+    assert len(stored) == 3
+
+def test_incremental_ingestion(tmp_path):
+    """Testa se só os períodos novos ou alterados são recarregados e a geração avança."""
+    db_url = f"sqlite:///{tmp_path / 'voos.db'}"
+    engine = create_engine(db_url)
+    base = _anac_chunk()
+    csv_path = _write_anac_csv(tmp_path / 'anac.csv', base)
+    assert process_data(csv_path, db_url=db_url) == 3
+    assert process_data(csv_path, db_url=db_url) == 0
+
+    novo_mes = base.iloc[[0]].assign(MES=5, RPK=700.0)
+    csv_path = _write_anac_csv(tmp_path / 'anac_v2.csv', pd.concat([base, novo_mes], ignore_index=True))
+    assert process_data(csv_path, db_url=db_url) == 1
+
+    stored = pd.read_sql('SELECT * FROM flight_data ORDER BY "ANO", "MES"', engine)
+    assert stored['RPK'].tolist() == [1000.0, 2000.0, 700.0, 1500.0]
+    manifest = pd.read_sql('SELECT * FROM ingest_manifest ORDER BY id', engine)
+    assert manifest['generation'].tolist() == [1, 2]
+    assert manifest['periods_loaded'].tolist() == [3, 1]
+    catalog = pd.read_sql('SELECT * FROM flight_catalog', engine)
+    assert len(catalog) == 4
+    monthly = pd.read_sql('SELECT * FROM flight_monthly WHERE "MES" = 5', engine)
+    assert monthly[['MERCADO', 'RPK', 'VOOS']].values.tolist() == [['SBGRSBSV', 700.0, 1]]
+    rankings = pd.read_sql('SELECT * FROM flight_rankings WHERE "PERIODO" = 202305 ORDER BY "METRICA"', engine)
+    assert rankings[['METRICA', 'POSICAO', 'MERCADO']].values.tolist() == [
+        ['ASK', 1, 'SBGRSBSV'], ['LOAD_FACTOR', 1, 'SBGRSBSV'], ['RPK', 1, 'SBGRSBSV'], ['VOOS', 1, 'SBGRSBSV'],
+    ]
+
+def test_full_reload_drops_missing_periods(tmp_path):
+    """Testa se --full recarrega tudo e remove períodos ausentes do arquivo."""
+    db_url = f"sqlite:///{tmp_path / 'voos.db'}"
+    process_data(_write_anac_csv(tmp_path / 'anac.csv', _anac_chunk()), db_url=db_url)
+    parcial = _anac_chunk().iloc[:2]
+    assert process_data(_write_anac_csv(tmp_path / 'parcial.csv', parcial), db_url=db_url, full=True) == 2
+    stored = pd.read_sql('SELECT * FROM flight_data', create_engine(db_url))
+    assert len(stored) == 2
+
+def test_digest_pass_skips_transform_and_full_reads_once(tmp_path, mocker):
+    """Testa se o resumo não monta o MERCADO, se --full lê o arquivo uma vez só e se os resumos das duas passadas batem."""
+    import app.data_processing as data_processing
+    db_url = f"sqlite:///{tmp_path / 'voos.db'}"
+    base = _anac_chunk()
+    read_chunks_spy = mocker.spy(data_processing, 'read_chunks')
+    build_mercado_spy = mocker.spy(data_processing, 'build_mercado')
+    assert process_data(_write_anac_csv(tmp_path / 'anac.csv', base), db_url=db_url, full=True) == 3
+    assert (read_chunks_spy.call_count, build_mercado_spy.call_count) == (1, 1)
+
+    novo_mes = base.iloc[[0]].assign(MES=5, RPK=700.0)
+    csv_path = _write_anac_csv(tmp_path / 'anac_v2.csv', pd.concat([base, novo_mes], ignore_index=True))
+    read_chunks_spy.reset_mock()
+    build_mercado_spy.reset_mock()
+    assert process_data(csv_path, db_url=db_url) == 1
+    assert (read_chunks_spy.call_count, build_mercado_spy.call_count) == (2, 1)
+
+@pytest.mark.skipif(not os.environ.get('TEST_POSTGRES_URL'), reason="TEST_POSTGRES_URL não configurada")
+def test_process_data_postgresql_copy(tmp_path):
+    """Testa a ingestão no PostgreSQL, com o escritor usando COPY."""
+    db_url = os.environ['TEST_POSTGRES_URL']
+    engine = create_engine(db_url)
+    flight_metadata.drop_all(engine)
+    try:
+        csv_path = _write_anac_csv(tmp_path / 'anac.csv', _anac_chunk())
+        assert process_data(csv_path, db_url=db_url, workers=2) == 3
+        stored = pd.read_sql('SELECT * FROM flight_data ORDER BY "PERIODO"', engine)
+        assert stored['MERCADO'].tolist() == ['SBGRSBSV', 'SBGRSBSV', 'SBFL']
+        monthly = pd.read_sql('SELECT * FROM flight_monthly', engine)
+        assert len(monthly) == 3
+        rankings = pd.read_sql('SELECT * FROM flight_rankings WHERE "METRICA" = \'RPK\' ORDER BY "PERIODO"', engine)
+        assert rankings[['PERIODO', 'POSICAO']].values.tolist() == [[202301, 1], [202302, 1], [202403, 1]]
+    finally:
+        flight_metadata.drop_all(engine)
+        engine.dispose()
+
+def test_migrates_legacy_table_without_periodo(tmp_path):
+    """Testa se um flight_data antigo ganha a coluna PERIODO preenchida."""
+    db_url = f"sqlite:///{tmp_path / 'voos.db'}"
+    engine = create_engine(db_url)
+    pd.DataFrame({'ANO': [2022], 'MES': [7], 'MERCADO': ['SBGRSBSV'], 'RPK': [10.0], 'ASK': [20.0]}) \
+        .to_sql('flight_data', engine, index=False)
+    process_data(_write_anac_csv(tmp_path / 'anac.csv', _anac_chunk()), db_url=db_url)
+    stored = pd.read_sql('SELECT * FROM flight_data ORDER BY "PERIODO"', engine)
+    assert stored['PERIODO'].tolist() == [202207, 202301, 202302, 202403]
+    monthly = pd.read_sql('SELECT * FROM flight_monthly', engine)
+    assert len(monthly) == 4
@@ -0,0 +1,65 @@
+import os
+import threading
+import time
+import pytest
+from app.database import EngineRegistry, pool_options_from_config
+
+@pytest.fixture
+def registry(tmp_path):
+    """Cria um registro de engines isolado."""
+    registry = EngineRegistry(wait_threshold=0.0)
+    yield registry
+    registry.dispose_all()
+
+def test_get_engine_reuses_engine(registry, tmp_path):
+    """Testa se a mesma URL e opções retornam a mesma engine."""
+    url = f"sqlite:///{tmp_path / 'voos.db'}"
+    options = pool_options_from_config({'DB_POOL_SIZE': 2, 'DB_MAX_OVERFLOW': 1})
+    assert registry.get_engine(url, **options) is registry.get_engine(url, **options)
+
+def test_pool_stats_counts_checkouts_and_waits(registry, tmp_path):
+    """Testa se os contadores do pool registram checkouts e só contam como espera a retirada com o pool cheio."""
+    url = f"sqlite:///{tmp_path / 'voos.db'}"
+    engine = registry.get_engine(url, pool_size=1, max_overflow=0)
+    for _ in range(3):
+        with registry.connect(engine):
+            pass
+    stats = registry.stats()[url]
+    assert stats['checkouts'] == 3
+    assert stats['checkins'] == 3
+    assert stats['connects'] == 1
+    assert stats['waits'] == 0
+    assert (stats['size'], stats['capacity']) == (1, 1)
+
+    ocupada = threading.Event()
+    def segura():
+        with registry.connect(engine):
+            ocupada.set()
+            time.sleep(0.1)
+    thread = threading.Thread(target=segura)
+    thread.start()
+    ocupada.wait()
+    with registry.connect(engine):
+        pass
+    thread.join()
+    stats = registry.stats()[url]
+    assert stats['waits'] == 1
+    assert stats['wait_seconds_max'] >= 0.05
+
+def test_fork_replaces_pools_and_keeps_engines(registry, tmp_path):
+    """Testa se, no processo filho, as engines herdadas ganham um pool novo e continuam registradas."""
+    url = f"sqlite:///{tmp_path / 'voos.db'}"
+    engine = registry.get_engine(url, pool_size=1, max_overflow=0)
+    with registry.connect(engine):
+        pass
+    pool = engine.pool
+    leitura, escrita = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        ok = engine.pool is not pool and registry.get_engine(url, pool_size=1, max_overflow=0) is engine
+        ok = ok and registry.stats()[url]['checkouts'] == 0
+        os.write(escrita, b'1' if ok else b'0')
+        os._exit(0)
+    os.waitpid(pid, 0)
+    assert os.read(leitura, 1) == b'1'
+    assert engine.pool is pool
@@ -0,0 +1,88 @@
+import json
+import os
+import time
+from app.exports import ExportJob, ExportManager, DONE, FAILED, PENDING, RUNNING
+from dataclasses import asdict
+
+def _write_job(manager: ExportManager, job: ExportJob, content: bytes = b'x') -> None:
+    job.arquivo = f'{job.id}.csv'
+    with open(os.path.join(manager.result_dir, job.arquivo), 'wb') as f:
+        f.write(content)
+    with open(manager._state_path(job.id), 'w', encoding='utf-8') as f:
+        json.dump(asdict(job), f)
+
+def test_cleanup_removes_expired_results(tmp_path):
+    """Testa se a limpeza remove só os jobs e arquivos com TTL vencido."""
+    manager = ExportManager(str(tmp_path), ttl=60)
+    filtro = {'mercado': 'SBGRSBSV', 'ano_inicio': 2023, 'ano_fim': 2023, 'mes_inicio': 1, 'mes_fim': 12}
+    old = ExportJob(id='a' * 32, formato='csv', modo='mensal', filtro=filtro, status=DONE, concluido_em=time.time() - 120)
+    recent = ExportJob(id='b' * 32, formato='csv', modo='mensal', filtro=filtro, status=DONE, concluido_em=time.time())
+    _write_job(manager, old)
+    _write_job(manager, recent)
+    os.utime(os.path.join(manager.result_dir, old.arquivo), (time.time() - 120, time.time() - 120))
+
+    assert manager.get(old.id) is None
+    assert manager.cleanup(force=True) == 2
+    assert sorted(os.listdir(tmp_path)) == [f'{recent.id}.csv', f'{recent.id}.json']
+    assert manager.get(recent.id).status == DONE
+    manager.shutdown()
+
+def test_stale_running_job_is_expired(tmp_path):
+    """Testa se um job sem progresso além de `stale_after` deixa de bloquear novos pedidos."""
+    manager = ExportManager(str(tmp_path), stale_after=30)
+    filtro = {'mercado': 'SBGRSBSV', 'ano_inicio': 2023, 'ano_fim': 2023, 'mes_inicio': 1, 'mes_fim': 12}
+    job = ExportJob(id='c' * 32, formato='csv', modo='voos', filtro=filtro, status=RUNNING, atualizado_em=time.time() - 60)
+    _write_job(manager, job)
+    assert manager.get(job.id) is None
+    manager.shutdown()
+
+def test_claim_never_takes_unreadable_or_live_state(tmp_path):
+    """Testa se um estado parcial ou de um job vivo bloqueia o id e só um job expirado ou com erro é substituído."""
+    manager = ExportManager(str(tmp_path), stale_after=30)
+    filtro = {'mercado': 'SBGRSBSV', 'ano_inicio': 2023, 'ano_fim': 2023, 'mes_inicio': 1, 'mes_fim': 12}
+    job = ExportJob(id='d' * 32, formato='csv', modo='voos', filtro=filtro)
+    with open(manager._state_path(job.id), 'w', encoding='utf-8') as f:
+        f.write('{"id": "dddd')
+    assert not manager._claim(job)
+
+    _write_job(manager, ExportJob(id=job.id, formato='csv', modo='voos', filtro=filtro, status=PENDING))
+    assert not manager._claim(job)
+
+    _write_job(manager, ExportJob(id=job.id, formato='csv', modo='voos', filtro=filtro, status=PENDING,
+                                  atualizado_em=time.time() - 60))
+    assert manager._claim(job)
+    assert not manager._claim(job)
+
+    _write_job(manager, ExportJob(id=job.id, formato='csv', modo='voos', filtro=filtro, status=FAILED))
+    assert manager._claim(job)
+    assert manager.get(job.id).status == PENDING
+    assert sorted(os.listdir(tmp_path)) == [f'{job.id}.csv', f'{job.id}.json']
+    manager.shutdown()
+
+def test_discard_keeps_state_replaced_after_read(tmp_path):
+    """Testa se o descarte devolve o estado quando outro worker o regravou depois da leitura."""
+    manager = ExportManager(str(tmp_path))
+    filtro = {'mercado': 'SBGRSBSV', 'ano_inicio': 2023, 'ano_fim': 2023, 'mes_inicio': 1, 'mes_fim': 12}
+    job = ExportJob(id='e' * 32, formato='csv', modo='mensal', filtro=filtro, status=FAILED)
+    manager._save(job)
+    _, inode = manager._load(job.id)
+    job.status = RUNNING
+    manager._save(job)
+    assert not manager._discard(job.id, inode)
+    assert manager.get(job.id).status == RUNNING
+    manager.shutdown()
+
+def test_heartbeat_keeps_queued_job_alive(tmp_path):
+    """Testa se o worker dono renova o estado dos jobs ainda na fila."""
+    manager = ExportManager(str(tmp_path), stale_after=0.3)
+    filtro = {'mercado': 'SBGRSBSV', 'ano_inicio': 2023, 'ano_fim': 2023, 'mes_inicio': 1, 'mes_fim': 12}
+    job = ExportJob(id='f' * 32, formato='csv', modo='mensal', filtro=filtro)
+    assert manager._claim(job)
+    manager._active[job.id] = job
+    manager._start_heartbeat()
+    time.sleep(0.6)
+    assert manager.get(job.id) is not None
+    manager._active.clear()
+    time.sleep(0.6)
+    assert manager.get(job.id) is None
+    manager.shutdown()
@@ -0,0 +1,89 @@
+import time
+import pytest
+from sqlalchemy import text
+from app import create_app, db
+from app.history import HistoryRecorder
+from app.models import FilterData, User, UserFilter
+
+@pytest.fixture
+def app(tmp_path):
+    app = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'app.db'}",
+        'EXPORT_RESULT_DIR': str(tmp_path / 'exports'),
+    })
+    with app.app_context():
+        db.session.add(User(username='testuser', password='testpass'))
+        db.session.commit()
+    yield app
+    app.extensions['history_recorder'].shutdown()
+
+def _filtro(mercado: str = 'SBGRSBSV', ano: int = 2023) -> FilterData:
+    return FilterData(mercado=mercado, ano_inicio=ano, ano_fim=ano)
+
+def _stored(app):
+    with app.app_context():
+        return [(f.user_id, f.mercado, f.ano_inicio) for f in UserFilter.query.order_by(UserFilter.id).all()]
+
+def test_recorder_batches_and_deduplicates(app):
+    """Testa se filtros repetidos em sequência são gravados uma vez e o lote sai numa gravação."""
+    recorder = HistoryRecorder(app, flush_interval=60)
+    recorder._ensure_thread = lambda: None
+    assert recorder.record(1, _filtro())
+    assert not recorder.record(1, _filtro())
+    assert recorder.record(2, _filtro())
+    assert recorder.record(1, _filtro(ano=2024))
+    assert recorder.record(1, _filtro())
+    assert recorder.stats()['depth'] == 4
+    assert recorder.flush() == 4
+    assert _stored(app) == [(1, 'SBGRSBSV', 2023), (2, 'SBGRSBSV', 2023), (1, 'SBGRSBSV', 2024), (1, 'SBGRSBSV', 2023)]
+    stats = recorder.stats()
+    assert stats['depth'] == 0 and stats['deduplicated'] == 1 and stats['written'] == 4 and stats['flushes'] == 1
+
+def test_recorder_bounded_queue_drops(app):
+    """Testa se a fila limitada descarta eventos em vez de bloquear a requisição."""
+    recorder = HistoryRecorder(app, max_queue=1, flush_interval=60)
+    recorder._ensure_thread = lambda: None
+    assert recorder.record(1, _filtro())
+    assert not recorder.record(2, _filtro())
+    assert recorder.stats()['dropped'] == 1
+
+def test_background_thread_flushes_by_interval_and_shutdown_drains(app):
+    """Testa a gravação pela thread após o intervalo e o esvaziamento da fila no encerramento."""
+    recorder = HistoryRecorder(app, flush_interval=0.05)
+    recorder.record(1, _filtro())
+    deadline = time.monotonic() + 5
+    while recorder.stats()['written'] < 1 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert _stored(app) == [(1, 'SBGRSBSV', 2023)]
+
+    recorder.shutdown()
+    recorder._ensure_thread = lambda: None
+    recorder.record(1, _filtro(ano=2024))
+    recorder.shutdown()
+    assert len(_stored(app)) == 2
+
+def test_dashboard_post_records_history_in_background(app, mocker):
+    """Testa se o POST do dashboard enfileira o filtro em vez de gravar na requisição."""
+    with app.app_context():
+        user = User.query.first()
+    mocker.patch('flask_login.utils._get_user', return_value=user)
+    mocker.patch('app.routes.get_flight_data', return_value={'labels': [], 'values': [], 'single_point': False, 'message': None})
+    mocker.patch('app.routes._data_validators', return_value=('abc', None))
+    form = {'mercado': 'SBGRSBSV', 'ano_inicio': '2023', 'ano_fim': '2023'}
+    with app.test_client() as client:
+        assert client.post('/dashboard', data=form).status_code == 200
+        assert client.post('/dashboard', data=form).status_code == 200
+        recorder = app.extensions['history_recorder']
+        recorder.flush()
+        assert _stored(app) == [(user.id, 'SBGRSBSV', 2023)]
+        assert client.get('/api/history-stats').get_json()['deduplicated'] == 1
+
+def test_recent_history_uses_user_timestamp_index(app):
+    """Testa se a leitura do histórico recente usa o índice (user_id, timestamp DESC)."""
+    with app.app_context():
+        query = UserFilter.query.filter_by(user_id=1).order_by(UserFilter.timestamp.desc()).limit(5)
+        compiled = str(query.statement.compile(db.engine, compile_kwargs={'literal_binds': True}))
+        plan = ' '.join(str(row[-1]) for row in db.session.execute(text('EXPLAIN QUERY PLAN ' + compiled)))
+    assert 'ix_user_filter_user_id_timestamp' in plan
+    assert 'TEMP B-TREE' not in plan
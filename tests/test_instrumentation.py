@@ -0,0 +1,129 @@
+import re
+import time
+import pytest
+from sqlalchemy import create_engine, text
+from app import create_app, db, routes
+from app.instrumentation import Counter, Histogram, install_sql_listeners, metrics, server_timing, timed
+from app.models import User
+
+@pytest.fixture
+def app(tmp_path):
+    app = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'app.db'}",
+        'EXPORT_RESULT_DIR': str(tmp_path / 'exports'),
+        'METRICS_TOKEN': 'segredo',
+    })
+    with app.app_context():
+        db.session.add(User(username='testuser', password='testpass'))
+        db.session.commit()
+    yield app
+    app.extensions['history_recorder'].shutdown()
+
+def test_histogram_exposition_format():
+    """Testa os buckets cumulativos, a soma e a contagem no formato do Prometheus."""
+    histogram = Histogram('teste_seconds', 'Teste', ('rota',), buckets=(0.1, 1.0))
+    histogram.observe(0.05, '/a')
+    histogram.observe(0.5, '/a')
+    histogram.observe(5, '/a')
+    linhas = list(histogram.samples())
+    assert linhas == [
+        'teste_seconds_bucket{rota="/a",le="0.1"} 1.0',
+        'teste_seconds_bucket{rota="/a",le="1.0"} 2.0',
+        'teste_seconds_bucket{rota="/a",le="+Inf"} 3.0',
+        'teste_seconds_sum{rota="/a"} 5.55',
+        'teste_seconds_count{rota="/a"} 3.0',
+    ]
+    counter = Counter('teste_total', 'Teste', ('op',))
+    counter.inc(2, 'SELECT')
+    assert list(counter.samples()) == ['teste_total{op="SELECT"} 2']
+
+def test_sql_listeners_time_queries(tmp_path):
+    """Testa se as consultas de qualquer engine entram no histograma por operação."""
+    install_sql_listeners()
+    engine = create_engine(f"sqlite:///{tmp_path / 'q.db'}")
+    antes_select = metrics.queries.count('SELECT')
+    antes_insert = metrics.queries.count('INSERT')
+    with engine.begin() as conn:
+        conn.execute(text('CREATE TABLE t (x INTEGER)'))
+        conn.execute(text('INSERT INTO t VALUES (1), (2)'))
+        conn.execute(text('SELECT x FROM t')).fetchall()
+    assert metrics.queries.count('SELECT') == antes_select + 1
+    assert metrics.queries.count('INSERT') == antes_insert + 1
+    engine.dispose()
+
+def test_timed_phase_excludes_sql(tmp_path):
+    """Testa se o tempo de SQL dentro de uma etapa não é contado na etapa."""
+    install_sql_listeners()
+    engine = create_engine(f"sqlite:///{tmp_path / 'q.db'}")
+    antes = metrics.phases.count('teste')
+    with timed('teste'):
+        with engine.connect() as conn:
+            conn.execute(text('SELECT 1')).fetchall()
+    assert metrics.phases.count('teste') == antes + 1
+    engine.dispose()
+
+def test_server_timing_value():
+    valor = server_timing({'db': 0.012, 'db_queries': 3, 'render': 0.1}, 0.2)
+    assert valor == 'db;dur=12.00;desc="3 consulta(s)", render;dur=100.00, total;dur=200.00'
+
+def test_metrics_endpoint_and_server_timing_header(app, mocker):
+    """Testa o /metrics com a latência da rota e o cabeçalho Server-Timing nas respostas."""
+    with app.app_context():
+        user = User.query.first()
+    mocker.patch('flask_login.utils._get_user', return_value=user)
+
+    def render_pdf(filter_data, repo):
+        with timed('render'):
+            time.sleep(0.01)
+        return None
+
+    mocker.patch('app.routes.get_flight_data_pdf', side_effect=render_pdf)
+    mocker.patch('app.routes._data_validators', return_value=('abc', None))
+    with app.test_client() as client:
+        response = client.post('/export_pdf', data={'mercado': 'SBGRSBSV', 'ano_inicio': '2023', 'ano_fim': '2023'})
+        timing = response.headers['Server-Timing']
+        assert re.search(r'render;dur=\d+\.\d+', timing) and 'total;dur=' in timing
+
+        response = client.get('/metrics', headers={'Authorization': 'Bearer segredo'})
+        assert response.status_code == 200
+        assert response.mimetype == 'text/plain'
+        corpo = response.get_data(as_text=True)
+    assert 'http_request_duration_seconds_count{method="POST",route="/export_pdf",status="' in corpo
+    assert 'app_phase_duration_seconds_count{phase="render"}' in corpo
+    assert '# TYPE result_cache_hits_total counter' in corpo
+    assert 'db_pool_checkouts_total{engine="sqlite:///' in corpo
+
+def test_metrics_requires_token_or_allowed_ip(app, tmp_path, mocker):
+    """Testa se o /metrics recusa pedidos sem o token antes de coletar e fica fechado quando nada está configurado."""
+    render_metrics = mocker.spy(routes, 'render_metrics')
+    with app.test_client() as client:
+        response = client.get('/metrics')
+        assert response.status_code == 401
+        assert response.headers['WWW-Authenticate'] == 'Bearer'
+        assert client.get('/metrics', headers={'Authorization': 'Bearer outro'}).status_code == 401
+    assert render_metrics.call_count == 0
+
+    fechado = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'fechado.db'}",
+        'EXPORT_RESULT_DIR': str(tmp_path / 'exports'),
+        'HISTORY_WRITE_BEHIND': False,
+    })
+    with fechado.test_client() as client:
+        assert client.get('/metrics', headers={'Authorization': 'Bearer '}).status_code == 401
+    fechado.config['METRICS_ALLOWED_IPS'] = ['127.0.0.1']
+    with fechado.test_client() as client:
+        assert client.get('/metrics').status_code == 200
+
+def test_metrics_disabled(tmp_path):
+    app = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'app.db'}",
+        'EXPORT_RESULT_DIR': str(tmp_path / 'exports'),
+        'METRICS_ENABLED': False,
+        'HISTORY_WRITE_BEHIND': False,
+    })
+    with app.test_client() as client:
+        assert client.get('/metrics').status_code == 404
+        assert 'Server-Timing' not in client.get('/login').headers
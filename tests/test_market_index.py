@@ -0,0 +1,68 @@
+from datetime import datetime, timedelta
+from app import create_app, db
+from app.catalog import FlightCatalog
+from app.market_index import MarketIndex
+from app.models import User, UserFilter
+
+MERCADOS = ['SBFLSBGR', 'SBGRSBSV', 'SBGRSBRJ', 'SBBRSBSP', 'SBCFSBGR', 'SBRFSBSV']
+
+def test_prefix_and_airport_lookup():
+    """Testa se o prefixo do mercado e o de qualquer uma das pontas encontram os mercados."""
+    index = MarketIndex(MERCADOS)
+    assert index.matches('sbgr') == ['SBCFSBGR', 'SBFLSBGR', 'SBGRSBRJ', 'SBGRSBSV']
+    assert index.matches('SBGRSB') == ['SBGRSBRJ', 'SBGRSBSV']
+    assert index.matches('SBS') == ['SBBRSBSP', 'SBGRSBSV', 'SBRFSBSV']
+    assert index.matches('SBGRSBSV') == ['SBGRSBSV']
+    assert index.matches('XX') == []
+    assert index.airport_markets('SBSV') == ['SBGRSBSV', 'SBRFSBSV']
+    assert len(index.matches('')) == len(MERCADOS)
+
+def test_search_ranks_prefix_then_popularity():
+    index = MarketIndex(MERCADOS)
+    data = index.search('SBGR', limit=3, popularity={'SBCFSBGR': 10, 'SBGRSBSV': 2})
+    assert data['total'] == 4
+    assert [item['mercado'] for item in data['mercados']] == ['SBGRSBSV', 'SBGRSBRJ', 'SBCFSBGR']
+    assert data['mercados'][0] == {'mercado': 'SBGRSBSV', 'aeroportos': ['SBGR', 'SBSV'], 'consultas': 2}
+    assert [item['mercado'] for item in index.search('', limit=2, popularity={'SBRFSBSV': 1})['mercados']] == ['SBRFSBSV', 'SBBRSBSP']
+
+def test_catalog_builds_index_once():
+    catalog = FlightCatalog([(mercado, 2023, 1) for mercado in MERCADOS])
+    assert catalog.market_index is catalog.market_index
+    assert catalog.market_index.markets == sorted(MERCADOS)
+
+def test_markets_endpoint_uses_history_popularity(tmp_path, mocker):
+    """Testa o /api/markets com o limite, a ordem pelos filtros recentes e o dashboard sem a lista de mercados."""
+    app = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'app.db'}",
+        'EXPORT_RESULT_DIR': str(tmp_path / 'exports'),
+        'HISTORY_WRITE_BEHIND': False,
+        'MARKET_SEARCH_MAX_LIMIT': 2,
+    })
+    with app.app_context():
+        user = User(username='testuser', password='testpass')
+        db.session.add(user)
+        db.session.flush()
+        antigo = datetime.utcnow() - timedelta(days=365)
+        db.session.add_all(
+            [UserFilter(user_id=user.id, mercado='SBGRSBSV', ano_inicio=2023, ano_fim=2023, mes_inicio=1, mes_fim=12)]
+            + [UserFilter(user_id=user.id, mercado='SBGRSBRJ', ano_inicio=2023, ano_fim=2023, mes_inicio=1, mes_fim=12,
+                          timestamp=antigo) for _ in range(3)]
+        )
+        db.session.commit()
+        user = User.query.first()
+    mocker.patch('flask_login.utils._get_user', return_value=user)
+    catalog = FlightCatalog([(mercado, 2023, 1) for mercado in MERCADOS])
+    mocker.patch('app.repositories.FlightDataRepository.get_catalog', return_value=catalog)
+
+    with app.test_client() as client:
+        response = client.get('/api/markets?q=sbgr&limit=10')
+        assert response.status_code == 200
+        assert 'max-age=60' in response.headers['Cache-Control']
+        data = response.get_json()
+        assert data['limit'] == 2 and data['total'] == 4
+        assert [item['mercado'] for item in data['mercados']] == ['SBGRSBSV', 'SBGRSBRJ']
+        assert client.get('/api/markets?limit=x').status_code == 400
+
+        html = client.get('/dashboard').get_data(as_text=True)
+    assert 'id="mercadoOptions"' in html and 'SBCFSBGR' not in html
@@ -0,0 +1,111 @@
+import os
+import pstats
+import threading
+import time
+import pytest
+from app import create_app, db
+from app.models import User
+from app.profiling import ProfileStore, StackSampler
+
+def _make_app(tmp_path, **config):
+    app = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'app.db'}",
+        'EXPORT_RESULT_DIR': str(tmp_path / 'exports'),
+        'HISTORY_WRITE_BEHIND': False,
+        'PROFILING_ENABLED': True,
+        'PROFILING_DIR': str(tmp_path / 'profiles'),
+        'PROFILING_TOKEN': 'segredo',
+        'PROFILING_ADMINS': ['admin'],
+        **config,
+    })
+    with app.app_context():
+        db.session.add_all([User(username='admin', password='testpass'), User(username='comum', password='testpass')])
+        db.session.commit()
+    return app
+
+def _login_as(app, mocker, username):
+    with app.app_context():
+        user = User.query.filter_by(username=username).first()
+    mocker.patch('flask_login.utils._get_user', return_value=user)
+
+def test_stack_sampler_collapses_stacks():
+    """Testa se o amostrador conta as pilhas da thread alvo no formato colapsado."""
+    def lenta():
+        time.sleep(0.1)
+
+    sampler = StackSampler(threading.get_ident(), interval=0.005)
+    sampler.start()
+    lenta()
+    sampler.stop()
+    assert sampler.samples > 0
+    linhas = sampler.collapsed().splitlines()
+    assert any('lenta (test_profiling.py' in linha for linha in linhas)
+    assert all(linha.rsplit(' ', 1)[1].isdigit() for linha in linhas)
+
+def test_store_is_bounded_ring_buffer(tmp_path):
+    store = ProfileStore(str(tmp_path), max_files=3)
+    for i in range(5):
+        store.save(f"p{i}.folded", b'a 1\n')
+        os.utime(tmp_path / f"p{i}.folded", ns=(i * 10**9, i * 10**9))
+    store._trim()
+    assert [item['nome'] for item in store.list()] == ['p4.folded', 'p3.folded', 'p2.folded']
+    assert store.path('../app.db') is None and store.path('p0.folded') is None
+    assert store.path('p4.folded') is not None
+
+def test_header_with_token_profiles_request(tmp_path):
+    """Testa se o cabeçalho com o token gera um perfil e devolve o nome do arquivo."""
+    app = _make_app(tmp_path)
+    with app.test_client() as client:
+        assert 'X-Profile-Id' not in client.get('/login').headers
+        assert 'X-Profile-Id' not in client.get('/login', headers={'X-Profile': 'errado'}).headers
+        response = client.get('/login', headers={'X-Profile': 'segredo'})
+    name = response.headers['X-Profile-Id']
+    assert name.endswith('.folded') and '-GET-login-' in name
+    assert os.path.isfile(tmp_path / 'profiles' / name)
+
+def test_cprofile_mode_and_sample_rate(tmp_path):
+    """Testa o modo cProfile com amostragem de todas as requisições."""
+    app = _make_app(tmp_path, PROFILING_MODE='cprofile', PROFILING_SAMPLE_RATE=1.0)
+    with app.test_client() as client:
+        name = client.get('/login').headers['X-Profile-Id']
+    assert name.endswith('.prof')
+    stats = pstats.Stats(str(tmp_path / 'profiles' / name))
+    assert stats.total_calls > 0
+
+@pytest.mark.parametrize('mode', ['sample', 'cprofile'])
+def test_failed_request_stops_profiler(tmp_path, mocker, mode):
+    """Testa se uma exceção propagada pela view para o profiler e não impede os próximos perfis."""
+    app = _make_app(tmp_path, PROFILING_MODE=mode, PROFILING_SAMPLE_RATE=1.0)
+    render_template = mocker.patch('app.routes.render_template', side_effect=RuntimeError('falhou'))
+    with app.test_client() as client:
+        with pytest.raises(RuntimeError):
+            client.get('/login')
+        assert not any(thread.name == 'stack-sampler' for thread in threading.enumerate())
+        render_template.side_effect = None
+        render_template.return_value = ''
+        assert 'X-Profile-Id' in client.get('/login').headers
+
+def test_admin_routes(tmp_path, mocker):
+    """Testa se só administradores listam e baixam os perfis."""
+    # cProfile sempre grava algo; no modo amostrado um /login rápido pode sair sem amostras
+    app = _make_app(tmp_path, PROFILING_MODE='cprofile', PROFILING_SAMPLE_RATE=1.0)
+    with app.test_client() as client:
+        name = client.get('/login').headers['X-Profile-Id']
+
+        _login_as(app, mocker, 'comum')
+        assert client.get('/admin/profiles').status_code == 403
+
+        _login_as(app, mocker, 'admin')
+        listagem = client.get('/admin/profiles').get_json()
+        assert name in [item['nome'] for item in listagem['profiles']]
+        response = client.get(f'/admin/profiles/{name}')
+        assert response.status_code == 200 and response.data.strip()
+        assert client.get('/admin/profiles/nao-existe.prof').status_code == 404
+
+def test_disabled_registers_no_hooks(tmp_path):
+    app = _make_app(tmp_path, PROFILING_ENABLED=False)
+    assert 'profiler' not in app.extensions
+    with app.test_client() as client:
+        assert 'X-Profile-Id' not in client.get('/login', headers={'X-Profile': 'segredo'}).headers
+        assert client.get('/admin/profiles').status_code in (302, 401, 404)
@@ -0,0 +1,52 @@
+import pytest
+from app.reports import build_chart, build_pdf_report, TableLayout
+
+def _page_count(pdf: bytes) -> int:
+    return pdf.count(b'/Type /Page\n') or pdf.count(b'/Type /Page ')
+
+def test_build_pdf_report_paginates_lazily():
+    """Testa se as linhas são consumidas sob demanda e quebradas em várias páginas."""
+    consumed = []
+
+    def rows():
+        for i in range(200):
+            consumed.append(i)
+            yield (2023, i % 12 + 1, 'SBGRSBSV', float(i), float(i * 2))
+
+    buffer = build_pdf_report('Relatório', ['ANO', 'MES', 'MERCADO', 'RPK', 'ASK'], rows())
+    pdf = buffer.getvalue()
+    assert pdf.startswith(b'%PDF')
+    assert len(consumed) == 200
+    assert _page_count(pdf) == 5
+
+def test_build_pdf_report_with_chart_and_no_rows():
+    """Testa o relatório só com o gráfico, sem linhas de tabela."""
+    chart = build_chart(['2023-01', '2023-02'], [1.0, 2.0])
+    pdf = build_pdf_report('Relatório', ['ANO'], [], chart).getvalue()
+    assert pdf.startswith(b'%PDF')
+    assert build_chart([], []) is None
+
+def test_text_width():
+    """Testa a largura do texto pela tabela de métricas, inclusive com acentos."""
+    from reportlab.pdfbase.pdfmetrics import stringWidth
+    layout = TableLayout(['A', 'B'], 200)
+    assert layout.text_width('SBGRSBSV 1,234.50') == pytest.approx(stringWidth('SBGRSBSV 1,234.50', 'Helvetica', 9))
+    assert layout.text_width('São') == pytest.approx(stringWidth('São', 'Helvetica', 9))
+
+def test_init_reports_sets_ascii85_for_the_process(tmp_path):
+    """Testa se a opção PDF_ASCII85 é aplicada uma vez ao reportlab na criação do app."""
+    from reportlab import rl_config
+    from app import create_app
+    use_a85 = rl_config.useA85
+    try:
+        create_app({
+            'TESTING': True,
+            'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'app.db'}",
+            'EXPORT_RESULT_DIR': str(tmp_path / 'exports'),
+            'HISTORY_WRITE_BEHIND': False,
+        })
+        assert not rl_config.useA85
+        pdf = build_pdf_report('Relatório', ['MERCADO'], [('São Paulo (SP)',)]).getvalue()
+        assert b'ASCII85Decode' not in pdf
+    finally:
+        rl_config.useA85 = use_a85
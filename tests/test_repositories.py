@@ -1,8 +1,13 @@
+import os
 import pytest
 import pandas as pd
-from sqlalchemy import create_engine
-from app.repositories import FlightDataRepository
+from sqlalchemy import create_engine, text
+from app.repositories import FlightDataRepository, SnapshotFlightDataRepository, FILTERED_QUERY, MONTHLY_QUERY
 from app.models import FilterData
+from app.catalog import refresh_catalog
+from app.ingest import rebuild_monthly
+from app.schema import flight_metadata, flight_data, flight_monthly
+from app.snapshot import write_snapshot
 
 @pytest.fixture
 def in_memory_db():
@@ -12,23 +17,30 @@ def in_memory_db():
         'ANO': [2023, 2023, 2024],
         'MES': [1, 2, 1],
         'MERCADO': ['SBGRSBSV', 'SBGRSBSV', 'SBFLSBGR'],
-        'RPK': [1000, 2000, 1500]
+        'RPK': [1000, 2000, 1500],
+        'ASK': [2000, 2500, 3000],
+        'PERIODO': [202301, 202302, 202401]
     })
     df.to_sql('flight_data', engine, if_exists='replace', index=False)
     return engine
 
-@pytest.fixture
-def repo(in_memory_db):
-    """Cria uma instância do FlightDataRepository com o banco em memória configurado."""
-    repo = FlightDataRepository()
-    repo.engine = in_memory_db
-    return repo
+def make_repo(backend, engine, snapshot_dir):
+    """Cria o repositório do backend indicado; no 'snapshot', grava antes o snapshot do banco."""
+    if backend == 'snapshot':
+        write_snapshot(engine, str(snapshot_dir))
+        return SnapshotFlightDataRepository(str(snapshot_dir), engine=engine)
+    return FlightDataRepository(engine=engine)
+
+@pytest.fixture(params=['sql', 'snapshot'])
+def repo(request, in_memory_db, tmp_path):
+    """Cria o repositório com o banco em memória configurado, lendo do SQL ou do snapshot colunar."""
+    return make_repo(request.param, in_memory_db, tmp_path / 'snapshot')
 
 def test_get_all_flight_data(repo):
     """Testa se get_all_flight_data retorna todos os dados corretamente."""
     flight_data = repo.get_all_flight_data()
     assert len(flight_data) == 3
-    assert list(flight_data.columns) == ['ANO', 'MES', 'MERCADO', 'RPK']
+    assert list(flight_data.columns) == ['ANO', 'MES', 'MERCADO', 'RPK', 'ASK', 'PERIODO']
     assert flight_data['MERCADO'].tolist() == ['SBGRSBSV', 'SBGRSBSV', 'SBFLSBGR']
 
 def test_get_filtered_flight_data(repo):
@@ -46,6 +58,12 @@ def test_get_filtered_flight_data(repo):
     assert filtered_data['ANO'].tolist() == [2023, 2023]
     assert filtered_data['MES'].tolist() == [1, 2]
 
+def test_iter_filtered_flight_data_batches(repo):
+    """Testa se iter_filtered_flight_data percorre os voos filtrados em lotes."""
+    filter_data = FilterData(mercado='SBGRSBSV', ano_inicio=2023, ano_fim=2024, mes_inicio=1, mes_fim=12)
+    batches = list(repo.iter_filtered_flight_data(filter_data, batch_size=1))
+    assert batches == [[(2023, 1, 'SBGRSBSV', 1000, 2000)], [(2023, 2, 'SBGRSBSV', 2000, 2500)]]
+
 def test_get_available_markets(repo):
     """Testa se get_available_markets retorna mercados únicos ordenados."""
     markets = repo.get_available_markets()
@@ -54,4 +72,111 @@ def test_get_available_markets(repo):
 def test_get_available_years(repo):
     """Testa se get_available_years retorna anos únicos ordenados."""
     years = repo.get_available_years()
-    assert years == [2023, 2024]
\ No newline at end of file
+    assert years == [2023, 2024]
+
+def test_get_available_markets_uses_catalog_table(repo, in_memory_db):
+    """Testa se, com flight_catalog preenchida, os mercados vêm do catálogo sem ler a tabela inteira."""
+    refresh_catalog(in_memory_db)
+    repo.get_all_flight_data = lambda: pytest.fail("get_all_flight_data não deve ser chamado")
+    assert repo.get_available_markets() == ['SBFLSBGR', 'SBGRSBSV']
+    assert repo.get_available_years() == [2023, 2024]
+
+def test_catalog_market_coverage(repo, in_memory_db):
+    """Testa a cobertura por mercado (primeiro/último período e meses existentes)."""
+    refresh_catalog(in_memory_db)
+    coverage = repo.get_catalog().get_coverage('SBGRSBSV')
+    assert coverage.periodo_inicio == 202301
+    assert coverage.periodo_fim == 202302
+    assert coverage.has_month(2023, 2)
+    assert not coverage.has_month(2024, 1)
+    assert coverage.anos == [2023]
+    assert coverage.bitmap == 0b11
+    assert coverage.overlaps(202212, 202301) and not coverage.overlaps(202303, 202412)
+    assert repo.has_market('SBFLSBGR') and not repo.has_market('SBXXSBYY')
+    assert repo.get_market_coverage('SBFLSBGR').faixas == ((202401, 202401),)
+
+def test_get_data_generation_without_manifest(repo):
+    """Testa se a geração de dados é 0 antes da primeira ingestão incremental."""
+    assert repo.get_data_generation() == 0
+
+def test_get_monthly_flight_data_from_rollup(repo, in_memory_db, tmp_path):
+    """Testa se o agregado mensal retorna uma linha por mês a partir de flight_monthly."""
+    pd.DataFrame({
+        'ANO': [2023, 2023], 'MES': [1, 1], 'MERCADO': ['SBGRSBSV', 'SBGRSBSV'],
+        'RPK': [500, 700], 'ASK': [1000, 1000], 'PERIODO': [202301, 202301]
+    }).to_sql('flight_data', in_memory_db, if_exists='replace', index=False)
+    with in_memory_db.begin() as conn:
+        flight_monthly.create(conn)
+        rebuild_monthly(conn)
+    if isinstance(repo, SnapshotFlightDataRepository):
+        repo = make_repo('snapshot', in_memory_db, tmp_path / 'snapshot')
+    filter_data = FilterData(mercado='SBGRSBSV', ano_inicio=2023, ano_fim=2023, mes_inicio=1, mes_fim=12)
+    monthly = repo.get_monthly_flight_data(filter_data)
+    assert monthly[['ANO', 'MES', 'RPK', 'ASK', 'VOOS']].values.tolist() == [[2023, 1, 1200, 2000, 2]]
+
+def test_get_monthly_flight_data_without_rollup(repo):
+    """Testa o agregado mensal em bancos sem flight_monthly."""
+    filter_data = FilterData(mercado='SBGRSBSV', ano_inicio=2023, ano_fim=2023, mes_inicio=1, mes_fim=2)
+    monthly = repo.get_monthly_flight_data(filter_data)
+    assert monthly['MES'].tolist() == [1, 2]
+    assert monthly['VOOS'].tolist() == [1, 1]
+
+def test_get_all_monthly_flight_data(repo):
+    """Testa o agregado mensal de todos os mercados, usado na montagem do cubo de métricas."""
+    monthly = repo.get_all_monthly_flight_data().sort_values(['MERCADO', 'ANO', 'MES'])
+    assert monthly[['MERCADO', 'ANO', 'MES', 'RPK', 'VOOS']].values.tolist() == [
+        ['SBFLSBGR', 2024, 1, 1500, 1], ['SBGRSBSV', 2023, 1, 1000, 1], ['SBGRSBSV', 2023, 2, 2000, 1],
+    ]
+
+def test_get_markets_monthly_flight_data(repo):
+    """Testa o agregado mensal de vários mercados numa consulta, ordenado por mercado e período."""
+    monthly = repo.get_markets_monthly_flight_data(['SBGRSBSV', 'SBFLSBGR', 'SBXXSBYY'], 202301, 202412)
+    assert monthly[['MERCADO', 'MES', 'RPK', 'VOOS']].values.tolist() == [
+        ['SBFLSBGR', 1, 1500, 1], ['SBGRSBSV', 1, 1000, 1], ['SBGRSBSV', 2, 2000, 1],
+    ]
+    assert repo.get_markets_monthly_flight_data(['SBGRSBSV'], 202302, 202302)['MES'].tolist() == [2]
+
+def test_get_filtered_flight_data_period_bounds(repo):
+    """Testa os limites do período: um único mês e intervalos de vários anos."""
+    single_month = FilterData(mercado='SBGRSBSV', ano_inicio=2023, ano_fim=2023, mes_inicio=1, mes_fim=1)
+    assert repo.get_filtered_flight_data(single_month)['MES'].tolist() == [1]
+    three_years = FilterData(mercado='SBFLSBGR', ano_inicio=2022, ano_fim=2025, mes_inicio=12, mes_fim=1)
+    assert repo.get_filtered_flight_data(three_years)['ANO'].tolist() == [2024]
+
+def _explain(engine, query: str) -> str:
+    params = {'mercado': 'SBGRSBSV', 'periodo_inicio': 202301, 'periodo_fim': 202412}
+    flight_metadata.create_all(engine, tables=[flight_data, flight_monthly])
+    with engine.connect() as conn:
+        if engine.dialect.name == 'sqlite':
+            rows = conn.execute(text('EXPLAIN QUERY PLAN ' + query), params).fetchall()
+            return '\n'.join(str(row[-1]) for row in rows)
+        conn.execute(text('SET enable_seqscan = off'))
+        rows = conn.execute(text('EXPLAIN ' + query), params).fetchall()
+        return '\n'.join(row[0] for row in rows)
+
+def test_explain_index_range_scan_sqlite():
+    """Testa se o filtro por mercado e período vira uma varredura de intervalo no índice (SQLite)."""
+    engine = create_engine('sqlite:///:memory:')
+    plan = _explain(engine, FILTERED_QUERY)
+    assert 'USING INDEX ix_flight_data_mercado_periodo (MERCADO=? AND PERIODO>? AND PERIODO<?)' in plan
+    plan = _explain(engine, MONTHLY_QUERY)
+    assert '(MERCADO=? AND PERIODO>? AND PERIODO<?)' in plan
+
+@pytest.mark.skipif(not os.environ.get('TEST_POSTGRES_URL'), reason="TEST_POSTGRES_URL não configurada")
+def test_explain_index_range_scan_postgresql():
+    """Testa se o filtro por mercado e período usa o índice composto (PostgreSQL)."""
+    engine = create_engine(os.environ['TEST_POSTGRES_URL'])
+    try:
+        plan = _explain(engine, FILTERED_QUERY)
+        assert 'ix_flight_data_mercado_periodo' in plan
+        assert '"PERIODO" >= 202301' in plan and '"PERIODO" <= 202412' in plan
+        plan = _explain(engine, MONTHLY_QUERY)
+        assert 'flight_monthly_pkey' in plan
+    finally:
+        flight_metadata.drop_all(engine, tables=[flight_data, flight_monthly])
+        engine.dispose()
+
+def test_repository_requires_url_or_engine():
+    """Testa se o repositório não cai num banco padrão quando nem a URL nem a engine são informadas."""
+    with pytest.raises(ValueError):
+        FlightDataRepository()
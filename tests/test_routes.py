@@ -1,3 +1,4 @@
+from datetime import datetime
 import pytest
 from flask import url_for
 from app import create_app, db
@@ -5,11 +6,13 @@ from app.models import User
 from pytest_mock import MockerFixture
 
 @pytest.fixture
-def client():
+def client(tmp_path):
     """Cria um cliente de teste Flask."""
-    app = create_app()
-    app.config['TESTING'] = True
-    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+    app = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:',
+        'EXPORT_RESULT_DIR': str(tmp_path / 'exports'),
+    })
     with app.test_client() as client:
         with app.app_context():
             db.create_all()
@@ -43,3 +46,207 @@ def test_dashboard_get(client, mocker):
     response = client.get('/dashboard')
     assert response.status_code == 200
     assert 'Estatísticas de Voos GOL'.encode('utf-8') in response.data
+
+def test_repository_is_shared_across_requests(client):
+    """Testa se as rotas reutilizam o mesmo repositório e a mesma engine do registro."""
+    from app.repositories import get_repository
+    first = get_repository()
+    second = get_repository()
+    assert first is second
+    assert str(first.engine.url) == 'sqlite:///:memory:'
+
+def test_pool_stats(client, mocker):
+    """Testa a rota de estatísticas do pool de conexões."""
+    mocker.patch('flask_login.utils._get_user', return_value=User(username='testuser', password='testpass'))
+    response = client.get('/api/pool-stats')
+    assert response.status_code == 200
+    assert 'sqlite:///:memory:' in response.get_json()
+
+FILTER_FORM = {'mercado': 'SBGRSBSV', 'ano_inicio': '2023', 'ano_fim': '2023', 'mes_inicio': '1', 'mes_fim': '12'}
+
+@pytest.fixture
+def logged_user(client, mocker):
+    user = User(username='testuser', password='testpass')
+    db.session.add(user)
+    db.session.commit()
+    mocker.patch('flask_login.utils._get_user', return_value=user)
+    return user
+
+def test_dashboard_post_sends_validators(client, logged_user, mocker):
+    """Testa se o gráfico é servido com ETag e revalidação obrigatória."""
+    mocker.patch('app.routes.get_flight_data', return_value={'labels': ['2023-01'], 'values': [1.0]})
+    response = client.post('/dashboard', data=FILTER_FORM)
+    assert response.status_code == 200
+    assert response.headers['ETag']
+    assert 'no-cache' in response.headers['Cache-Control']
+
+def test_dashboard_post_not_modified(client, logged_user, mocker):
+    """Testa se uma requisição condicional com a mesma ETag recebe 304 sem consultar os dados."""
+    get_flight_data = mocker.patch('app.routes.get_flight_data', return_value={'labels': ['2023-01'], 'values': [1.0]})
+    etag = client.post('/dashboard', data=FILTER_FORM).headers['ETag']
+
+    response = client.post('/dashboard', data=FILTER_FORM, headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.data == b''
+    assert get_flight_data.call_count == 1
+
+def test_if_modified_since_alone_is_ignored(client, logged_user, mocker):
+    """Testa se o If-Modified-Since sem ETag não gera 304 para um filtro que o cliente nunca recebeu."""
+    mocker.patch('app.routes.get_flight_data', return_value={'labels': ['2023-01'], 'values': [1.0]})
+    from app.repositories import get_repository
+    mocker.patch.object(get_repository(), 'get_data_last_modified', return_value=datetime(2024, 1, 1))
+    response = client.post('/dashboard', data={**FILTER_FORM, 'mes_fim': '6'},
+                           headers={'If-Modified-Since': 'Mon, 01 Jan 2024 00:00:00 GMT'})
+    assert response.status_code == 200
+    assert response.headers['Last-Modified']
+
+def test_etag_changes_with_filter_and_generation(client, logged_user, mocker):
+    """Testa se a ETag muda com os filtros e com uma nova geração de dados."""
+    mocker.patch('app.routes.get_flight_data', return_value={'labels': [], 'values': []})
+    etag = client.post('/dashboard', data=FILTER_FORM).headers['ETag']
+    other = client.post('/dashboard', data={**FILTER_FORM, 'mes_fim': '6'}).headers['ETag']
+    assert other != etag
+
+    from app.repositories import get_repository
+    mocker.patch.object(get_repository(), 'get_data_generation', return_value=99)
+    response = client.post('/dashboard', data=FILTER_FORM, headers={'If-None-Match': etag})
+    assert response.status_code == 200
+
+def test_dashboard_post_compact_format(client, logged_user, mocker):
+    """Testa se o formato compacto repassa as opções, limita os pontos e tem ETag própria."""
+    get_compact_chart = mocker.patch('app.routes.get_compact_chart', return_value={'formato': 'compacto', 'n': 0})
+    mocker.patch('app.routes.get_flight_data', return_value={'labels': [], 'values': []})
+    legado = client.post('/dashboard', data=FILTER_FORM).headers['ETag']
+    compacto = {**FILTER_FORM, 'formato': 'compacto', 'granularidade': 'trimestral', 'max_pontos': '100000', 'codificacao': 'base64'}
+    response = client.post('/dashboard', data=compacto)
+    assert response.status_code == 200 and response.headers['ETag'] != legado
+    _, _, metrica, chart_format, max_pontos = get_compact_chart.call_args[0]
+    assert metrica == 'RPK' and chart_format.passo == 3 and chart_format.codificacao == 'base64'
+    assert max_pontos == client.application.config['CHART_MAX_POINTS']
+
+    assert client.post('/rpk', data={**compacto, 'granularidade': 'semanal'}).status_code == 400
+
+def test_api_rankings(client, logged_user, mocker):
+    """Testa se o /api/rankings repassa métrica, período e tamanho, e valida os parâmetros."""
+    get_market_ranking = mocker.patch('app.routes.get_market_ranking', return_value={'ranking': [], 'fonte': 'cubo', 'tempo_ms': 0.1})
+    response = client.get('/api/rankings?metrica=load_factor&n=5&ano_inicio=2023&ano_fim=2024&mes_fim=6')
+    assert response.status_code == 200
+    assert response.headers['Server-Timing'].startswith('ranking;dur=0.1;desc="cubo"')
+    pedido, _, max_n = get_market_ranking.call_args[0]
+    assert (pedido.metrica, pedido.n, pedido.periodo_inicio, pedido.periodo_fim) == ('load_factor', 5, 202301, 202406)
+    assert max_n == client.application.config['RANKINGS_MAX_N']
+    assert client.get('/api/rankings?ano_fim=2023').status_code == 400
+    assert client.get('/api/rankings?ano_inicio=2023&ano_fim=2023&n=x').status_code == 400
+
+def test_export_csv_not_modified(client, logged_user, mocker):
+    """Testa o 304 na exportação de CSV."""
+    get_csv = mocker.patch('app.routes.get_flight_data_csv', return_value='ANO;MES\n')
+    etag = client.post('/export_csv', data=FILTER_FORM).headers['ETag']
+    response = client.post('/export_csv', data=FILTER_FORM, headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert get_csv.call_count == 1
+
+def test_export_flights_csv_streams_gzip(client, logged_user, mocker):
+    """Testa a exportação dos voos em streaming com gzip negociado pelo cliente."""
+    import gzip
+    mocker.patch('app.routes.stream_flight_data_csv', side_effect=lambda fd, repo, batch_size, compress: iter(
+        [gzip.compress(b'ANO,MES\n2023,1\n')] if compress else [b'ANO,MES\n', b'2023,1\n']
+    ))
+    form = {**FILTER_FORM, 'modo': 'voos'}
+
+    response = client.post('/export_csv', data=form, headers={'Accept-Encoding': 'gzip'})
+    assert response.status_code == 200
+    assert response.is_streamed
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(response.data) == b'ANO,MES\n2023,1\n'
+
+    plain = client.post('/export_csv', data=form)
+    assert 'Content-Encoding' not in plain.headers
+    assert plain.data == b'ANO,MES\n2023,1\n'
+    assert plain.headers['ETag'] != response.headers['ETag']
+
+def test_export_pdf_flights_mode(client, logged_user, mocker):
+    """Testa se modo=voos gera o PDF dos voos individuais."""
+    import io
+    detail = mocker.patch('app.routes.get_flight_detail_pdf', return_value=io.BytesIO(b'%PDF-1.4'))
+    monthly = mocker.patch('app.routes.get_flight_data_pdf')
+    response = client.post('/export_pdf', data={**FILTER_FORM, 'modo': 'voos'})
+    assert response.status_code == 200
+    assert 'voos_SBGRSBSV' in response.headers['Content-Disposition']
+    detail.assert_called_once()
+    monthly.assert_not_called()
+
+def _wait_export(client, status_url, timeout=10):
+    import time
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        data = client.get(status_url).get_json()
+        if data['status'] in ('concluido', 'erro'):
+            return data
+        time.sleep(0.05)
+    raise AssertionError('exportação não terminou')
+
+def test_export_job_lifecycle(client, logged_user, mocker):
+    """Testa o ciclo de uma exportação em segundo plano: enfileira, consulta e baixa."""
+    mocker.patch('app.exports.get_flight_data_csv', return_value='ANO,MES,MERCADO,RPK\n2023,1,SBGRSBSV,1000\n')
+    response = client.post('/exports', data={**FILTER_FORM, 'formato': 'csv'})
+    assert response.status_code == 202
+    job = response.get_json()
+    assert job['status'] in ('pendente', 'executando', 'concluido')
+
+    done = _wait_export(client, job['status_url'])
+    assert done['status'] == 'concluido'
+    assert done['progresso'] == 1.0
+
+    download = client.get(done['download_url'])
+    assert download.status_code == 200
+    assert download.data.startswith(b'ANO,MES')
+    assert 'rpk_SBGRSBSV_2023-1_to_2023-12.csv' in download.headers['Content-Disposition']
+
+def test_export_jobs_are_deduplicated(client, logged_user, mocker):
+    """Testa se pedidos idênticos compartilham o mesmo job e filtros diferentes não."""
+    import threading
+    release = threading.Event()
+    render = mocker.patch('app.exports.get_flight_data_csv', side_effect=lambda fd, repo: release.wait(5) and 'ANO\n')
+
+    first = client.post('/exports', data={**FILTER_FORM, 'formato': 'csv'}).get_json()
+    second = client.post('/exports', data={**FILTER_FORM, 'formato': 'csv'}).get_json()
+    other = client.post('/exports', data={**FILTER_FORM, 'formato': 'csv', 'mes_fim': '6'}).get_json()
+    assert first['id'] == second['id']
+    assert other['id'] != first['id']
+
+    release.set()
+    _wait_export(client, first['status_url'])
+    _wait_export(client, other['status_url'])
+    assert render.call_count == 2
+
+def test_export_unknown_and_invalid(client, logged_user):
+    """Testa ids inexistentes e parâmetros inválidos."""
+    assert client.get('/exports/' + '0' * 32).status_code == 404
+    assert client.get('/exports/../config.py/download').status_code == 404
+    assert client.post('/exports', data={**FILTER_FORM, 'formato': 'xls'}).status_code == 400
+
+def test_api_series(client, logged_user, mocker):
+    """Testa a API de séries de vários mercados por parâmetros e por JSON."""
+    series = mocker.patch('app.routes.get_market_series', return_value={
+        'periodos': ['2023-01'], 'mercados': ['SBGRSBSV', 'SBFLSBGR'], 'metricas': ['RPK'],
+        'series': {'SBGRSBSV': {'RPK': [1.0]}, 'SBFLSBGR': {'RPK': [None]}}, 'fonte': 'cubo',
+        'tempos_ms': {'validacao': 0.1, 'consulta': 0.2, 'alinhamento': 0.3},
+    })
+    response = client.get('/api/series?mercados=SBGRSBSV,SBFLSBGR&ano_inicio=2023&ano_fim=2023')
+    assert response.status_code == 200
+    assert response.headers['Server-Timing'].startswith('validacao;dur=0.1, consulta;dur=0.2, alinhamento;dur=0.3, ')
+    assert 'total;dur=' in response.headers['Server-Timing']
+    pedido = series.call_args[0][0]
+    assert pedido.mercados == ['SBGRSBSV', 'SBFLSBGR'] and pedido.metricas == ['RPK']
+    assert series.call_args[0][2] == 20
+
+    response = client.post('/api/series', json={'mercados': ['SBGRSBSV'], 'metricas': ['ASK'], 'ano_inicio': 2023, 'ano_fim': 2024})
+    assert response.status_code == 200
+    assert series.call_args[0][0].periodo_fim == 202412
+
+def test_api_series_bad_request(client, logged_user):
+    """Testa os erros de validação da API de séries."""
+    assert client.get('/api/series?mercados=SBGRSBSV').status_code == 400
+    response = client.post('/api/series', json={'mercados': ['SBGRSBSV'], 'ano_inicio': 2024, 'ano_fim': 2023})
+    assert response.status_code == 400
@@ -1,7 +1,21 @@
+import base64
+import time
+import numpy as np
 import pytest
 import pandas as pd
-from app.services import get_flight_data, get_flight_data_csv, get_dashboard_initial_data, FilterData
+from flask import Flask
+from app.services import (
+    get_flight_data, get_flight_RPK, get_flight_data_csv, stream_flight_data_csv, get_flight_data_pdf, get_flight_detail_pdf, get_dashboard_initial_data, FilterData,
+    ResultCache, MemoryCacheBackend, SQLiteCacheBackend, init_result_cache, get_market_series,
+    compute_market_metrics, validate_metrics, METRICS, get_compact_chart, get_market_ranking,
+)
+from app.catalog import FlightCatalog
+from app.cube import MetricCube, init_metric_cube
+from app.downsampling import lttb_indices
+from app.ingest import RANKING_EXPRESSIONS
+from app.models import ChartFormat, RankingRequest, SeriesRequest
 from app.repositories import FlightDataRepository
+from benchmarks.dataset import DatasetSpec, build_database
 from pytest_mock import MockerFixture
 
 @pytest.fixture
@@ -21,8 +35,20 @@ def mock_repo(mocker: MockerFixture) -> FlightDataRepository:
         'MERCADO': ['SBGRSBSV', 'SBGRSBSV'],
         'RPK': [1000, 2000]
     })
+    mock_instance.get_monthly_flight_data.return_value = pd.DataFrame({
+        'ANO': [2023, 2023],
+        'MES': [1, 2],
+        'MERCADO': ['SBGRSBSV', 'SBGRSBSV'],
+        'RPK': [1000, 2000],
+        'ASK': [2000, 2500],
+        'VOOS': [3, 4]
+    })
     mock_instance.get_available_markets.return_value = ['SBFLSBGR', 'SBGRSBSV']
     mock_instance.get_available_years.return_value = [2023, 2024]
+    catalog = FlightCatalog([('SBGRSBSV', 2023, 1), ('SBGRSBSV', 2023, 2), ('SBFLSBGR', 2024, 1)])
+    mock_instance.get_catalog.return_value = catalog
+    mock_instance.get_market_coverage.side_effect = catalog.get_coverage
+    mock_instance.has_market.side_effect = catalog.has_market
     return mock_instance
 
 def test_get_dashboard_initial_data(mock_repo):
@@ -52,7 +78,7 @@ def test_get_flight_data_success(mock_repo):
 
 def test_get_flight_data_no_data(mock_repo, mocker):
     """Testa get_flight_data quando não há dados."""
-    mocker.patch.object(mock_repo, 'get_filtered_flight_data', return_value=pd.DataFrame())
+    mocker.patch.object(mock_repo, 'get_monthly_flight_data', return_value=pd.DataFrame())
     filter_data = FilterData(
         mercado='SBGRSBSV',
         ano_inicio=2025,
@@ -62,6 +88,19 @@ def test_get_flight_data_no_data(mock_repo, mocker):
     assert 'labels' in chart_data and chart_data['labels'] == []
     assert 'message' in chart_data and 'Nenhum dado encontrado' in chart_data['message']
 
+def test_get_flight_data_no_data_uses_coverage(mock_repo):
+    """Testa se um período sem dados é respondido pela cobertura, sem consultar os voos, com sugestões de períodos."""
+    mock_repo.get_market_coverage.side_effect = FlightCatalog([
+        ('SBGRSBSV', 2019, mes) for mes in range(1, 13)
+    ] + [('SBGRSBSV', 2022, 3), ('SBGRSBSV', 2022, 4), ('SBGRSBSV', 2024, 6)]).get_coverage
+    filter_data = FilterData(mercado='SBGRSBSV', ano_inicio=2021, ano_fim=2021, mes_inicio=1, mes_fim=12)
+    chart_data = get_flight_data(filter_data, mock_repo)
+    assert chart_data['labels'] == []
+    assert chart_data['sugestoes'] == [{'inicio': '2019-01', 'fim': '2019-12'}, {'inicio': '2022-03', 'fim': '2022-04'}]
+    assert 'Períodos disponíveis mais próximos: 2019-01 a 2019-12, 2022-03 a 2022-04.' in chart_data['message']
+    mock_repo.get_monthly_flight_data.assert_not_called()
+    mock_repo.get_all_flight_data.assert_not_called()
+
 def test_get_flight_data_csv(mock_repo):
     """Testa get_flight_data_csv com dados válidos."""
     filter_data = FilterData(
@@ -72,4 +111,275 @@ def test_get_flight_data_csv(mock_repo):
     csv_content = get_flight_data_csv(filter_data, mock_repo)
     csv_content = csv_content.replace('\r\n', '\n')
     expected = "ANO,MES,MERCADO,RPK\n2023,1,SBGRSBSV,1000\n2023,2,SBGRSBSV,2000\n"
-    assert csv_content == expected
\ No newline at end of file
+    assert csv_content == expected
+
+def test_get_flight_RPK_monthly_ratio(mock_repo):
+    """Testa se o RPK/ASK é calculado sobre o agregado mensal."""
+    filter_data = FilterData(mercado='SBGRSBSV', ano_inicio=2023, ano_fim=2023, mes_inicio=1, mes_fim=2)
+    chart_data = get_flight_RPK(filter_data, mock_repo)
+    assert chart_data['labels'] == ['2023-01', '2023-02']
+    assert chart_data['values'] == [0.5, 0.8]
+
+def test_lowercase_market_is_normalized(mock_repo):
+    """Testa se o mercado em minúsculas é normalizado no filtro e consultado como o original."""
+    filter_data = FilterData(mercado=' sbgrsbsv ', ano_inicio=2023, ano_fim=2023, mes_inicio=1, mes_fim=2)
+    assert filter_data.mercado == 'SBGRSBSV'
+    assert get_flight_RPK(filter_data, mock_repo)['values'] == [0.5, 0.8]
+
+def _filtro(mercado: str = 'SBGRSBSV') -> FilterData:
+    return FilterData(mercado=mercado, ano_inicio=2023, ano_fim=2023, mes_inicio=1, mes_fim=2)
+
+def test_result_cache_hits_and_generation_invalidation():
+    """Testa acertos, falhas e a invalidação quando a geração de dados muda."""
+    cache = ResultCache(MemoryCacheBackend())
+    calls = []
+    compute = lambda: calls.append(1) or {'values': [1, 2]}
+    assert cache.get_or_compute('chart_rpk', _filtro(), 1, compute) == {'values': [1, 2]}
+    assert cache.get_or_compute('chart_rpk', _filtro(' sbgrsbsv '), 1, compute) == {'values': [1, 2]}
+    assert cache.get_or_compute('csv', _filtro(), 1, compute) == {'values': [1, 2]}
+    assert len(calls) == 2
+    cache.get_or_compute('chart_rpk', _filtro(), 2, compute)
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['invalidations'], stats['entries']) == (1, 3, 1, 1)
+
+def test_memory_backend_lru_eviction_and_ttl(mocker):
+    """Testa o despejo LRU por número de entradas e bytes e a expiração por TTL."""
+    cache = ResultCache(MemoryCacheBackend(max_entries=2, max_bytes=10_000), ttl=60)
+    for mercado in ('AAAA', 'BBBB'):
+        cache.get_or_compute('chart_rpk', _filtro(mercado), 1, lambda: mercado)
+    cache.get_or_compute('chart_rpk', _filtro('AAAA'), 1, lambda: 'x')
+    cache.get_or_compute('chart_rpk', _filtro('CCCC'), 1, lambda: 'CCCC')
+    assert cache.evictions == 1
+    assert cache.get_or_compute('chart_rpk', _filtro('AAAA'), 1, lambda: 'novo') == 'AAAA'
+    assert cache.get_or_compute('chart_rpk', _filtro('BBBB'), 1, lambda: 'novo') == 'novo'
+    mocker.patch('app.services.time.time', return_value=time.time() + 120)
+    assert cache.get_or_compute('chart_rpk', _filtro('AAAA'), 1, lambda: 'expirado') == 'expirado'
+
+def test_sqlite_backend_shared_between_workers(tmp_path):
+    """Testa se dois caches sobre o mesmo arquivo compartilham entradas e respeitam o limite de bytes."""
+    path = str(tmp_path / 'cache.db')
+    worker_a = ResultCache(SQLiteCacheBackend(path, max_bytes=400))
+    worker_b = ResultCache(SQLiteCacheBackend(path, max_bytes=400))
+    worker_a.get_or_compute('csv', _filtro(), 1, lambda: 'ANO,MES\n')
+    assert worker_b.get_or_compute('csv', _filtro(), 1, lambda: pytest.fail("deveria estar em cache")) == 'ANO,MES\n'
+    worker_b.get_or_compute('csv', _filtro('XXXX'), 1, lambda: 'x' * 390)
+    assert worker_b.evictions == 1
+    assert worker_a.stats()['entries'] == 1
+
+def test_services_use_app_result_cache(mock_repo):
+    """Testa se os serviços passam pelo cache configurado no app."""
+    app = Flask(__name__)
+    init_result_cache(app)
+    mock_repo.get_data_generation.return_value = 7
+    with app.app_context():
+        first = get_flight_data(_filtro(), mock_repo)
+        second = get_flight_data(_filtro(), mock_repo)
+    assert first == second
+    assert mock_repo.get_monthly_flight_data.call_count == 1
+    assert app.extensions['result_cache'].stats()['hits'] == 1
+
+def test_stream_flight_data_csv(mock_repo):
+    """Testa se o CSV de voos é gerado lote a lote, com e sem gzip."""
+    import gzip
+    mock_repo.iter_filtered_flight_data.side_effect = lambda fd, batch_size: iter([
+        [(2023, 1, 'SBGRSBSV', 1000.0, 2000.0)],
+        [(2023, 2, 'SBGRSBSV', 2000.0, 2500.0)],
+    ])
+    filter_data = FilterData(mercado='SBGRSBSV', ano_inicio=2023, ano_fim=2023, mes_inicio=1, mes_fim=2)
+    expected = b"ANO,MES,MERCADO,RPK,ASK\n2023,1,SBGRSBSV,1000.0,2000.0\n2023,2,SBGRSBSV,2000.0,2500.0\n"
+
+    chunks = list(stream_flight_data_csv(filter_data, mock_repo, batch_size=1))
+    assert len(chunks) == 2
+    assert b''.join(chunks) == expected
+
+    compressed = b''.join(stream_flight_data_csv(filter_data, mock_repo, batch_size=1, compress=True))
+    assert gzip.decompress(compressed) == expected
+
+def test_stream_flight_data_csv_invalid_market(mock_repo):
+    """Testa se o mercado é validado antes de o streaming começar."""
+    filter_data = FilterData(mercado='XXXXYYYY', ano_inicio=2023, ano_fim=2023, mes_inicio=1, mes_fim=2)
+    with pytest.raises(ValueError, match="Mercado selecionado não existe."):
+        stream_flight_data_csv(filter_data, mock_repo)
+    mock_repo.iter_filtered_flight_data.assert_not_called()
+
+def test_get_flight_data_pdf(mock_repo, tmp_path, monkeypatch):
+    """Testa o PDF do resumo mensal sem gravar arquivos no diretório de trabalho."""
+    monkeypatch.chdir(tmp_path)
+    filter_data = FilterData(mercado='SBGRSBSV', ano_inicio=2023, ano_fim=2023, mes_inicio=1, mes_fim=2)
+    buffer = get_flight_data_pdf(filter_data, mock_repo)
+    assert buffer.getvalue().startswith(b'%PDF')
+    assert list(tmp_path.iterdir()) == []
+
+def test_get_flight_data_pdf_no_data(mock_repo):
+    """Testa o PDF sem dados no período."""
+    mock_repo.get_monthly_flight_data.return_value = pd.DataFrame(columns=['ANO', 'MES', 'MERCADO', 'RPK', 'ASK', 'VOOS'])
+    filter_data = FilterData(mercado='SBGRSBSV', ano_inicio=2023, ano_fim=2023, mes_inicio=1, mes_fim=2)
+    assert get_flight_data_pdf(filter_data, mock_repo) is None
+
+def test_get_flight_detail_pdf_reads_batches(mock_repo):
+    """Testa se o PDF de voos consome os lotes do cursor do repositório."""
+    mock_repo.iter_filtered_flight_data.return_value = iter([
+        [(2023, 1, 'SBGRSBSV', 1000.0, 2000.0)] * 30,
+        [(2023, 2, 'SBGRSBSV', 2000.0, 2500.0)] * 30,
+    ])
+    filter_data = FilterData(mercado='SBGRSBSV', ano_inicio=2023, ano_fim=2023, mes_inicio=1, mes_fim=2)
+    buffer = get_flight_detail_pdf(filter_data, mock_repo, batch_size=30)
+    assert buffer.getvalue().startswith(b'%PDF')
+    mock_repo.iter_filtered_flight_data.assert_called_once_with(filter_data, 30)
+
+def _series_repo(mocker):
+    repo = mocker.Mock()
+    repo.get_data_generation.return_value = 1
+    repo.get_catalog.return_value = FlightCatalog([('SBGRSBSV', 2023, 1), ('SBGRSBSV', 2023, 3), ('SBFLSBGR', 2023, 2)])
+    repo.get_markets_monthly_flight_data.return_value = pd.DataFrame({
+        'ANO': [2023, 2023, 2023], 'MES': [2, 1, 3], 'MERCADO': ['SBFLSBGR', 'SBGRSBSV', 'SBGRSBSV'],
+        'RPK': [200.0, 1000.0, 0.0], 'ASK': [400.0, 2000.0, 0.0], 'VOOS': [1, 2, 1],
+    })
+    repo.get_all_monthly_flight_data.return_value = repo.get_markets_monthly_flight_data.return_value
+    return repo
+
+@pytest.mark.parametrize('com_cubo', [False, True])
+def test_get_market_series_aligned(mocker, com_cubo):
+    """Testa se as séries de vários mercados saem alinhadas no mesmo eixo, do banco ou do cubo."""
+    repo = _series_repo(mocker)
+    app = Flask(__name__)
+    if com_cubo:
+        init_metric_cube(app)
+    pedido = SeriesRequest(mercados=['sbgrsbsv', 'SBFLSBGR', 'SBGRSBSV'], metricas=['RPK', 'load_factor'], ano_inicio=2023, ano_fim=2023)
+    with app.app_context():
+        data = get_market_series(pedido, repo)
+    assert data['fonte'] == ('cubo' if com_cubo else 'sql')
+    assert data['periodos'] == ['2023-01', '2023-02', '2023-03']
+    assert data['mercados'] == ['SBGRSBSV', 'SBFLSBGR']
+    assert data['series']['SBGRSBSV'] == {'RPK': [1000.0, None, 0.0], 'LOAD_FACTOR': [0.5, None, None]}
+    assert data['series']['SBFLSBGR']['RPK'] == [None, 200.0, None]
+    assert set(data['tempos_ms']) == {'validacao', 'consulta', 'alinhamento'}
+    if not com_cubo:
+        repo.get_markets_monthly_flight_data.assert_called_once_with(['SBGRSBSV', 'SBFLSBGR'], 202301, 202312)
+
+def test_get_market_series_validation(mocker):
+    """Testa o limite de mercados, mercados inexistentes e métricas desconhecidas."""
+    repo = _series_repo(mocker)
+    with pytest.raises(ValueError, match='No máximo 1'):
+        get_market_series(SeriesRequest(mercados=['SBGRSBSV', 'SBFLSBGR'], ano_inicio=2023, ano_fim=2023), repo, max_markets=1)
+    with pytest.raises(ValueError, match='SBXXSBYY'):
+        get_market_series(SeriesRequest(mercados=['SBXXSBYY'], ano_inicio=2023, ano_fim=2023), repo)
+    with pytest.raises(ValueError, match='Métrica inválida'):
+        get_market_series(SeriesRequest(mercados=['SBGRSBSV'], metricas=['XYZ'], ano_inicio=2023, ano_fim=2023), repo)
+    repo.get_markets_monthly_flight_data.assert_not_called()
+
+def test_metric_engine_single_fetch_with_year_over_year(mocker):
+    """Testa se várias métricas, inclusive a variação anual, saem de uma única busca com o histórico necessário."""
+    repo = mocker.Mock()
+    repo.get_monthly_flight_data.return_value = pd.DataFrame({
+        'ANO': [2022, 2022, 2023, 2023], 'MES': [1, 2, 1, 2], 'MERCADO': ['SBGRSBSV'] * 4,
+        'RPK': [800.0, 0.0, 1000.0, 500.0], 'ASK': [1000.0, 0.0, 2000.0, 0.0], 'VOOS': [1, 1, 2, 1],
+    })
+    filter_data = FilterData(mercado='SBGRSBSV', ano_inicio=2023, ano_fim=2023, mes_inicio=1, mes_fim=12)
+    table = compute_market_metrics(filter_data, ['RPK', 'LOAD_FACTOR', 'RPK_YOY', 'LOAD_FACTOR_YOY'], repo)
+    assert repo.get_monthly_flight_data.call_count == 1
+    assert repo.get_monthly_flight_data.call_args[0][0].periodo_inicio == 202201
+    assert table.labels == ['2023-01', '2023-02']
+    assert table.values('RPK') == [1000.0, 500.0]
+    assert table.values('LOAD_FACTOR') == [0.5, None]
+    assert table.values('RPK_YOY') == [pytest.approx(0.25), None]
+    assert table.values('LOAD_FACTOR_YOY') == [pytest.approx(-0.3), None]
+
+def test_validate_metrics():
+    """Testa a normalização dos nomes de métricas e a rejeição de métricas não registradas."""
+    assert validate_metrics(['rpk', 'RPK', ' ask_yoy ']) == ['RPK', 'ASK_YOY']
+    assert {'RPK', 'ASK', 'VOOS', 'LOAD_FACTOR', 'RPK_YOY', 'ASK_YOY', 'LOAD_FACTOR_YOY'} <= set(METRICS)
+    with pytest.raises(ValueError, match='Métrica inválida'):
+        validate_metrics(['RPK', 'XYZ'])
+
+def _monthly_repo(mocker, meses: int):
+    """Repositório com `meses` meses seguidos de SBGRSBSV a partir de 2020-01 (RPK = número do mês)."""
+    periodos = [(2020 + i // 12, i % 12 + 1) for i in range(meses)]
+    repo = mocker.Mock()
+    repo.get_data_generation.return_value = 1
+    repo.get_monthly_flight_data.side_effect = lambda filtro: pd.DataFrame({
+        'ANO': [ano for ano, mes in periodos if filtro.periodo_inicio <= ano * 100 + mes <= filtro.periodo_fim],
+        'MES': [mes for ano, mes in periodos if filtro.periodo_inicio <= ano * 100 + mes <= filtro.periodo_fim],
+        'RPK': [float(i + 1) for i, (ano, mes) in enumerate(periodos) if filtro.periodo_inicio <= ano * 100 + mes <= filtro.periodo_fim],
+        'ASK': [float(2 * (i + 1)) for i, (ano, mes) in enumerate(periodos) if filtro.periodo_inicio <= ano * 100 + mes <= filtro.periodo_fim],
+        'VOOS': [1] * sum(filtro.periodo_inicio <= ano * 100 + mes <= filtro.periodo_fim for ano, mes in periodos),
+    })
+    catalog = FlightCatalog([('SBGRSBSV', ano, mes) for ano, mes in periodos])
+    repo.get_market_coverage.side_effect = catalog.get_coverage
+    return repo
+
+def test_lttb_keeps_endpoints_and_peaks():
+    x = np.arange(1000)
+    y = np.sin(x / 50.0)
+    y[437] = 10.0
+    indices = lttb_indices(x, y, 50)
+    assert len(indices) == 50
+    assert indices[0] == 0 and indices[-1] == 999
+    assert 437 in indices
+    assert (np.diff(indices) > 0).all()
+    assert lttb_indices(x[:10], y[:10], 50).tolist() == list(range(10))
+
+def test_compact_chart_granularity(mocker):
+    """Testa as somas por trimestre e ano do calendário, com o período estendido aos blocos inteiros."""
+    repo = _monthly_repo(mocker, 24)
+    filter_data = FilterData(mercado='SBGRSBSV', ano_inicio=2020, mes_inicio=2, ano_fim=2021, mes_fim=5)
+
+    mensal = get_compact_chart(filter_data, repo, 'RPK', ChartFormat())
+    assert (mensal['inicio'], mensal['passo'], mensal['n']) == ('2020-02', 1, 16)
+    assert mensal['values'][:3] == [2.0, 3.0, 4.0] and 'x' not in mensal and 'labels' not in mensal
+
+    trimestral = get_compact_chart(filter_data, repo, 'RPK', ChartFormat(granularidade='trimestral'))
+    assert (trimestral['inicio'], trimestral['passo']) == ('2020-01', 3)
+    assert trimestral['values'] == [6.0, 15.0, 24.0, 33.0, 42.0, 51.0]
+
+    anual = get_compact_chart(filter_data, repo, 'LOAD_FACTOR', ChartFormat(granularidade='anual', codificacao='float32'))
+    assert (anual['inicio'], anual['passo'], anual['values']) == ('2020-01', 12, [0.5, 0.5])
+
+def test_compact_chart_downsampling_and_base64(mocker):
+    """Testa a redução por LTTB ao limite de pontos e as colunas empacotadas em base64."""
+    repo = _monthly_repo(mocker, 120)
+    filter_data = FilterData(mercado='SBGRSBSV', ano_inicio=2020, ano_fim=2029)
+    chart = get_compact_chart(filter_data, repo, 'RPK', ChartFormat(codificacao='base64'), max_pontos=20)
+    assert chart['n'] == 20 and chart['total_pontos'] == 120
+    values = np.frombuffer(base64.b64decode(chart['values_b64']), dtype='<f4')
+    x = np.frombuffer(base64.b64decode(chart['x_b64']), dtype='<u4')
+    assert x[0] == 0 and x[-1] == 119
+    assert values.tolist() == (x + 1).astype(np.float32).tolist()
+
+    vazio = get_compact_chart(FilterData(mercado='SBGRSBSV', ano_inicio=2031, ano_fim=2031), repo, 'RPK', ChartFormat())
+    assert vazio['n'] == 0 and vazio['message'] and vazio['formato'] == 'compacto'
+    with pytest.raises(ValueError, match='não existe'):
+        get_compact_chart(FilterData(mercado='SBXXSBYY', ano_inicio=2020, ano_fim=2020), repo, 'RPK', ChartFormat())
+    with pytest.raises(ValueError, match='Granularidade'):
+        ChartFormat(granularidade='semanal')
+
+def test_market_ranking_sources_agree(tmp_path):
+    """Testa se o ranking guardado na ingestão, o do cubo e o agregado no banco dão o mesmo resultado."""
+    db_url = build_database(DatasetSpec(rows=20000, seed=3, ano_inicio=2022, ano_fim=2023), str(tmp_path))
+    repo = FlightDataRepository(db_url)
+    app = Flask(__name__)
+    init_metric_cube(app)
+    cube = MetricCube.build(repo)
+
+    for metrica in RANKING_EXPRESSIONS:
+        mes = get_market_ranking(RankingRequest(metrica=metrica.lower(), n=5, ano_inicio=2023, ano_fim=2023, mes_inicio=3, mes_fim=3), repo)
+        assert mes['fonte'] == 'ranking' and mes['metrica'] == metrica
+        assert [item['posicao'] for item in mes['ranking']] == [1, 2, 3, 4, 5]
+        esperado = repo.get_range_ranking(metrica, 202303, 202303, 5)
+        assert [(item['mercado'], pytest.approx(item['valor'])) for item in mes['ranking']] == esperado
+        assert cube.top_markets(metrica, 202303, 202303, 5) == [(m, pytest.approx(v)) for m, v in esperado]
+
+        intervalo = RankingRequest(metrica=metrica, n=7, ano_inicio=2022, ano_fim=2023)
+        with app.app_context():
+            via_cubo = get_market_ranking(intervalo, repo)
+        via_sql = get_market_ranking(intervalo, repo)
+        assert (via_cubo['fonte'], via_sql['fonte']) == ('cubo', 'sql')
+        assert [item['mercado'] for item in via_cubo['ranking']] == [item['mercado'] for item in via_sql['ranking']]
+        valores = [item['valor'] for item in via_cubo['ranking']]
+        assert valores == sorted(valores, reverse=True) and len(valores) == 7
+
+    with pytest.raises(ValueError, match='ranking inválida'):
+        get_market_ranking(RankingRequest(metrica='RPK_YOY', ano_inicio=2023, ano_fim=2023), repo)
+    with pytest.raises(ValueError, match='de 1 a 20'):
+        get_market_ranking(RankingRequest(n=21, ano_inicio=2023, ano_fim=2023), repo, max_n=20)
+    assert get_market_ranking(RankingRequest(ano_inicio=2030, ano_fim=2030), repo)['ranking'] == []
@@ -0,0 +1,83 @@
+import os
+import numpy as np
+import pandas as pd
+from sqlalchemy import create_engine
+from app.data_processing import process_data
+from app.models import FilterData
+from app.repositories import SnapshotFlightDataRepository
+from app.snapshot import FlightSnapshot, current_version, refresh_snapshot, write_snapshot
+from tests.test_data_processing import _anac_chunk, _write_anac_csv
+
+FILTRO = FilterData(mercado='SBGRSBSV', ano_inicio=2023, ano_fim=2024, mes_inicio=1, mes_fim=12)
+
+def _engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'voos.db'}")
+    pd.DataFrame({
+        'ANO': [2024, 2023, 2023, 2023],
+        'MES': [1, 2, 1, 1],
+        'MERCADO': ['SBGRSBSV', 'SBGRSBSV', 'SBFLSBGR', 'SBGRSBSV'],
+        'RPK': [1500.0, 2000.0, 300.0, 1000.0],
+        'ASK': [3000.0, 2500.0, 600.0, 2000.0],
+        'PERIODO': [202401, 202302, 202301, 202301],
+    }).to_sql('flight_data', engine, index=False)
+    return engine
+
+def test_snapshot_layout_and_mmap(tmp_path):
+    """Testa se as colunas ficam ordenadas por (MERCADO, PERIODO), com offsets por mercado, e abrem mapeadas."""
+    path = write_snapshot(_engine(tmp_path), str(tmp_path / 'snap'))
+    snapshot = FlightSnapshot.open_current(str(tmp_path / 'snap'))
+    assert snapshot.path == path
+    assert snapshot.markets == ['SBFLSBGR', 'SBGRSBSV']
+    assert snapshot.offsets.tolist() == [0, 1, 4]
+    assert isinstance(snapshot.columns['RPK'], np.memmap)
+    assert snapshot.columns['PERIODO'].tolist() == [202301, 202301, 202302, 202401]
+
+    rows = snapshot.market_slice('SBGRSBSV', 202302, 202412)
+    assert (rows.start, rows.stop) == (2, 4)
+    assert snapshot.market_slice('SBXXSBYY', 202301, 202412) == slice(0, 0)
+    ordem_original = snapshot.frame(snapshot.order, ('PERIODO', 'MERCADO'))
+    assert ordem_original['PERIODO'].tolist() == [202401, 202302, 202301, 202301]
+
+def test_snapshot_monthly_and_batches(tmp_path):
+    """Testa o agregado mensal e os lotes de tuplas lidos direto do snapshot."""
+    write_snapshot(_engine(tmp_path), str(tmp_path / 'snap'))
+    snapshot = FlightSnapshot.open_current(str(tmp_path / 'snap'))
+    rows = snapshot.market_slice('SBGRSBSV', 202301, 202412)
+    monthly = snapshot.monthly(rows)
+    assert monthly[['ANO', 'MES', 'RPK', 'VOOS']].values.tolist() == [[2023, 1, 1000, 1], [2023, 2, 2000, 1], [2024, 1, 1500, 1]]
+    batches = list(snapshot.iter_batches(rows, 2))
+    assert [len(batch) for batch in batches] == [2, 1]
+    assert batches[0][0] == (2023, 1, 'SBGRSBSV', 1000.0, 2000.0)
+
+def test_repository_falls_back_to_sql_without_snapshot(tmp_path):
+    """Testa se, sem snapshot publicado, o repositório lê do banco."""
+    repo = SnapshotFlightDataRepository(str(tmp_path / 'vazio'), engine=_engine(tmp_path))
+    assert repo.get_snapshot() is None
+    assert repo.get_filtered_flight_data(FILTRO)['MES'].tolist() == [1, 2, 1]
+
+def test_ingestion_refreshes_snapshot(tmp_path):
+    """Testa se a ingestão com snapshot_dir grava o snapshot só quando a geração muda."""
+    db_url = f"sqlite:///{tmp_path / 'voos.db'}"
+    snapshot_dir = str(tmp_path / 'snap')
+    base = _anac_chunk()
+    csv_path = _write_anac_csv(tmp_path / 'anac.csv', base)
+    process_data(csv_path, db_url=db_url, snapshot_dir=snapshot_dir)
+    primeira = current_version(snapshot_dir)
+    assert FlightSnapshot.open_current(snapshot_dir).generation == 1
+
+    process_data(csv_path, db_url=db_url, snapshot_dir=snapshot_dir)
+    assert current_version(snapshot_dir) == primeira
+    assert refresh_snapshot(create_engine(db_url), snapshot_dir) is None
+
+    novo_mes = base.iloc[[0]].assign(MES=5, RPK=700.0)
+    csv_path = _write_anac_csv(tmp_path / 'anac_v2.csv', pd.concat([base, novo_mes], ignore_index=True))
+    process_data(csv_path, db_url=db_url, snapshot_dir=snapshot_dir)
+    snapshot = FlightSnapshot.open_current(snapshot_dir)
+    assert snapshot.generation == 2
+    assert snapshot.rows == 4
+    # A versão anterior continua disponível para workers que ainda a mapeiam
+    assert sorted(name for name in os.listdir(snapshot_dir) if name.startswith('gen-'))[0] == primeira
+
+    repo = SnapshotFlightDataRepository(snapshot_dir, engine=create_engine(db_url))
+    assert repo.get_snapshot() is not None
+    assert repo.get_monthly_flight_data(FILTRO)['MES'].tolist() == [1, 2, 5]
@@ -0,0 +1,128 @@
+from datetime import datetime, timedelta
+import pytest
+from app import create_app, db
+from app.models import FilterData, User, UserFilter
+from app.services import cached_result
+from app.warmup import CacheWarmer
+
+@pytest.fixture
+def app(tmp_path):
+    app = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'app.db'}",
+        'EXPORT_RESULT_DIR': str(tmp_path / 'exports'),
+    })
+    now = datetime.utcnow()
+    with app.app_context():
+        alice, bob = User(username='alice', password='testpass'), User(username='bob', password='testpass')
+        db.session.add_all([alice, bob])
+        db.session.commit()
+
+        def filtro(user, mercado, ano, minutos):
+            return UserFilter(user_id=user.id, mercado=mercado, ano_inicio=ano, ano_fim=ano, mes_inicio=1, mes_fim=12,
+                              timestamp=now - timedelta(minutes=minutos))
+
+        db.session.add_all([
+            filtro(alice, 'SBGRSBSV', 2023, 1),
+            filtro(alice, 'SBGRSBSV', 2023, 2),
+            filtro(alice, 'SBKPSBRJ', 2022, 3),
+            filtro(alice, 'SBGRSBSV', 2023, 4),
+            filtro(bob, 'SBBRSBSP', 2023, 5),
+            filtro(bob, 'SBBRSBSP', 2023, 6),
+            filtro(bob, 'SBBRSBSP', 2023, 7),
+            filtro(bob, 'SBBRSBSP', 2023, 8),
+            filtro(bob, 'SBBRSBSP', 2019, 60 * 24 * 90),
+        ])
+        db.session.commit()
+    yield app
+    app.extensions['cache_warmer'].shutdown()
+    app.extensions['history_recorder'].shutdown()
+
+@pytest.fixture
+def fake_charts(app, mocker):
+    """Troca os serviços aquecidos por funções baratas que passam pelo mesmo cache."""
+    calls = []
+
+    def chart(metric):
+        @cached_result(metric)
+        def compute(filter_data, repo):
+            calls.append((metric, filter_data.mercado))
+            return {'labels': [], 'values': []}
+        return metric, compute
+
+    repo = mocker.Mock()
+    repo.get_data_generation.return_value = 7
+    mocker.patch('app.warmup.get_repository', return_value=repo)
+    mocker.patch('app.warmup.WARMUP_CHARTS', (chart('chart_rpk'), chart('chart_load_factor')))
+    return calls
+
+def _mercados(filters):
+    return [(f.mercado, f.ano_inicio) for f in filters]
+
+def test_candidate_filters_user_then_popular(app):
+    """Testa a ordem dos candidatos: recentes e frequentes do usuário, depois os populares, sem repetição."""
+    warmer = CacheWarmer(app, recent_per_user=2, frequent_per_user=1, popular=5)
+    with app.app_context():
+        alice = User.query.filter_by(username='alice').first()
+        assert _mercados(warmer.candidate_filters(alice.id)) == [
+            ('SBGRSBSV', 2023), ('SBKPSBRJ', 2022), ('SBBRSBSP', 2023),
+        ]
+        # Sem usuário: todos os ativos; o filtro de 2019 está fora da janela de atividade
+        assert ('SBBRSBSP', 2019) not in _mercados(warmer.candidate_filters())
+    warmer.shutdown()
+
+def test_pass_warms_missing_charts_within_cap(app, fake_charts):
+    """Testa se a passada calcula só o que falta no cache e respeita o limite de filtros."""
+    warmer = CacheWarmer(app, max_filters=2)
+    result = warmer.schedule(reason='teste').result(timeout=10)
+    assert result['filtros'] == 2 and result['aquecidos'] == 4 and result['ja_em_cache'] == 0
+    assert len(fake_charts) == 4
+
+    result = warmer.schedule(reason='teste').result(timeout=10)
+    assert result['aquecidos'] == 0 and result['ja_em_cache'] == 4
+    assert len(fake_charts) == 4
+    assert warmer.stats()['passes'] == 2
+    warmer.shutdown()
+
+def test_pass_stops_at_time_budget(app, fake_charts):
+    """Testa se a passada para ao estourar o tempo máximo."""
+    warmer = CacheWarmer(app, max_seconds=0)
+    result = warmer.schedule(reason='teste').result(timeout=10)
+    assert result['interrompido_por'] == 'tempo' and result['aquecidos'] == 0
+    warmer.shutdown()
+
+def test_record_request_reports_warm_hits(app, fake_charts):
+    """Testa se os POSTs atendidos por resultados aquecidos entram no relatório de acertos."""
+    warmer = CacheWarmer(app, max_filters=1)
+    warmer.schedule(reason='teste').result(timeout=10)
+    with app.app_context():
+        cache = app.extensions['result_cache']
+        aquecido = FilterData(mercado='SBGRSBSV', ano_inicio=2023, ano_fim=2023)
+        frio = FilterData(mercado='SBRFSBSV', ano_inicio=2023, ano_fim=2023)
+        warmer.record_request('chart_rpk', aquecido, 7, cache)
+        warmer.record_request('chart_rpk', frio, 7, cache)
+    stats = warmer.stats()
+    assert stats['dashboard_posts'] == 2 and stats['cache_hits'] == 1 and stats['warm_hits'] == 1
+    assert stats['warm_hit_rate'] == 0.5
+    warmer.shutdown()
+
+def test_new_generation_schedules_pass_once(app, mocker):
+    """Testa se só a primeira observação de uma geração agenda uma passada."""
+    warmer = CacheWarmer(app)
+    schedule = mocker.patch.object(warmer, 'schedule', return_value=object())
+    warmer.notice_generation(3)
+    warmer.notice_generation(3)
+    warmer.notice_generation(4)
+    assert schedule.call_count == 2
+    warmer.shutdown()
+
+def test_login_schedules_user_warmup(app, mocker):
+    """Testa se o login agenda o aquecimento para o usuário."""
+    mocker.patch('app.models.User.check_password', return_value=True)
+    schedule = mocker.patch.object(app.extensions['cache_warmer'], 'schedule')
+    with app.test_client() as client:
+        response = client.post('/login', data={'username': 'alice', 'password': 'testpass'})
+    assert response.status_code == 302
+    with app.app_context():
+        alice = User.query.filter_by(username='alice').first()
+    schedule.assert_called_once_with(user_id=alice.id)